@@ -0,0 +1,114 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Coalesces work submitted by concurrent threads into batches.
+
+    A dispatcher thread takes the first waiting item, waits up to max_wait for
+    more to arrive, and hands up to max_batch items to process_batch in a single
+    call. Items that arrive while a batch is being processed form the next one.
+    """
+
+    def __init__(self, process_batch, max_batch=32, max_wait=0.002, name="batcher"):
+        """
+        Args:
+            process_batch (callable): Takes a list of items and returns a list of
+                results in the same order.
+            max_batch (int): Maximum number of items per batch.
+            max_wait (float): Seconds to wait for more items after the first one.
+            name (str): Name of the dispatcher thread.
+        """
+        self.process_batch = process_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, item):
+        """
+        Queues item for the next batch and waits for its result.
+
+        Raises:
+            Exception: Whatever process_batch raised for the item. When a
+                batch fails its items are retried one by one, so an item only
+                fails for its own error.
+        """
+        future = Future()
+        self._queue.put((item, future))
+        if self._thread is None:
+            self._start()
+        return future.result()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=self.name, daemon=True
+                )
+                self._thread.start()
+
+    def close(self):
+        """
+        Stops the dispatcher thread once the items queued so far are processed.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def stats(self):
+        """
+        Returns the number of batches and items processed and the mean batch size.
+        """
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+        }
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    entry = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if entry is None:
+                    stop = True
+                    break
+                batch.append(entry)
+            self._dispatch(batch)
+            if stop:
+                return
+
+    def _dispatch(self, batch):
+        try:
+            results = self.process_batch([item for item, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+            else:
+                # Retry the items one by one, so only the failing ones fail
+                for entry in batch:
+                    self._dispatch([entry])
+                return
+        else:
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+        self.batches += 1
+        self.items += len(batch)
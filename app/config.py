@@ -0,0 +1,123 @@
+import os
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _env_float(name, default):
+    value = os.environ.get(name, "")
+    return float(value) if value else default
+
+
+# Sentence transformer used for song and query embeddings, and whether the
+# server loads it in the background at startup instead of on first use
+EMBEDDING_MODEL = os.environ.get(
+    "SONGDB_EMBEDDING_MODEL",
+    "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+)
+MODEL_WARMUP = _env_int("SONGDB_MODEL_WARMUP", 1)
+
+# Encoder inference backend ("torch", "torch_int8", "onnx" or "onnx_int8"), the
+# quantized ONNX file used by "onnx_int8", and whether a non-reference backend
+# is checked against "torch" at load time, needing this minimum cosine to stay
+ENCODER_BACKEND = os.environ.get("SONGDB_ENCODER_BACKEND", "torch")
+ENCODER_ONNX_INT8_FILE = os.environ.get(
+    "SONGDB_ENCODER_ONNX_INT8_FILE", "onnx/model_qint8_avx512_vnni.onnx"
+)
+ENCODER_PARITY_CHECK = _env_int("SONGDB_ENCODER_PARITY_CHECK", 1)
+ENCODER_MIN_COSINE = _env_float("SONGDB_ENCODER_MIN_COSINE", 0.99)
+
+# Persistent cache of song text embeddings in the database, so identical song
+# texts are encoded once across restarts and catalog reloads (0 disables it)
+EMBEDDING_CACHE = _env_int("SONGDB_EMBEDDING_CACHE", 1)
+
+# Static files: directory served at / and how long browsers may reuse them
+# without revalidating, in seconds (0 makes them revalidate with the ETag)
+STATIC_DIR = os.environ.get("SONGDB_STATIC_DIR", "static")
+STATIC_MAX_AGE = _env_int("SONGDB_STATIC_MAX_AGE", 0)
+
+# Query embedding cache: number of entries and optional expiry in seconds
+QUERY_CACHE_SIZE = _env_int("SONGDB_QUERY_CACHE_SIZE", 1024)
+QUERY_CACHE_TTL = _env_float("SONGDB_QUERY_CACHE_TTL", None)
+
+# Search coalescing: concurrent /search requests arriving within the wait
+# window are encoded and searched together, up to this many per batch (1 disables)
+SEARCH_BATCH_SIZE = _env_int("SONGDB_SEARCH_BATCH_SIZE", 32)
+SEARCH_BATCH_WAIT_MS = _env_float("SONGDB_SEARCH_BATCH_WAIT_MS", 2.0)
+
+# Largest top_k a search or similar-songs request may ask for
+SEARCH_MAX_TOP_K = _env_int("SONGDB_SEARCH_MAX_TOP_K", 1000)
+
+# Paginated searches: number of ranked result sets kept for later pages and
+# seconds a result set stays valid
+RESULT_CACHE_SIZE = _env_int("SONGDB_RESULT_CACHE_SIZE", 256)
+RESULT_CACHE_TTL = _env_float("SONGDB_RESULT_CACHE_TTL", 300.0)
+
+# Hybrid search: weight of the vector similarity against BM25 (0-1) and the
+# most full-text matches re-ranked by vector similarity
+HYBRID_ALPHA = _env_float("SONGDB_HYBRID_ALPHA", 0.5)
+HYBRID_CANDIDATES = _env_int("SONGDB_HYBRID_CANDIDATES", 200)
+
+# "More like this" table: songs whose nearest neighbours are kept (0 disables
+# it) and how many neighbours are kept per song
+SIMILAR_CACHE_SIZE = _env_int("SONGDB_SIMILAR_CACHE_SIZE", 1024)
+SIMILAR_NEIGHBOURS = _env_int("SONGDB_SIMILAR_NEIGHBOURS", 50)
+
+# GET /song hot-row cache: number of serialized song responses kept (0 disables it)
+SONG_CACHE_SIZE = _env_int("SONGDB_SONG_CACHE_SIZE", 4096)
+
+# HTTP serving: "single" handles one request at a time, "threaded" uses a pool
+# of worker threads, "prefork" runs that pool in several processes sharing the
+# port and a memory-mapped index (needs INDEX_PATH)
+SERVER_MODE = os.environ.get("SONGDB_SERVER_MODE", "threaded")
+SERVER_WORKERS = _env_int("SONGDB_WORKERS", 8)
+SERVER_PROCESSES = _env_int("SONGDB_PROCESSES", os.cpu_count() or 1)
+
+# Prefork mode: seconds between checks for database changes to publish as a
+# new index generation, and between workers' checks for a new generation
+INDEX_PUBLISH_INTERVAL = _env_float("SONGDB_INDEX_PUBLISH_INTERVAL", 1.0)
+
+# Persistent connections: seconds a connection may wait for its next request,
+# seconds a read or write may block during a request, and most requests
+# served per connection
+HTTP_IDLE_TIMEOUT = _env_float("SONGDB_HTTP_IDLE_TIMEOUT", 5.0)
+HTTP_REQUEST_TIMEOUT = _env_float("SONGDB_HTTP_REQUEST_TIMEOUT", 60.0)
+HTTP_MAX_REQUESTS = _env_int("SONGDB_HTTP_MAX_REQUESTS", 100)
+
+# Smallest JSON response body gzip-compressed for clients that accept it, in
+# bytes (0 disables compression of API responses)
+GZIP_MIN_SIZE = _env_int("SONGDB_GZIP_MIN_SIZE", 1024)
+
+# Slow request profiling: requests taking at least this many milliseconds are
+# logged with their sampled stacks (0 disables the profiler), and the sampling
+# interval in milliseconds
+PROFILE_SLOW_MS = _env_float("SONGDB_PROFILE_SLOW_MS", 0.0)
+PROFILE_INTERVAL_MS = _env_float("SONGDB_PROFILE_INTERVAL_MS", 5.0)
+
+# SQLite page cache per connection (KiB) and memory-mapped I/O size (bytes)
+DB_CACHE_SIZE_KB = _env_int("SONGDB_DB_CACHE_SIZE_KB", 65536)
+DB_MMAP_SIZE = _env_int("SONGDB_DB_MMAP_SIZE", 256 * 1024 * 1024)
+
+# Vector index: backend ("flat", "hnsw", "ivf_flat" or "ivf_pq"), file it is
+# persisted to (empty to disable) and backend parameters (0 picks a default)
+INDEX_TYPE = os.environ.get("SONGDB_INDEX_TYPE", "flat")
+INDEX_PATH = os.environ.get("SONGDB_INDEX_PATH", "songs.index")
+INDEX_NLIST = _env_int("SONGDB_INDEX_NLIST", 0)
+INDEX_HNSW_M = _env_int("SONGDB_INDEX_HNSW_M", 32)
+INDEX_PQ_M = _env_int("SONGDB_INDEX_PQ_M", 48)
+
+# Search depth of approximate backends when a request gives none: IVF lists
+# visited and HNSW candidate list size (0 keeps FAISS's default of 1 and 16)
+INDEX_NPROBE = _env_int("SONGDB_INDEX_NPROBE", 16)
+INDEX_EF_SEARCH = _env_int("SONGDB_INDEX_EF_SEARCH", 64)
+
+# Vector comparison for the index kernels: "cosine" (inner product) or "l2"
+INDEX_METRIC = os.environ.get("SONGDB_INDEX_METRIC", "cosine")
+
+# Index sharding: number of shards (1 keeps a single index), how songs are
+# assigned to them ("hash" or "artist") and whether each shard runs in its
+# own process
+INDEX_SHARDS = _env_int("SONGDB_INDEX_SHARDS", 1)
+INDEX_SHARD_BY = os.environ.get("SONGDB_INDEX_SHARD_BY", "hash")
+INDEX_SHARD_PROCESSES = _env_int("SONGDB_INDEX_SHARD_PROCESSES", 0)
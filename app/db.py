@@ -1,11 +1,89 @@
 import json
+import logging
+import os
 import sqlite3
 import hashlib
-from app.embeddings import generate_embedding
+import threading
+import numpy as np
+from app.config import DB_CACHE_SIZE_KB, DB_MMAP_SIZE, EMBEDDING_CACHE
+from app.embeddings import (
+    DEFAULT_BATCH_SIZE,
+    ENCODER_ID,
+    generate_embedding,
+    generate_embeddings,
+)
+from app.index import EMBEDDING_DIMENSION, SongIndex, build_index
+from app.shards import ShardedIndex, build_sharded_index
+
+logger = logging.getLogger(__name__)
+
+# Keep IN (...) lists below SQLite's default bound parameter limit
+SQLITE_MAX_PARAMS = 500
+
+# Shortest query word the trigram full-text index can match
+FTS_MIN_TERM_LENGTH = 3
 
 
 def get_connection(db_name="songs.db"):
-    return sqlite3.connect(db_name)
+    conn = sqlite3.connect(db_name)
+    configure_connection(conn)
+    return conn
+
+
+def configure_connection(conn):
+    """
+    Applies the performance settings used by every connection.
+
+    WAL journaling lets readers proceed while a write is being committed, and
+    synchronous=NORMAL only syncs at checkpoints, which is safe in WAL mode.
+
+    Args:
+        conn (sqlite3.Connection): The connection to configure.
+    """
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{int(DB_CACHE_SIZE_KB)}")
+    conn.execute(f"PRAGMA mmap_size = {int(DB_MMAP_SIZE)}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA busy_timeout = 5000")
+
+
+class ConnectionPool:
+    """
+    Hands every thread its own long-lived connection to the same database.
+
+    SQLite connections cannot be shared between threads safely, so each thread
+    opens one on first use and keeps it for the lifetime of the pool.
+    """
+
+    def __init__(self, db_name="songs.db"):
+        self.db_name = db_name
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        Returns the connection of the calling thread, opening it on first use.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_name, check_same_thread=False)
+            configure_connection(conn)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close_all(self):
+        """
+        Closes every connection opened by the pool.
+        """
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
 
 
 def create_tables(db_name="songs.db"):
@@ -20,14 +98,192 @@ def create_tables(db_name="songs.db"):
         album TEXT,
         year INTEGER,
         description TEXT,
-        embedding TEXT
+        embedding BLOB
     )
     """
     )
+    migrate_json_embeddings(cursor)
+    create_fts_table(cursor)
+    create_embedding_cache_table(cursor)
     conn.commit()
     conn.close()
 
 
+def create_embedding_cache_table(cursor):
+    """
+    Creates the embedding_cache table, which maps embedding_cache_key values
+    to embeddings.
+
+    A newly created table is filled with the embeddings of the stored songs.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor of an open connection; the caller commits.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'embedding_cache'")
+    exists = cursor.fetchone() is not None
+    cursor.execute(
+        """
+    CREATE TABLE IF NOT EXISTS embedding_cache (
+        key TEXT PRIMARY KEY,
+        embedding BLOB
+    )
+    """
+    )
+    if not exists:
+        cursor.execute(
+            "SELECT song, artist, album, year, description, embedding FROM songs"
+        )
+        rows = cursor.fetchall()
+        cursor.executemany(
+            "INSERT OR IGNORE INTO embedding_cache (key, embedding) VALUES (?, ?)",
+            [
+                (
+                    embedding_cache_key(
+                        song_full_text(
+                            dict(
+                                zip(
+                                    ("song", "artist", "album", "year", "description"),
+                                    row,
+                                )
+                            )
+                        )
+                    ),
+                    row[5],
+                )
+                for row in rows
+            ],
+        )
+
+
+def create_fts_table(cursor):
+    """
+    Creates the songs_fts full-text index over the song text columns.
+
+    It is an external-content FTS5 table with a trigram tokenizer, so it
+    matches any substring of three or more characters, and triggers keep it in
+    step with songs. A newly created table is filled from the existing songs.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor of an open connection; the caller commits.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'songs_fts'")
+    exists = cursor.fetchone() is not None
+    cursor.executescript(
+        """
+    CREATE VIRTUAL TABLE IF NOT EXISTS songs_fts USING fts5(
+        artist, song, album, description,
+        content='songs', content_rowid='rowid', tokenize='trigram'
+    );
+    CREATE TRIGGER IF NOT EXISTS songs_fts_insert AFTER INSERT ON songs BEGIN
+        INSERT INTO songs_fts (rowid, artist, song, album, description)
+        VALUES (new.rowid, new.artist, new.song, new.album, new.description);
+    END;
+    CREATE TRIGGER IF NOT EXISTS songs_fts_delete AFTER DELETE ON songs BEGIN
+        INSERT INTO songs_fts (songs_fts, rowid, artist, song, album, description)
+        VALUES ('delete', old.rowid, old.artist, old.song, old.album, old.description);
+    END;
+    CREATE TRIGGER IF NOT EXISTS songs_fts_update
+    AFTER UPDATE OF artist, song, album, description ON songs BEGIN
+        INSERT INTO songs_fts (songs_fts, rowid, artist, song, album, description)
+        VALUES ('delete', old.rowid, old.artist, old.song, old.album, old.description);
+        INSERT INTO songs_fts (rowid, artist, song, album, description)
+        VALUES (new.rowid, new.artist, new.song, new.album, new.description);
+    END;
+    """
+    )
+    if not exists:
+        cursor.execute("INSERT INTO songs_fts (songs_fts) VALUES ('rebuild')")
+
+
+def fts_query(text):
+    """
+    Builds an FTS5 MATCH expression matching any word of a free-text query.
+
+    Words shorter than the three-character trigrams cannot be matched and are
+    left out.
+
+    Args:
+        text (str): The query text.
+
+    Returns:
+        str: The expression, empty if no word is long enough.
+    """
+    terms = [term for term in text.split() if len(term) >= FTS_MIN_TERM_LENGTH]
+    return " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def lexical_search(cursor, text, limit):
+    """
+    Finds the songs whose text best matches a query, ranked by BM25.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor of an open connection.
+        text (str): The query text.
+        limit (int): Maximum number of songs to return.
+
+    Returns:
+        list: (song_hash, score) tuples, best match first, where score is the
+        positive BM25 relevance.
+    """
+    expression = fts_query(text)
+    if not expression or limit <= 0:
+        return []
+    cursor.execute(
+        """
+    SELECT songs.hash, bm25(songs_fts) FROM songs_fts
+    JOIN songs ON songs.rowid = songs_fts.rowid
+    WHERE songs_fts MATCH ? ORDER BY rank LIMIT ?
+    """,
+        (expression, limit),
+    )
+    # FTS5 reports BM25 negated so that better matches sort first
+    return [(song_hash, -score) for song_hash, score in cursor.fetchall()]
+
+
+def migrate_json_embeddings(cursor):
+    """
+    Converts embeddings stored as JSON text by older versions into float32 BLOBs.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor of an open connection; the caller commits.
+    """
+    cursor.execute("SELECT hash, embedding FROM songs WHERE typeof(embedding) = 'text'")
+    rows = cursor.fetchall()
+    cursor.executemany(
+        "UPDATE songs SET embedding = ? WHERE hash = ?",
+        [
+            (embedding_to_blob(json.loads(embedding_str)), song_hash)
+            for song_hash, embedding_str in rows
+        ],
+    )
+
+
+def embedding_to_blob(embedding):
+    """
+    Serializes an embedding into the raw float32 bytes stored in the database.
+
+    Args:
+        embedding (list or np.ndarray): The embedding vector.
+
+    Returns:
+        bytes: Little-endian float32 representation of the vector.
+    """
+    return np.asarray(embedding, dtype="<f4").tobytes()
+
+
+def blobs_to_matrix(blobs):
+    """
+    Loads float32 embedding BLOBs into a single contiguous matrix.
+
+    Args:
+        blobs (list): Embedding BLOBs as returned by SQLite.
+
+    Returns:
+        np.ndarray: A (len(blobs), EMBEDDING_DIMENSION) float32 matrix.
+    """
+    return np.frombuffer(b"".join(blobs), dtype="<f4").reshape(-1, EMBEDDING_DIMENSION)
+
+
 def generate_song_hash(song_data):
     """
     Generates a unique SHA-256 hash for a song based on its metadata.
@@ -42,44 +298,415 @@ def generate_song_hash(song_data):
     return hashlib.sha256(song_string.encode("utf-8")).hexdigest()
 
 
-def insert_songs(songs, db_name="songs.db"):
+def fetch_embeddings(cursor, song_hashes):
     """
-    Inserts a list of songs into the SQLite database. Each song's metadata and embedding are stored.
+    Loads the stored embeddings of the given songs.
 
     Args:
-        songs (list): A list of dictionaries, where each dictionary contains metadata for a song, including 'artist', 'song', 'album', 'year', and 'description'.
+        cursor (sqlite3.Cursor): Cursor of an open connection.
+        song_hashes (list): Hashes of the songs to load.
 
-    Raises:
-        sqlite3.Error: If there is an issue with the database connection or insertion.
+    Returns:
+        tuple: The hashes that were found and a matrix with their embeddings.
     """
+    found = []
+    blobs = []
+    for start in range(0, len(song_hashes), SQLITE_MAX_PARAMS):
+        chunk = song_hashes[start : start + SQLITE_MAX_PARAMS]
+        placeholders = ", ".join("?" for _ in chunk)
+        cursor.execute(
+            f"SELECT hash, embedding FROM songs WHERE hash IN ({placeholders})", chunk
+        )
+        for song_hash, blob in cursor.fetchall():
+            found.append(song_hash)
+            blobs.append(blob)
+    return found, blobs_to_matrix(blobs)
+
+
+def _filter_metadata(row):
+    # (hash, artist, song, album, year, ...) row to the fields searches filter on
+    return {"artist": row[1], "song": row[2], "album": row[3], "year": row[4]}
+
+
+def load_index(db_name="songs.db", index_path=None, index_type="flat", **options):
+    """
+    Loads a SongIndex holding the embeddings of every song in the database.
+
+    When index_path holds a saved index of the requested type it is reused and
+    brought up to date with the database. Otherwise the index is built (and
+    trained) from the stored embeddings and saved to index_path.
+
+    Args:
+        db_name (str): Path of the SQLite database.
+        index_path (str, optional): File the index is persisted to.
+        index_type (str): One of INDEX_TYPES.
+        **options: metric, nlist, hnsw_m and pq_m, see create_faiss_index.
+
+    Returns:
+        SongIndex: The populated index.
+    """
+    metric = options.get("metric") or "cosine"
+    index = None
+    if index_path and os.path.exists(index_path):
+        try:
+            index = SongIndex.load(index_path)
+        except (RuntimeError, ValueError) as e:
+            logger.warning("Ignoring saved index %s: %s", index_path, e)
+        if index is not None and (
+            index.index_type != index_type or index.metric != metric
+        ):
+            index = None
+
     conn = get_connection(db_name)
     cursor = conn.cursor()
+    if index is not None:
+        cursor.execute("SELECT hash, artist, song, album, year FROM songs")
+        songs = {row[0]: _filter_metadata(row) for row in cursor.fetchall()}
+        missing = index.restore(list(songs), list(songs.values()))
+        if missing:
+            song_hashes, embeddings = fetch_embeddings(cursor, missing)
+            index.add(
+                song_hashes,
+                embeddings,
+                [songs[song_hash] for song_hash in song_hashes],
+            )
+    else:
+        cursor.execute("SELECT hash, artist, song, album, year, embedding FROM songs")
+        rows = cursor.fetchall()
+        index = build_index(
+            [row[0] for row in rows],
+            blobs_to_matrix([row[5] for row in rows]),
+            index_type,
+            songs=[_filter_metadata(row) for row in rows],
+            **options,
+        )
+        if index_path:
+            index.save(index_path)
+    conn.close()
+    return index
+
+
+def load_sharded_index(
+    db_name="songs.db",
+    index_path=None,
+    shards=2,
+    partition="hash",
+    processes=False,
+    index_type="flat",
+    **options,
+):
+    """
+    Loads a ShardedIndex holding the embeddings of every song in the database.
+
+    Like load_index, a saved index is reused when its shard count, partition,
+    type and metric match the request, and is otherwise rebuilt and saved.
+
+    Args:
+        db_name (str): Path of the SQLite database.
+        index_path (str, optional): Manifest file the index is persisted to;
+            the shards are saved next to it.
+        shards (int): Number of shards.
+        partition (str): One of PARTITIONS, see app.shards.
+        processes (bool): Run each shard in its own process.
+        index_type (str): One of INDEX_TYPES, for every shard.
+        **options: metric, nlist, hnsw_m and pq_m, see create_faiss_index.
+
+    Returns:
+        ShardedIndex: The populated index.
+    """
+    metric = options.get("metric") or "cosine"
+    index = None
+    if index_path and os.path.exists(index_path):
+        try:
+            index = ShardedIndex.load(index_path, processes=processes)
+        except (OSError, RuntimeError, ValueError) as e:
+            logger.warning("Ignoring saved index %s: %s", index_path, e)
+        if index is not None and (
+            len(index.shards) != shards
+            or index.partition != partition
+            or index.index_type != index_type
+            or index.metric != metric
+        ):
+            index.close()
+            index = None
+
+    conn = get_connection(db_name)
+    cursor = conn.cursor()
+    if index is not None:
+        cursor.execute("SELECT hash, artist, song, album, year FROM songs")
+        songs = {row[0]: _filter_metadata(row) for row in cursor.fetchall()}
+        missing = index.restore(list(songs), list(songs.values()))
+        if missing:
+            song_hashes, embeddings = fetch_embeddings(cursor, missing)
+            index.add(
+                song_hashes,
+                embeddings,
+                [songs[song_hash] for song_hash in song_hashes],
+            )
+    else:
+        cursor.execute("SELECT hash, artist, song, album, year, embedding FROM songs")
+        rows = cursor.fetchall()
+        index = build_sharded_index(
+            [row[0] for row in rows],
+            blobs_to_matrix([row[5] for row in rows]),
+            shards,
+            partition,
+            index_type,
+            songs=[_filter_metadata(row) for row in rows],
+            processes=processes,
+            **options,
+        )
+        if index_path:
+            index.save(index_path)
+    conn.close()
+    return index
+
+
+def load_mapped_index(db_name, path):
+    """
+    Loads a saved index read-only, with its vectors memory-mapped from the file.
+
+    Songs deleted since the file was written are tombstoned; songs added since
+    are left out until a newer file is loaded.
+
+    Args:
+        db_name (str): Path of the SQLite database.
+        path (str): File written by SongIndex.save.
+
+    Returns:
+        SongIndex: The read-only index.
+    """
+    index = SongIndex.load(path, mmap=True)
+    conn = get_connection(db_name)
+    cursor = conn.cursor()
+    cursor.execute("SELECT hash, artist, song, album, year FROM songs")
+    songs = {row[0]: _filter_metadata(row) for row in cursor.fetchall()}
+    conn.close()
+    index.restore(list(songs), list(songs.values()))
+    return index
+
+
+def sync_index(index, cursor):
+    """
+    Brings an index up to date with the songs table, for indexes that another
+    process's writes do not reach.
+
+    Args:
+        index (SongIndex): A writable index.
+        cursor (sqlite3.Cursor): Cursor of an open connection.
+
+    Returns:
+        tuple: Number of songs added and removed.
+    """
+    cursor.execute("SELECT hash, artist, song, album, year FROM songs")
+    songs = {row[0]: _filter_metadata(row) for row in cursor.fetchall()}
+    removed = [
+        song_hash for song_hash in index.hashes.values() if song_hash not in songs
+    ]
+    missing = [song_hash for song_hash in songs if song_hash not in index]
+    index.remove(removed)
+    song_hashes = []
+    if missing:
+        song_hashes, embeddings = fetch_embeddings(cursor, missing)
+        index.add(
+            song_hashes,
+            embeddings,
+            [songs[song_hash] for song_hash in song_hashes],
+        )
+    return len(song_hashes), len(removed)
+
+
+def song_full_text(song_data):
+    """
+    Builds the text that is embedded for a song.
+
+    Args:
+        song_data (dict): Dictionary containing song metadata.
+
+    Returns:
+        str: The song metadata joined into a single string.
+    """
+    return f"{song_data.get('song', '')}, {song_data.get('artist', '')}, {song_data.get('album', '')}, {song_data.get('year', '')}, {song_data.get('description', '')}"
+
+
+def validate_song(song_data):
+    """
+    Checks the field types of a song before it is stored.
+
+    Args:
+        song_data (dict): Song metadata from a client.
+
+    Raises:
+        ValueError: With a message for the client if a field has the wrong type.
+    """
+    if not isinstance(song_data, dict):
+        raise ValueError("Expected a JSON object")
+    for field in ("artist", "song", "album", "description"):
+        value = song_data.get(field)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"{field} must be a string")
+    year = song_data.get("year")
+    if year is not None and (isinstance(year, bool) or not isinstance(year, int)):
+        raise ValueError("year must be an integer")
 
+
+def embedding_cache_key(text):
+    """
+    Returns the key a text's embedding is cached under: a hash of the exact
+    text and of the encoder (model and backend) that embeds it.
+    """
+    return hashlib.sha256(f"{ENCODER_ID}\n{text}".encode("utf-8")).hexdigest()
+
+
+def encode_texts(cursor, texts, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Embeds texts, encoding only the ones missing from the embedding cache.
+
+    Newly encoded texts are added to the cache; the caller commits. Without
+    EMBEDDING_CACHE every text is encoded.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor of an open connection.
+        texts (list): The texts to embed.
+        batch_size (int): Number of texts per model forward pass.
+
+    Returns:
+        np.ndarray: A (len(texts), EMBEDDING_DIMENSION) float32 matrix.
+    """
+    if not EMBEDDING_CACHE:
+        return generate_embeddings(texts, batch_size).reshape(-1, EMBEDDING_DIMENSION)
+
+    keys = [embedding_cache_key(text) for text in texts]
+    unique_keys = list(dict.fromkeys(keys))
+    cached = {}
+    for start in range(0, len(unique_keys), SQLITE_MAX_PARAMS):
+        chunk = unique_keys[start : start + SQLITE_MAX_PARAMS]
+        placeholders = ", ".join("?" for _ in chunk)
+        cursor.execute(
+            f"SELECT key, embedding FROM embedding_cache WHERE key IN ({placeholders})",
+            chunk,
+        )
+        cached.update(cursor.fetchall())
+
+    missing = {key: text for key, text in zip(keys, texts) if key not in cached}
+    if missing:
+        encoded = generate_embeddings(list(missing.values()), batch_size)
+        blobs = [embedding_to_blob(embedding) for embedding in encoded]
+        cursor.executemany(
+            "INSERT OR IGNORE INTO embedding_cache (key, embedding) VALUES (?, ?)",
+            list(zip(missing, blobs)),
+        )
+        cached.update(zip(missing, blobs))
+    return blobs_to_matrix([cached[key] for key in keys])
+
+
+def find_existing_hashes(cursor, song_hashes):
+    """
+    Returns the subset of the given song hashes that are already stored.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor of an open connection.
+        song_hashes (list): Song hashes to look up.
+
+    Returns:
+        set: Hashes that exist in the songs table.
+    """
+    existing = set()
+    for start in range(0, len(song_hashes), SQLITE_MAX_PARAMS):
+        chunk = song_hashes[start : start + SQLITE_MAX_PARAMS]
+        placeholders = ", ".join("?" for _ in chunk)
+        cursor.execute(f"SELECT hash FROM songs WHERE hash IN ({placeholders})", chunk)
+        existing.update(row[0] for row in cursor.fetchall())
+    return existing
+
+
+def store_songs(cursor, songs, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Encodes and inserts songs using an open cursor; the caller commits.
+
+    Songs that already exist, or that repeat an earlier song in the list, are
+    reported as duplicates and never encoded, and texts found in the embedding
+    cache are not encoded again.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor of an open connection.
+        songs (list): Song metadata dictionaries.
+        batch_size (int): Number of songs encoded per model forward pass.
+
+    Returns:
+        tuple: A list of (song_hash, status) pairs aligned with songs, where status
+        is "created" or "duplicate", followed by the hashes of the created songs,
+        a matrix with their embeddings and their metadata dictionaries.
+    """
+    results = []
+    new_songs = {}
     for song in songs:
         song_hash = generate_song_hash(song)
-        full_text = f"{song.get('song', '')}, {song.get('artist', '')}, {song.get('album', '')}, {song.get('year', '')}, {song.get('description', '')}"
-        embedding = generate_embedding(full_text)
-        embedding_str = json.dumps(embedding)
+        if song_hash in new_songs:
+            results.append((song_hash, "duplicate"))
+        else:
+            new_songs[song_hash] = song
+            results.append((song_hash, "created"))
 
-        try:
-            cursor.execute(
-                """
-            INSERT INTO songs (hash, artist, song, album, year, description, embedding)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-                (
-                    song_hash,
-                    song.get("artist", ""),
-                    song.get("song", ""),
-                    song.get("album", ""),
-                    song.get("year", ""),
-                    song.get("description", ""),
-                    embedding_str,
-                ),
+    existing = find_existing_hashes(cursor, list(new_songs))
+    for song_hash in existing:
+        del new_songs[song_hash]
+    results = [
+        (song_hash, "duplicate" if song_hash in existing else status)
+        for song_hash, status in results
+    ]
+
+    song_hashes = list(new_songs)
+    if not song_hashes:
+        return results, [], np.empty((0, EMBEDDING_DIMENSION), dtype=np.float32), []
+
+    # Encode every song before the first write, so the transaction, and with it
+    # SQLite's write lock, only spans the inserts and not the model passes
+    embeddings = encode_texts(
+        cursor, [song_full_text(song) for song in new_songs.values()], batch_size
+    )
+    cursor.executemany(
+        """
+        INSERT OR IGNORE INTO songs (hash, artist, song, album, year, description, embedding)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        [
+            (
+                song_hash,
+                song.get("artist", ""),
+                song.get("song", ""),
+                song.get("album", ""),
+                song.get("year", ""),
+                song.get("description", ""),
+                embedding_to_blob(embedding),
             )
-        except sqlite3.IntegrityError:
-            # Ignore if the song already exists in the database
-            pass
+            for (song_hash, song), embedding in zip(new_songs.items(), embeddings)
+        ],
+    )
+    return results, song_hashes, embeddings, list(new_songs.values())
+
 
+def insert_songs(songs, db_name="songs.db", index=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Inserts a list of songs into the SQLite database. Each song's metadata and embedding are stored.
+
+    Songs that already exist are skipped before encoding, the remaining ones are
+    encoded batch_size at a time and written in a single transaction.
+
+    Args:
+        songs (list): A list of dictionaries, where each dictionary contains metadata for a song, including 'artist', 'song', 'album', 'year', and 'description'.
+        index (SongIndex, optional): Index to update in place with the newly inserted songs.
+        batch_size (int): Number of songs encoded per model forward pass.
+
+    Raises:
+        sqlite3.Error: If there is an issue with the database connection or insertion.
+    """
+    conn = get_connection(db_name)
+    _, song_hashes, embeddings, new_songs = store_songs(
+        conn.cursor(), songs, batch_size
+    )
     conn.commit()
     conn.close()
+
+    if index is not None and song_hashes:
+        index.add(song_hashes, embeddings, new_songs)
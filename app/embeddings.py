@@ -1,30 +1,291 @@
-from sentence_transformers import SentenceTransformer
+import logging
+import threading
+import time
 import faiss
 import numpy as np
+from app.cache import LRUCache
+from app.config import (
+    EMBEDDING_MODEL,
+    ENCODER_BACKEND,
+    ENCODER_MIN_COSINE,
+    ENCODER_ONNX_INT8_FILE,
+    ENCODER_PARITY_CHECK,
+    QUERY_CACHE_SIZE,
+    QUERY_CACHE_TTL,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 64
+
+# Inference backends: full-precision PyTorch (the reference), PyTorch with
+# int8 dynamically quantized linear layers, and ONNX Runtime in fp32 or int8
+ENCODER_BACKENDS = ("torch", "torch_int8", "onnx", "onnx_int8")
+
+# Identifies the encoder an embedding comes from, for the embedding cache
+ENCODER_ID = f"{EMBEDDING_MODEL}/{ENCODER_BACKEND}"
 
-model = SentenceTransformer(
-    "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+# Texts compared against the reference backend by the parity check
+PARITY_TEXTS = (
+    "שיר אהבה על הים",
+    "שיר מחאה חברתית משנות השמונים",
+    "a love song about the sea",
+    "upbeat dance track from the nineties",
+    "balada triste sobre la lluvia",
 )
 
+# The model is loaded on first use (or by warm_up_model) so importing the app
+# and serving requests that don't embed text never waits for it
+_model = None
+_model_lock = threading.Lock()
+model_ready = threading.Event()
+
+query_cache = LRUCache(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+
+
+def load_encoder(backend="torch", model_name=EMBEDDING_MODEL):
+    """
+    Loads the sentence transformer on the given inference backend.
+
+    The ONNX backends need the optional ONNX Runtime extras of
+    sentence-transformers (pip install "sentence-transformers[onnx]").
+
+    Args:
+        backend (str): One of ENCODER_BACKENDS.
+        model_name (str): Sentence transformer name or path.
+
+    Returns:
+        SentenceTransformer: The model; every backend exposes the same encode().
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+    if backend == "torch_int8":
+        import torch
+
+        # Quantizes the weights of the linear layers, where almost all CPU
+        # inference time goes; activations are quantized on the fly
+        model = SentenceTransformer(model_name, device="cpu")
+        return torch.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    if backend == "onnx":
+        return SentenceTransformer(model_name, backend="onnx")
+    if backend == "onnx_int8":
+        return SentenceTransformer(
+            model_name,
+            backend="onnx",
+            model_kwargs={"file_name": ENCODER_ONNX_INT8_FILE},
+        )
+    raise ValueError(f"Unknown encoder backend: {backend}")
+
+
+def check_encoder_parity(encoder, reference, texts=PARITY_TEXTS):
+    """
+    Compares the embeddings of two encoders on the same texts.
+
+    Args:
+        encoder (SentenceTransformer): The encoder being checked.
+        reference (SentenceTransformer): The reference encoder.
+        texts (sequence): Texts to encode with both.
+
+    Returns:
+        float: The lowest cosine similarity between matching embeddings.
+    """
+    texts = list(texts)
+    embeddings = encoder.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+    expected = reference.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+    return float((embeddings * expected).sum(axis=1).min())
+
+
+def _load_model():
+    model = load_encoder(ENCODER_BACKEND)
+    if ENCODER_BACKEND == "torch" or not ENCODER_PARITY_CHECK:
+        return model
+
+    # Stored song embeddings may come from another backend, so only keep a
+    # faster backend while it stays close to the reference
+    reference = load_encoder("torch")
+    min_cosine = check_encoder_parity(model, reference)
+    if min_cosine < ENCODER_MIN_COSINE:
+        logger.warning(
+            "Encoder backend %s is off the reference (cosine %.4f < %.4f); "
+            "using torch instead",
+            ENCODER_BACKEND,
+            min_cosine,
+            ENCODER_MIN_COSINE,
+        )
+        return reference
+    logger.info(
+        "Encoder backend %s matches the reference (cosine >= %.4f)",
+        ENCODER_BACKEND,
+        min_cosine,
+    )
+    return model
+
+
+def get_model():
+    """
+    Returns the sentence transformer, loading it on first use.
+
+    The model runs on the ENCODER_BACKEND inference backend. Concurrent callers
+    wait for a single load; model_ready is set once it is done.
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                started = time.perf_counter()
+                _model = _load_model()
+                logger.info(
+                    "Loaded embedding model %s (%s) in %.2fs",
+                    EMBEDDING_MODEL,
+                    ENCODER_BACKEND,
+                    time.perf_counter() - started,
+                )
+                model_ready.set()
+    return _model
+
+
+def set_model(model):
+    """
+    Replaces the sentence transformer used for every embedding.
+
+    Benchmarks use it to run with a stub encoder instead of loading the model.
+
+    Args:
+        model: An object with the SentenceTransformer encode() interface.
+    """
+    global _model
+    with _model_lock:
+        _model = model
+    model_ready.set()
+
+
+def _warm_up():
+    try:
+        # One encode initializes the tokenizer and inference kernels as well
+        get_model().encode("warm up")
+    except Exception:
+        # Requests that need the model will retry loading it
+        logger.exception("Embedding model warm-up failed")
+
+
+def warm_up_model():
+    """
+    Loads the model in a background thread, so the server can start serving
+    requests that don't need it right away.
+
+    Returns:
+        threading.Thread: The warm-up thread; model_ready is set when the model loads.
+    """
+    thread = threading.Thread(target=_warm_up, name="songdb-model-warmup", daemon=True)
+    thread.start()
+    return thread
+
 
 def generate_embedding(text):
-    embedding = model.encode(text)
+    embedding = get_model().encode(text, normalize_embeddings=True)
     return embedding.tolist()
 
 
+def generate_embeddings(texts, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Encodes many texts at once, letting the model batch its forward passes.
+
+    Like generate_embedding, the embeddings are scaled to unit length.
+
+    Args:
+        texts (list): The texts to encode.
+        batch_size (int): Number of texts per forward pass.
+
+    Returns:
+        np.ndarray: A (len(texts), dimension) float32 matrix.
+    """
+    embeddings = get_model().encode(
+        texts,
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+    )
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+def normalize_query(query):
+    """
+    Normalizes query text so trivially different spellings share a cache entry.
+    """
+    return " ".join(query.split()).casefold()
+
+
+def get_query_embedding(query):
+    """
+    Returns the embedding of a search query, served from query_cache when possible.
+
+    Args:
+        query (str): The search query text.
+
+    Returns:
+        list: The query embedding. Callers must not modify it.
+    """
+    key = normalize_query(query)
+    embedding = query_cache.get(key)
+    if embedding is None:
+        embedding = generate_embedding(key)
+        query_cache.put(key, embedding)
+    return embedding
+
+
+def get_query_embeddings(queries, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Returns the embeddings of many search queries, encoding the ones missing
+    from query_cache together in batched forward passes.
+
+    Args:
+        queries (list): The search query texts.
+        batch_size (int): Number of texts per forward pass.
+
+    Returns:
+        list: One embedding per query, in order. Callers must not modify them.
+    """
+    keys = [normalize_query(query) for query in queries]
+    embeddings = [query_cache.get(key) for key in keys]
+    missing = list(
+        dict.fromkeys(
+            key for key, embedding in zip(keys, embeddings) if embedding is None
+        )
+    )
+    if missing:
+        encoded = dict(zip(missing, generate_embeddings(missing, batch_size).tolist()))
+        for key, embedding in encoded.items():
+            query_cache.put(key, embedding)
+        embeddings = [
+            encoded[key] if embedding is None else embedding
+            for key, embedding in zip(keys, embeddings)
+        ]
+    return embeddings
+
+
 def perform_faiss_similarity_search(embeddings, metadata, query_embedding, top_k):
     """
     Performs a similarity search using FAISS and returns the results.
     """
-    # Create FAISS index and add embeddings
+    # Create FAISS index and add embeddings; inner products of unit vectors
+    # are cosine similarities
     dimension = len(query_embedding)
-    index = faiss.IndexFlatL2(dimension)
+    index = faiss.IndexFlatIP(dimension)
     embeddings_matrix = np.vstack(embeddings).astype(np.float32)
+    faiss.normalize_L2(embeddings_matrix)
     index.add(embeddings_matrix)
 
     # Perform similarity search using FAISS
     query_vector = np.array([query_embedding], dtype=np.float32)
-    distances, indices = index.search(query_vector, top_k)
+    faiss.normalize_L2(query_vector)
+    similarities, indices = index.search(query_vector, top_k)
 
     # Prepare response based on search results
     response = []
@@ -33,8 +294,7 @@ def perform_faiss_similarity_search(embeddings, metadata, query_embedding, top_k
             continue
         result = metadata[indices[0][i]]
 
-        l2_distance = float(distances[0][i])
-        similarity = 1 / (1 + l2_distance)
+        similarity = float(similarities[0][i])
         result["similarity"] = round(similarity, 4)
 
         response.append(result)
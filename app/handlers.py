@@ -1,24 +1,155 @@
+import gzip
 import json
-import mimetypes
-import os
 import sqlite3
-import numpy as np
-from http.server import BaseHTTPRequestHandler
+import time
+import zlib
 from urllib.parse import unquote, urlparse, parse_qs
-from app.db import generate_song_hash, get_connection
-from app.embeddings import generate_embedding, perform_faiss_similarity_search
-
-conn = get_connection()
-cursor = conn.cursor()
+from app.db import (
+    SQLITE_MAX_PARAMS,
+    ConnectionPool,
+    embedding_to_blob,
+    encode_texts,
+    fetch_embeddings,
+    find_existing_hashes,
+    generate_song_hash,
+    song_full_text,
+    store_songs,
+    validate_song,
+)
+from app.config import (
+    GZIP_MIN_SIZE,
+    HTTP_IDLE_TIMEOUT,
+    HTTP_MAX_REQUESTS,
+    HTTP_REQUEST_TIMEOUT,
+    PROFILE_INTERVAL_MS,
+    PROFILE_SLOW_MS,
+    SEARCH_MAX_TOP_K,
+    STATIC_DIR,
+    STATIC_MAX_AGE,
+)
+from app.embeddings import model_ready, query_cache
+from app.http_server import KeepAliveRequestHandler
+from app.metrics import (
+    metric_family,
+    render,
+    request_seconds,
+    requests_in_flight,
+    requests_total,
+    slow_requests_total,
+    stage,
+)
+from app.profiler import SlowRequestProfiler
+from app.search import (
+    encode_cursor,
+    parse_page,
+    parse_search_request,
+    result_sets,
+    run_hybrid_search,
+    run_searches,
+    search,
+    search_batcher,
+)
+from app.static import StaticFiles, choose_encoding, is_not_modified
+
+# Each server thread gets its own tuned SQLite connection from the pool
+db_pool = ConnectionPool()
+
+# Static files are served from memory and reloaded when they change on disk
+static_files = StaticFiles(STATIC_DIR)
+
+# Samples the stacks of slow requests when SONGDB_PROFILE_SLOW_MS is set
+profiler = (
+    SlowRequestProfiler(PROFILE_SLOW_MS / 1000, PROFILE_INTERVAL_MS / 1000)
+    if PROFILE_SLOW_MS
+    else None
+)
+
+# API paths reported as endpoints in request metrics; static files are
+# reported as "static" and anything else as "other" to bound label values
+METRIC_ENDPOINTS = (
+    "/song",
+    "/songs/bulk",
+    "/song/similar",
+    "/search",
+    "/search/batch",
+    "/stats",
+    "/ready",
+    "/metrics",
+)
+
+# HTTP methods reported in request metrics; any other method is reported as
+# "other", since the client picks it
+METRIC_METHODS = ("GET", "POST", "DELETE", "HEAD")
+
+# Number of NDJSON rows inserted per transaction by the bulk endpoint
+BULK_CHUNK_SIZE = 512
+
+# Longest NDJSON line accepted by the bulk endpoint, in bytes
+BULK_MAX_LINE = 1024 * 1024
+
+# Most queries accepted by the batch search endpoint, and how many of them are
+# encoded and searched together before their results are written
+BATCH_SEARCH_MAX_QUERIES = 4096
+BATCH_SEARCH_CHUNK_SIZE = 64
+
+# Number of search results joined with song metadata and written at a time
+# by streamed search responses
+STREAM_CHUNK_SIZE = 256
+
+# gzip level for JSON responses, favouring speed since they are compressed
+# per request
+GZIP_LEVEL = 5
+
+
+class SongRequestHandler(KeepAliveRequestHandler):
+    timeout = HTTP_REQUEST_TIMEOUT
+    idle_timeout = HTTP_IDLE_TIMEOUT
+    max_requests = HTTP_MAX_REQUESTS
+
+    def parse_request(self):
+        # The request line has been read; time the request from here
+        self._started = time.perf_counter()
+        requests_in_flight.inc()
+        if profiler is not None:
+            profiler.start_request()
+        return super().parse_request()
+
+    def handle_one_request(self):
+        self._started = None
+        self._static = False
+        try:
+            super().handle_one_request()
+        finally:
+            if self._started is not None:
+                self._record_request(time.perf_counter() - self._started)
 
+    def _record_request(self, seconds):
+        """
+        Updates the request metrics and reports the request if it was slow.
+        """
+        requests_in_flight.dec()
+        path = urlparse(self.path).path if getattr(self, "path", None) else ""
+        if path in METRIC_ENDPOINTS:
+            endpoint = path
+        else:
+            endpoint = "static" if self._static else "other"
+        method = self.command if self.command in METRIC_METHODS else "other"
+        requests_total.inc(method, endpoint, str(self._status or 0))
+        request_seconds.observe(seconds, endpoint)
+        if profiler is not None:
+            if profiler.end_request(f"{self.command} {self.path}", seconds):
+                slow_requests_total.inc(endpoint)
 
-class SongRequestHandler(BaseHTTPRequestHandler):
     def do_POST(self):
         parsed_path = urlparse(self.path)
         if parsed_path.path == "/song":
             self.handle_add_song()
+        elif parsed_path.path == "/songs/bulk":
+            self.handle_bulk_add_songs()
         elif parsed_path.path == "/search":
             self.handle_search_songs()
+        elif parsed_path.path == "/search/batch":
+            self.handle_batch_search_songs()
         else:
             self.send_error(404, "Endpoint not found")
 
@@ -28,35 +159,71 @@ class SongRequestHandler(BaseHTTPRequestHandler):
 
         if parsed_path.path == "/":
             # Serve the static index.html for the root path
-            file_path = "static/index.html"
-        else:
-            # Prepend static directory to look for files
-            file_path = os.path.join("static", file_path)
+            file_path = "index.html"
 
-        # Check if the file exists and serve it
-        if os.path.exists(file_path) and os.path.isfile(file_path):
-            self.serve_file(file_path)
+        # Serve the file if it exists in the static directory
+        static_file = static_files.get(file_path)
+        if static_file is not None:
+            self.serve_file(static_file)
         elif parsed_path.path == "/song":
             # Handle specific /song endpoint
             self.handle_get_song()
+        elif parsed_path.path == "/song/similar":
+            self.handle_get_similar_songs()
+        elif parsed_path.path == "/stats":
+            self.handle_get_stats()
+        elif parsed_path.path == "/ready":
+            self.handle_get_ready()
+        elif parsed_path.path == "/metrics":
+            self.handle_get_metrics()
         else:
             # File not found, return 404
             self.send_error(404, "File not found")
 
-    def serve_file(self, file_path):
-        """Serve a static file."""
-        content_type, _ = mimetypes.guess_type(file_path)
-        if not content_type:
-            content_type = "text/html"
+    def serve_file(self, static_file):
+        """
+        Serves a cached static file.
 
-        try:
-            with open(file_path, "rb") as file:
-                self.send_response(200)
-                self.send_header("Content-type", content_type)
-                self.end_headers()
-                self.wfile.write(file.read())
-        except Exception as e:
-            self.send_error(500, f"Error serving file: {e}")
+        Sends the compressed variant the client accepts, and 304 Not Modified
+        when the client's copy is still current.
+
+        Args:
+            static_file (StaticFile): The file, see StaticFiles.get.
+        """
+        self._static = True
+        encoding = choose_encoding(
+            self.headers.get("Accept-Encoding"), static_file.variants
+        )
+        if encoding is None:
+            body, etag = static_file.body, static_file.etag
+        else:
+            body, etag = static_file.variants[encoding]
+
+        not_modified = is_not_modified(
+            self.headers.get("If-None-Match"),
+            self.headers.get("If-Modified-Since"),
+            etag,
+            static_file.mtime_ns / 1e9,
+        )
+        self.send_response(304 if not_modified else 200)
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", static_file.last_modified)
+        self.send_header(
+            "Cache-Control",
+            f"public, max-age={STATIC_MAX_AGE}" if STATIC_MAX_AGE else "no-cache",
+        )
+        if static_file.variants:
+            self.send_header("Vary", "Accept-Encoding")
+        if not_modified:
+            self.end_headers()
+            return
+
+        self.send_header("Content-Type", static_file.content_type)
+        if encoding is not None:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
 
     def do_DELETE(self):
         parsed_path = urlparse(self.path)
@@ -72,55 +239,231 @@ class SongRequestHandler(BaseHTTPRequestHandler):
         Reads the request body, parses JSON data, generates an embedding, and inserts the song into the database.
         Sends an appropriate response to the client.
         """
-        # Read the content length and body
-        content_length = int(self.headers["Content-Length"])
-        post_data = self.rfile.read(content_length)
-
-        # Parse JSON data
         try:
-            song_data = json.loads(post_data.decode("utf-8"))
-        except json.JSONDecodeError:
+            # Read and parse JSON data from request body
+            with stage("parse"):
+                post_data = self.read_body()
+                song_data = json.loads(post_data.decode("utf-8"))
+        except (TypeError, ValueError, json.JSONDecodeError):
             self.send_error(400, "Invalid JSON")
             return
 
-        # Generate song hash and embedding
+        try:
+            validate_song(song_data)
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+
+        # Generate song hash, and skip the model pass for songs already stored
         song_hash = generate_song_hash(song_data)
-        full_text = f"{song_data.get('song', '')}, {song_data.get('artist', '')}, {song_data.get('album', '')}, {song_data.get('year', '')}, {song_data.get('description', '')}"
-        embedding = generate_embedding(full_text)
-        embedding_str = json.dumps(embedding)
+        conn = db_pool.get()
+        if find_existing_hashes(conn.cursor(), [song_hash]):
+            self.send_error(409, "Song already exists")
+            return
 
-        # Insert into database
         try:
-            cursor.execute(
-                """
-            INSERT INTO songs (hash, artist, song, album, year, description, embedding)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-                (
-                    song_hash,
-                    song_data.get("artist", ""),
-                    song_data.get("song", ""),
-                    song_data.get("album", ""),
-                    song_data.get("year", None),
-                    song_data.get("description", ""),
-                    embedding_str,
-                ),
-            )
-            conn.commit()
-        except sqlite3.IntegrityError:
-            self.send_error(409, "Song already exists")
+            # Generate the embedding, reusing a cached one for the same text
+            with stage("encode"):
+                embedding = encode_texts(conn.cursor(), [song_full_text(song_data)])[0]
+
+            # Insert into database
+            with stage("db_write"):
+                conn.execute(
+                    """
+                INSERT INTO songs (hash, artist, song, album, year, description, embedding)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                    (
+                        song_hash,
+                        song_data.get("artist", ""),
+                        song_data.get("song", ""),
+                        song_data.get("album", ""),
+                        song_data.get("year", None),
+                        song_data.get("description", ""),
+                        embedding_to_blob(embedding),
+                    ),
+                )
+                conn.commit()
+            self.server.song_cache.invalidate([song_hash])
+        except sqlite3.Error as e:
+            # Roll back the embedding cache write too, so the pooled
+            # connection does not keep holding the write lock
+            conn.rollback()
+            if isinstance(e, sqlite3.IntegrityError):
+                self.send_error(409, "Song already exists")
+            else:
+                self.send_error(500, f"Database error: {e}")
             return
 
+        with stage("index_update"):
+            self.server.song_index.add([song_hash], [embedding], [song_data])
+
         # Send response
         self._send_json_response(
             201, {"hash": song_hash, "message": "Song added successfully"}
         )
 
+    def handle_bulk_add_songs(self):
+        """
+        Handles adding many songs from a newline-delimited JSON request body.
+
+        The body is read one line at a time, songs are embedded and inserted in
+        chunks of BULK_CHUNK_SIZE rows (one transaction per chunk), and a status
+        line (hash, created/duplicate/error) is streamed back for every input row.
+        """
+        self._start_stream(200, "application/x-ndjson")
+
+        chunk = []
+        for line_number, line in enumerate(self._iter_request_lines(), start=1):
+            if line is not None and not line.strip():
+                continue
+            chunk.append((line_number, line))
+            if len(chunk) >= BULK_CHUNK_SIZE:
+                self._write_bulk_statuses(self._add_song_chunk(chunk))
+                chunk = []
+        if chunk:
+            self._write_bulk_statuses(self._add_song_chunk(chunk))
+
+        self._end_stream()
+
+    def _add_song_chunk(self, chunk):
+        """
+        Parses and inserts one chunk of NDJSON lines in a single transaction.
+
+        Returns:
+            list: Status dictionaries, one per line in the chunk.
+        """
+        statuses = {}
+        songs = []
+        song_lines = []
+        for line_number, line in chunk:
+            if line is None:
+                statuses[line_number] = {
+                    "status": "error",
+                    "error": f"Line longer than {BULK_MAX_LINE} bytes",
+                }
+                continue
+            try:
+                song_data = json.loads(line.decode("utf-8"))
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                statuses[line_number] = {"status": "error", "error": "Invalid JSON"}
+                continue
+            try:
+                validate_song(song_data)
+            except ValueError as e:
+                statuses[line_number] = {"status": "error", "error": str(e)}
+                continue
+            songs.append(song_data)
+            song_lines.append(line_number)
+
+        if songs:
+            conn = db_pool.get()
+            try:
+                with stage("store"):
+                    results, song_hashes, embeddings, new_songs = store_songs(
+                        conn.cursor(), songs
+                    )
+                    conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                results = [(generate_song_hash(song), "error") for song in songs]
+                song_hashes = []
+                error = f"Database error: {e}"
+            else:
+                error = None
+                with stage("index_update"):
+                    self.server.song_index.add(song_hashes, embeddings, new_songs)
+
+            for line_number, (song_hash, status) in zip(song_lines, results):
+                statuses[line_number] = {"hash": song_hash, "status": status}
+                if error:
+                    statuses[line_number]["error"] = error
+
+        return [
+            {"line": line_number, **statuses[line_number]} for line_number, _ in chunk
+        ]
+
+    def _write_bulk_statuses(self, statuses):
+        """
+        Streams status dictionaries to the client as NDJSON lines.
+        """
+        self._write_stream(
+            "".join(
+                json.dumps(status, ensure_ascii=False) + "\n" for status in statuses
+            ).encode("utf-8")
+        )
+
+    def _iter_request_lines(self):
+        """
+        Yields the request body line by line without buffering all of it.
+
+        Supports both Content-Length and chunked transfer encoding. A line
+        longer than BULK_MAX_LINE is skipped and yielded as a single None.
+        """
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            pending = b""
+            skipping = False
+            for data in self._iter_request_chunks():
+                lines = (pending + data).split(b"\n")
+                pending = lines.pop()
+                for line in lines:
+                    if skipping:
+                        # The end of the oversized line
+                        skipping = False
+                        yield None
+                    else:
+                        yield line if len(line) <= BULK_MAX_LINE else None
+                if len(pending) > BULK_MAX_LINE:
+                    skipping = True
+                    pending = b""
+            self.body_read = True
+            if skipping:
+                yield None
+            elif pending:
+                yield pending
+            return
+
+        remaining = int(self.headers.get("Content-Length", 0))
+        while remaining > 0:
+            line = self.rfile.readline(min(remaining, BULK_MAX_LINE))
+            if not line:
+                break
+            remaining -= len(line)
+            if len(line) == BULK_MAX_LINE and not line.endswith(b"\n") and remaining:
+                # Skip the rest of an oversized line
+                while remaining > 0:
+                    rest = self.rfile.readline(min(remaining, BULK_MAX_LINE))
+                    if not rest:
+                        break
+                    remaining -= len(rest)
+                    if rest.endswith(b"\n"):
+                        break
+                line = None
+            if remaining == 0:
+                self.body_read = True
+            yield line
+
+    def _iter_request_chunks(self):
+        """
+        Yields the decoded chunks of a chunked transfer-encoded request body.
+        """
+        while True:
+            size_line = self.rfile.readline(BULK_MAX_LINE)
+            size = int(size_line.split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                # Skip optional trailers up to the terminating empty line
+                while self.rfile.readline(BULK_MAX_LINE).strip():
+                    pass
+                return
+            yield self.rfile.read(size)
+            self.rfile.readline(BULK_MAX_LINE)
+
     def handle_get_song(self):
         """
         Handles retrieving a song from the database by its hash.
 
         Parses query parameters, fetches the song from the database, and sends the song details to the client.
+        Frequently requested songs are served from pre-encoded responses.
         """
         # Parse query parameters
         parsed_path = urlparse(self.path)
@@ -131,29 +474,153 @@ class SongRequestHandler(BaseHTTPRequestHandler):
             self.send_error(400, "Missing song hash")
             return
 
-        # Retrieve song from database
-        cursor.execute(
-            "SELECT hash, artist, song, album, year, description FROM songs WHERE hash = ?",
-            (song_hash,),
-        )
-        row = cursor.fetchone()
+        # Retrieve the song's JSON body, from the hot-row cache when possible
+        body = self.server.song_cache.get(song_hash, self._load_song)
 
-        if row:
-            song_hash_db, artist_db, song_name_db, album_db, year_db, description_db = (
-                row
-            )
-            song_data = {
-                "hash": song_hash_db,
-                "artist": artist_db,
-                "song": song_name_db,
-                "album": album_db,
-                "year": year_db,
-                "description": description_db,
-            }
-            self._send_json_response(200, song_data)
+        if body is not None:
+            self._send_json_body(200, body)
         else:
             self.send_error(404, "Song not found")
 
+    def _load_song(self, song_hash):
+        """
+        Returns the metadata of a song, or None if it does not exist.
+        """
+        return self._fetch_songs([song_hash]).get(song_hash)
+
+    def handle_get_similar_songs(self):
+        """
+        Handles finding the songs most similar to a stored song.
+
+        Uses the song's stored embedding, so the model is never run; songs
+        requested recently are answered from the neighbour table.
+        """
+        query_params = parse_qs(urlparse(self.path).query)
+        song_hash = query_params.get("hash", [None])[0]
+        if not song_hash:
+            self.send_error(400, "Missing song hash")
+            return
+        try:
+            top_k = int(query_params.get("top_k", ["5"])[0])
+        except ValueError:
+            top_k = -1
+        if top_k < 0:
+            self.send_error(400, "top_k must be a non-negative integer")
+            return
+        if top_k > SEARCH_MAX_TOP_K:
+            self.send_error(400, f"top_k must be at most {SEARCH_MAX_TOP_K}")
+            return
+
+        with stage("neighbours"):
+            results = self.server.neighbours.similar(
+                song_hash, top_k, self._load_embedding
+            )
+        if results is None:
+            self.send_error(404, "Song not found")
+            return
+
+        songs = self._fetch_songs([result_hash for result_hash, _ in results])
+        self._send_json_response(200, self._attach_songs(results, songs))
+
+    def _load_embedding(self, song_hash):
+        """
+        Returns the stored embedding of a song, or None if it does not exist.
+        """
+        found, embeddings = fetch_embeddings(db_pool.get().cursor(), [song_hash])
+        return embeddings[0] if found else None
+
+    def handle_get_stats(self):
+        """
+        Handles reporting server statistics such as query cache hits and misses.
+        """
+        self._send_json_response(
+            200,
+            {
+                "songs": len(self.server.song_index),
+                "query_cache": query_cache.stats(),
+                "search_batches": search_batcher.stats(),
+                "result_sets": result_sets.stats(),
+                "similar_cache": self.server.neighbours.stats(),
+                "song_cache": self.server.song_cache.stats(),
+            },
+        )
+
+    def handle_get_metrics(self):
+        """
+        Handles the Prometheus scrape: request, stage and slow request metrics
+        plus the index, cache and batching figures of /stats, in the text
+        exposition format.
+        """
+        index = self.server.song_index
+        caches = {
+            "query": query_cache.stats(),
+            "result_sets": result_sets.stats(),
+            "similar": self.server.neighbours.stats(),
+            "song": self.server.song_cache.stats(),
+        }
+        batches = search_batcher.stats()
+        lines = []
+        lines += metric_family(
+            "gauge",
+            "songdb_index_songs",
+            "Songs in the vector index.",
+            [((), len(index))],
+        )
+        lines += metric_family(
+            "gauge",
+            "songdb_index_info",
+            "Vector index type and metric.",
+            [((index.index_type, index.metric), 1)],
+            ("type", "metric"),
+        )
+        lines += metric_family(
+            "gauge",
+            "songdb_model_ready",
+            "Whether the embedding model is loaded.",
+            [((), int(model_ready.is_set()))],
+        )
+        for field, kind, description in (
+            ("size", "gauge", "Entries in each cache."),
+            ("hits", "counter", "Cache hits."),
+            ("misses", "counter", "Cache misses."),
+            ("evictions", "counter", "Cache evictions."),
+        ):
+            name = f"songdb_cache_{field}" + ("_total" if kind == "counter" else "")
+            lines += metric_family(
+                kind,
+                name,
+                description,
+                [((cache,), stats[field]) for cache, stats in caches.items()],
+                ("cache",),
+            )
+        lines += metric_family(
+            "counter",
+            "songdb_search_batches_total",
+            "Coalesced search batches processed.",
+            [((), batches["batches"])],
+        )
+        lines += metric_family(
+            "counter",
+            "songdb_search_batch_items_total",
+            "Searches processed in coalesced batches.",
+            [((), batches["items"])],
+        )
+
+        body = render(lines).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_get_ready(self):
+        """
+        Handles the readiness probe: 200 once the embedding model is loaded and
+        searches no longer wait for it, 503 before that.
+        """
+        ready = model_ready.is_set()
+        self._send_json_response(200 if ready else 503, {"ready": ready})
+
     def handle_delete_song(self):
         """
         Handles deleting a song from the database by its hash.
@@ -170,12 +637,18 @@ class SongRequestHandler(BaseHTTPRequestHandler):
             return
 
         # Check if song exists and delete it
+        conn = db_pool.get()
+        cursor = conn.cursor()
         cursor.execute("SELECT hash FROM songs WHERE hash = ?", (song_hash,))
         row = cursor.fetchone()
 
         if row:
-            cursor.execute("DELETE FROM songs WHERE hash = ?", (song_hash,))
-            conn.commit()
+            with stage("db_write"):
+                cursor.execute("DELETE FROM songs WHERE hash = ?", (song_hash,))
+                conn.commit()
+            self.server.song_cache.invalidate([song_hash])
+            with stage("index_update"):
+                self.server.song_index.remove([song_hash])
             self._send_json_response(
                 200, {"message": f"Song with hash {song_hash} has been deleted."}
             )
@@ -185,102 +658,247 @@ class SongRequestHandler(BaseHTTPRequestHandler):
     def handle_search_songs(self):
         """
         Handles the search for songs based on the provided query and optional filters.
+
+        With offset/limit or a cursor the response is one page of the ranked
+        results, {"results": [...], "offset", "total", "next_cursor"}; every
+        page of a search comes from the same result set while it is cached. With
+        "stream": true the JSON body is written in chunks as results are joined
+        with their song metadata.
         """
         try:
             # Read and parse JSON data from request body
-            content_length = int(self.headers["Content-Length"])
-            post_data = self.rfile.read(content_length)
-            search_data = json.loads(post_data.decode("utf-8"))
-        except (ValueError, json.JSONDecodeError):
+            with stage("parse"):
+                post_data = self.read_body()
+                search_data = json.loads(post_data.decode("utf-8"))
+        except (TypeError, ValueError, json.JSONDecodeError):
             self.send_error(400, "Invalid JSON")
             return
 
-        # Extract search parameters from parsed data
-        query = search_data.get("query", "")
-        top_k = search_data.get("top_k", 5)
-        artist = search_data.get("artist", "")
-        song = search_data.get("song", "")
-        album = search_data.get("album", "")
-        year = search_data.get("year", None)
-
-        # Validate query parameter
-        if not query:
-            self.send_error(400, "Missing search query")
+        # Extract and validate search and pagination parameters; a cursor
+        # alone holds the search it continues
+        try:
+            request = None
+            if not isinstance(search_data, dict) or "cursor" not in search_data:
+                request = parse_search_request(search_data)
+            page = parse_page(search_data, request)
+            if page is not None:
+                request = page.request
+            stream = search_data.get("stream") is True
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+
+        # Later pages reuse the ranked result set of the first one, or run the
+        # search again if it expired or was cached by another process
+        results = result_sets.get(page.key) if page is not None else None
+        if results is None:
+            # Query the persistent index, filtering through its posting lists.
+            # Concurrent searches are encoded and searched together; repeated
+            # queries reuse cached embeddings. Hybrid searches narrow the
+            # candidates with the full-text index first
+            if request.mode == "hybrid":
+                results = run_hybrid_search(
+                    self.server.song_index, db_pool.get().cursor(), request
+                )
+            else:
+                results = search(self.server.song_index, request)
+            if page is not None:
+                result_sets.put(page.key, results)
+
+        # Attach song metadata to the results and send the response
+        meta = None
+        if page is not None:
+            end = page.offset + page.limit
+            meta = {
+                "offset": page.offset,
+                "total": len(results),
+                "next_cursor": (
+                    encode_cursor(page._replace(offset=end))
+                    if end < len(results)
+                    else None
+                ),
+            }
+            results = results[page.offset : end]
+
+        if stream:
+            self._stream_search_results(results, meta)
             return
+        response = self._attach_songs(
+            results, self._fetch_songs([result[0] for result in results])
+        )
+        if meta is not None:
+            response = {"results": response, **meta}
+        self._send_json_response(200, response)
 
-        # Generate query embedding
-        query_embedding = generate_embedding(query)
+    def _stream_search_results(self, results, meta=None):
+        """
+        Writes search results as a chunked JSON body, STREAM_CHUNK_SIZE at a time.
 
-        # Construct SQL query with optional filters
-        sql_query, params = self._construct_sql_query(artist, song, album, year)
+        Args:
+            results (list): Search result tuples, see _attach_songs.
+            meta (dict, optional): Pagination fields; when given the body is an
+                object with the results under "results", otherwise a list.
+        """
+        self._start_stream(200, "application/json")
+        self._write_stream(b'{"results": [' if meta is not None else b"[")
+        separator = ""
+        for start in range(0, len(results), STREAM_CHUNK_SIZE):
+            chunk = results[start : start + STREAM_CHUNK_SIZE]
+            songs = self._fetch_songs([result[0] for result in chunk])
+            matches = self._attach_songs(chunk, songs)
+            if matches:
+                data = ", ".join(
+                    json.dumps(match, ensure_ascii=False) for match in matches
+                )
+                self._write_stream((separator + data).encode("utf-8"))
+                separator = ", "
+        if meta is not None:
+            # Close the list and append the pagination fields to the object
+            self._write_stream(b"], " + json.dumps(meta).encode("utf-8")[1:])
+        else:
+            self._write_stream(b"]")
+        self._end_stream()
 
-        # Execute SQL query and retrieve results
-        cursor.execute(sql_query, params)
-        rows = cursor.fetchall()
+    def handle_batch_search_songs(self):
+        """
+        Handles many searches in one request.
 
-        # Extract embeddings and metadata
-        embeddings, metadata = self._extract_embeddings_and_metadata(rows)
+        The body is {"queries": [...]} where each entry takes the same fields as
+        a /search body. Queries are encoded together and searched with
+        multi-vector index searches; results come back in request order, as a
+        JSON list of result lists or, with "stream": true or an
+        application/x-ndjson Accept header, as one NDJSON line per query.
+        """
+        try:
+            with stage("parse"):
+                post_data = self.read_body()
+                batch_data = json.loads(post_data.decode("utf-8"))
+        except (TypeError, ValueError, json.JSONDecodeError):
+            self.send_error(400, "Invalid JSON")
+            return
 
-        # Perform similarity search if embeddings are available
-        if embeddings:
-            response = perform_faiss_similarity_search(
-                embeddings, metadata, query_embedding, top_k
+        queries = batch_data.get("queries") if isinstance(batch_data, dict) else None
+        if not isinstance(queries, list) or not queries:
+            self.send_error(400, "Missing queries list")
+            return
+        if len(queries) > BATCH_SEARCH_MAX_QUERIES:
+            self.send_error(
+                413, f"At most {BATCH_SEARCH_MAX_QUERIES} queries per batch"
             )
-        else:
-            response = []
+            return
 
-        # Send response
-        self._send_json_response(200, response)
+        # Validate every query before doing any work
+        requests = []
+        for position, search_data in enumerate(queries):
+            try:
+                requests.append(parse_search_request(search_data))
+            except ValueError as e:
+                self.send_error(400, f"Query {position}: {e}")
+                return
+
+        stream = batch_data.get("stream") is True or "application/x-ndjson" in (
+            self.headers.get("Accept") or ""
+        )
+        if stream:
+            self._start_stream(200, "application/x-ndjson")
+
+        response = []
+        for start in range(0, len(requests), BATCH_SEARCH_CHUNK_SIZE):
+            chunk = requests[start : start + BATCH_SEARCH_CHUNK_SIZE]
+            chunk_results = self._run_search_chunk(chunk)
+            songs = self._fetch_songs(
+                list({result[0] for results in chunk_results for result in results})
+            )
+            for position, results in enumerate(chunk_results, start=start):
+                matches = self._attach_songs(results, songs)
+                if stream:
+                    line = {"index": position, "results": matches}
+                    self._write_stream(
+                        json.dumps(line, ensure_ascii=False).encode("utf-8") + b"\n"
+                    )
+                else:
+                    response.append(matches)
+
+        if stream:
+            self._end_stream()
+        else:
+            self._send_json_response(200, response)
 
-    def _construct_sql_query(self, artist, song, album, year):
+    def _run_search_chunk(self, requests):
         """
-        Constructs an SQL query with optional filters based on the provided parameters.
+        Answers a chunk of batch search requests, batching the vector ones.
         """
-        sql_query = "SELECT hash, artist, song, album, year, description, embedding FROM songs WHERE 1=1"
-        params = []
-        if artist:
-            sql_query += " AND artist = ?"
-            params.append(artist)
-        if song:
-            sql_query += " AND song = ?"
-            params.append(song)
-        if album:
-            sql_query += " AND album = ?"
-            params.append(album)
-        if year:
-            sql_query += " AND year = ?"
-            params.append(year)
-        return sql_query, params
+        results = [None] * len(requests)
+        vector_rows = []
+        for row, request in enumerate(requests):
+            if request.mode == "hybrid":
+                results[row] = run_hybrid_search(
+                    self.server.song_index, db_pool.get().cursor(), request
+                )
+            else:
+                vector_rows.append(row)
+        if vector_rows:
+            vector_results = run_searches(
+                self.server.song_index, [requests[row] for row in vector_rows]
+            )
+            for row, row_results in zip(vector_rows, vector_results):
+                results[row] = row_results
+        return results
+
+    def _attach_songs(self, results, songs):
+        """
+        Turns search results into song dictionaries.
+
+        Args:
+            results (list): (song_hash, similarity) tuples, most similar first, or
+                (song_hash, similarity, score) tuples from hybrid searches.
+            songs (dict): Song metadata keyed by hash, see _fetch_songs.
 
-    def _extract_embeddings_and_metadata(self, rows):
+        Returns:
+            list: Copies of the song dictionaries with similarity (and hybrid
+            score) fields, skipping songs deleted since the search.
+        """
+        response = []
+        for song_hash, similarity, *score in results:
+            if song_hash not in songs:
+                continue
+            result = dict(songs[song_hash])
+            result["similarity"] = round(similarity, 4)
+            if score:
+                result["score"] = round(score[0], 4)
+            response.append(result)
+        return response
+
+    def _fetch_songs(self, song_hashes):
         """
-        Extracts embeddings and metadata from the retrieved database rows.
+        Fetches the metadata of the given songs, keyed by song hash.
         """
-        embeddings = []
-        metadata = []
+        if not song_hashes:
+            return {}
+
+        cursor = db_pool.get().cursor()
+        rows = []
+        with stage("fetch"):
+            for start in range(0, len(song_hashes), SQLITE_MAX_PARAMS):
+                chunk = song_hashes[start : start + SQLITE_MAX_PARAMS]
+                placeholders = ", ".join("?" for _ in chunk)
+                cursor.execute(
+                    f"SELECT hash, artist, song, album, year, description FROM songs WHERE hash IN ({placeholders})",
+                    chunk,
+                )
+                rows.extend(cursor.fetchall())
+        songs = {}
         for row in rows:
-            (
-                song_hash,
-                artist_name,
-                song_name,
-                album_name,
-                year_value,
-                description,
-                embedding_str,
-            ) = row
-            embedding = np.array(json.loads(embedding_str), dtype=np.float32)
-            embeddings.append(embedding)
-            metadata.append(
-                {
-                    "hash": song_hash,
-                    "artist": artist_name,
-                    "song": song_name,
-                    "album": album_name,
-                    "year": year_value,
-                    "description": description,
-                }
-            )
-        return embeddings, metadata
+            song_hash, artist_name, song_name, album_name, year_value, description = row
+            songs[song_hash] = {
+                "hash": song_hash,
+                "artist": artist_name,
+                "song": song_name,
+                "album": album_name,
+                "year": year_value,
+                "description": description,
+            }
+        return songs
 
     def _send_json_response(self, status_code, response_data):
         """
@@ -290,7 +908,94 @@ class SongRequestHandler(BaseHTTPRequestHandler):
             status_code (int): HTTP status code to send.
             response_data (dict): Dictionary containing response data to send as JSON.
         """
+        with stage("serialize"):
+            body = json.dumps(response_data, ensure_ascii=False).encode("utf-8")
+        self._send_json_body(status_code, body)
+
+    def _send_json_body(self, status_code, body):
+        """
+        Sends an already encoded JSON response body.
+
+        Bodies of at least GZIP_MIN_SIZE bytes are gzip-compressed when the
+        client accepts it.
+
+        Args:
+            status_code (int): HTTP status code to send.
+            body (bytes): The UTF-8 JSON body.
+        """
+        compress = GZIP_MIN_SIZE and len(body) >= GZIP_MIN_SIZE and self._accepts_gzip()
+
         self.send_response(status_code)
         self.send_header("Content-Type", "application/json")
+        if compress:
+            with stage("compress"):
+                body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+            self.send_header("Content-Encoding", "gzip")
+        if GZIP_MIN_SIZE:
+            self.send_header("Vary", "Accept-Encoding")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _accepts_gzip(self):
+        """
+        Returns True if the client accepts gzip-compressed responses.
+        """
+        return choose_encoding(self.headers.get("Accept-Encoding"), ("gzip",)) == "gzip"
+
+    def _start_stream(self, status_code, content_type):
+        """
+        Sends the response headers for a body that is written incrementally.
+
+        Uses chunked transfer encoding when the connection speaks HTTP/1.1,
+        otherwise the end of the body is marked by closing the connection. The
+        body is gzip-compressed when the client accepts it, flushing the
+        compressor with every write so pieces still reach the client promptly.
+        """
+        self._chunked = (
+            self.protocol_version == "HTTP/1.1" and self.request_version == "HTTP/1.1"
+        )
+        self._compressor = None
+        if GZIP_MIN_SIZE and self._accepts_gzip():
+            self._compressor = zlib.compressobj(
+                GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+            )
+        self.send_response(status_code)
+        self.send_header("Content-Type", content_type)
+        if GZIP_MIN_SIZE:
+            self.send_header("Vary", "Accept-Encoding")
+        if self._compressor is not None:
+            self.send_header("Content-Encoding", "gzip")
+        if self._chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.close_connection = True
         self.end_headers()
-        self.wfile.write(json.dumps(response_data, ensure_ascii=False).encode("utf-8"))
+
+    def _write_stream(self, data):
+        """
+        Writes a piece of a streamed response body.
+        """
+        if data and self._compressor is not None:
+            data = self._compressor.compress(data)
+            data += self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        self._write_stream_data(data)
+
+    def _write_stream_data(self, data):
+        if not data:
+            return
+        if self._chunked:
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        else:
+            self.wfile.write(data)
+        self.wfile.flush()
+
+    def _end_stream(self):
+        """
+        Terminates a streamed response body.
+        """
+        if self._compressor is not None:
+            self._write_stream_data(self._compressor.flush())
+        if self._chunked:
+            self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
@@ -0,0 +1,216 @@
+import ssl
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+SERVER_MODES = ("single", "threaded", "prefork")
+
+
+class PooledHTTPServer(HTTPServer):
+    """
+    HTTP server that handles each connection on a bounded pool of worker threads.
+
+    At most max_pending connections are queued or in progress; beyond that the
+    accept loop waits, leaving further clients in the listen backlog.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, server_address, handler_class, workers=8, max_pending=None):
+        super().__init__(server_address, handler_class)
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="songdb-worker"
+        )
+        self._pending = threading.BoundedSemaphore(max_pending or workers * 4)
+        self._waiting = 0
+        self._waiting_lock = threading.Lock()
+
+    def saturated(self):
+        """
+        Returns True while accepted connections wait for a free worker.
+
+        Handlers close persistent connections instead of keeping them open
+        when the pool is saturated, so idle clients do not starve new ones.
+        """
+        return self._waiting > 0
+
+    def process_request(self, request, client_address):
+        self._pending.acquire()
+        with self._waiting_lock:
+            self._waiting += 1
+        try:
+            self._executor.submit(self._process_request_worker, request, client_address)
+        except RuntimeError:
+            # The pool is shutting down
+            with self._waiting_lock:
+                self._waiting -= 1
+            self._pending.release()
+            self.shutdown_request(request)
+
+    def _process_request_worker(self, request, client_address):
+        with self._waiting_lock:
+            self._waiting -= 1
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._pending.release()
+
+    def finish_request(self, request, client_address):
+        # Complete the TLS handshake here, on the worker thread, so a slow
+        # client does not hold up the accept loop
+        if isinstance(request, ssl.SSLSocket):
+            request.settimeout(getattr(self.RequestHandlerClass, "timeout", None))
+            try:
+                request.do_handshake()
+            except (ssl.SSLError, OSError):
+                return
+        super().finish_request(request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=True)
+
+
+class ReusePortHTTPServer(PooledHTTPServer):
+    """
+    PooledHTTPServer whose listening socket sets SO_REUSEPORT, so that several
+    processes can bind the same port and the kernel spreads connections
+    across them.
+    """
+
+    allow_reuse_port = True
+
+
+class KeepAliveRequestHandler(BaseHTTPRequestHandler):
+    """
+    Request handler that keeps HTTP/1.1 connections open between requests.
+
+    A connection serves at most max_requests requests and is closed after
+    idle_timeout seconds without one, or as soon as the server has no worker
+    to spare (see PooledHTTPServer.saturated); servers without a worker pool
+    close every connection. Every response must be framed by Content-Length
+    or chunked transfer encoding. A request whose body is not read to the end
+    closes the connection, so leftover body bytes are never parsed as the next
+    request.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    # Headers and body go out in separate writes; with Nagle's algorithm the
+    # body would wait for the client's delayed ACK on a reused connection
+    disable_nagle_algorithm = True
+
+    # Seconds a socket read or write may block while a request is handled
+    timeout = 60
+
+    # Seconds a connection may wait for its next request
+    idle_timeout = 5
+
+    # Most requests served on one connection
+    max_requests = 100
+
+    def setup(self):
+        super().setup()
+        self.requests_handled = 0
+
+    def handle(self):
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection:
+            self.connection.settimeout(self.idle_timeout)
+            self.handle_one_request()
+
+    def handle_one_request(self):
+        self.body_read = False
+        self._status = None
+        super().handle_one_request()
+        self.requests_handled += 1
+        if not self.close_connection and self._has_body() and not self.body_read:
+            self.close_connection = True
+
+    def parse_request(self):
+        # The request line arrived; the idle wait is over
+        self.connection.settimeout(self.timeout)
+        return super().parse_request()
+
+    def read_body(self):
+        """
+        Reads the whole request body framed by Content-Length.
+
+        Raises:
+            TypeError: If the request has no Content-Length header.
+            ValueError: If the Content-Length header is not an integer.
+        """
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.body_read = True
+        return body
+
+    def send_response_only(self, code, message=None):
+        self._status = code
+        super().send_response_only(code, message)
+
+    def end_headers(self):
+        # Interim (1xx) responses leave the connection alone
+        if (
+            self._status is not None
+            and self._status >= 200
+            and not self.close_connection
+        ):
+            if not self._keep_alive():
+                self.send_header("Connection", "close")
+            elif self.request_version == "HTTP/1.0":
+                self.send_header("Connection", "keep-alive")
+        super().end_headers()
+
+    def log_error(self, format, *args):
+        # Waiting for a next request that never comes is routine
+        if self.requests_handled and format.startswith("Request timed out"):
+            return
+        super().log_error(format, *args)
+
+    def _keep_alive(self):
+        saturated = getattr(self.server, "saturated", None)
+        return (
+            saturated is not None
+            and not saturated()
+            and self.requests_handled + 1 < self.max_requests
+        )
+
+    def _has_body(self):
+        if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+            return True
+        try:
+            return int(self.headers.get("Content-Length") or 0) > 0
+        except ValueError:
+            return True
+
+
+def make_server(server_address, handler_class, mode="threaded", workers=8):
+    """
+    Creates the HTTP server for the requested serving mode.
+
+    Args:
+        server_address (tuple): (host, port) to listen on.
+        handler_class (type): The request handler class.
+        mode (str): "single" to handle one request at a time, "threaded" to use
+            a bounded pool of worker threads, or "prefork" for a threaded
+            server that shares its port with other worker processes.
+        workers (int): Number of worker threads in threaded and prefork modes.
+
+    Returns:
+        HTTPServer: The server instance.
+
+    Raises:
+        ValueError: If the mode is unknown.
+    """
+    if mode == "single":
+        return HTTPServer(server_address, handler_class)
+    if mode == "threaded":
+        return PooledHTTPServer(server_address, handler_class, workers=workers)
+    if mode == "prefork":
+        return ReusePortHTTPServer(server_address, handler_class, workers=workers)
+    raise ValueError(f"Unknown server mode: {mode}")
@@ -0,0 +1,895 @@
+import bisect
+import logging
+import math
+import os
+import threading
+from contextlib import contextmanager
+import faiss
+import numpy as np
+from app.config import INDEX_EF_SEARCH, INDEX_NPROBE
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIMENSION = 384
+
+# Supported FAISS index backends
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+
+# Vector comparison: "cosine" uses inner-product kernels, "l2" Euclidean ones.
+# Vectors are normalized either way, so both rank alike and report cosine.
+METRICS = ("cosine", "l2")
+
+# FAISS needs about this many training points per IVF centroid / PQ code
+MIN_POINTS_PER_CENTROID = 39
+PQ_BITS = 8
+PQ_CENTROIDS = 2**PQ_BITS
+
+# Song metadata fields that searches can filter on
+FILTER_FIELDS = ("artist", "song", "album", "year")
+
+# Filtered searches matching at most this many songs are scored exactly over
+# just those songs instead of scanning the index with an ID selector
+EXACT_FILTER_LIMIT = 4096
+
+
+def song_id(song_hash):
+    """
+    Maps a song hash to the 64-bit integer id used inside the FAISS index.
+
+    Args:
+        song_hash (str): SHA-256 hex digest identifying the song.
+
+    Returns:
+        int: A positive 60-bit id derived from the hash prefix.
+    """
+    return int(song_hash[:15], 16)
+
+
+class ReadWriteLock:
+    """
+    Lock that lets many readers in at once but gives writers exclusive access.
+
+    Waiting writers block new readers so a steady stream of searches cannot
+    starve updates.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._condition:
+            while self._writer or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._condition:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._condition.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = False
+                self._condition.notify_all()
+
+
+def default_nlist(num_vectors):
+    """
+    Returns the number of IVF lists to use for a catalog of the given size.
+    """
+    return max(1, int(4 * math.sqrt(num_vectors)))
+
+
+def min_training_points(index_type, nlist):
+    """
+    Returns how many vectors an index type needs before it can be trained.
+    """
+    if index_type == "ivf_flat":
+        return MIN_POINTS_PER_CENTROID * nlist
+    if index_type == "ivf_pq":
+        return max(MIN_POINTS_PER_CENTROID * nlist, 4 * PQ_CENTROIDS)
+    return 0
+
+
+def normalize_vectors(embeddings, dimension=EMBEDDING_DIMENSION):
+    """
+    Returns a contiguous float32 copy of the embeddings scaled to unit length.
+
+    Args:
+        embeddings (list or np.ndarray): One vector or a matrix of vectors.
+        dimension (int): Embedding dimension.
+
+    Returns:
+        np.ndarray: A (n, dimension) matrix of unit vectors.
+    """
+    matrix = np.array(embeddings, dtype=np.float32).reshape(-1, dimension)
+    faiss.normalize_L2(matrix)
+    return matrix
+
+
+def create_faiss_index(
+    index_type, dimension, metric="cosine", nlist=1, hnsw_m=32, pq_m=48
+):
+    """
+    Creates an empty FAISS index of the requested type.
+
+    Args:
+        index_type (str): One of INDEX_TYPES.
+        dimension (int): Embedding dimension.
+        metric (str): One of METRICS.
+        nlist (int): Number of inverted lists for the IVF types.
+        hnsw_m (int): Number of graph neighbours per node for HNSW.
+        pq_m (int): Number of product-quantizer sub-vectors for IVF-PQ.
+
+    Returns:
+        faiss.Index: The new index; IVF indexes still need training.
+
+    Raises:
+        ValueError: If the index type or metric is unknown.
+    """
+    if metric == "cosine":
+        metric_type = faiss.METRIC_INNER_PRODUCT
+        flat_class = faiss.IndexFlatIP
+    elif metric == "l2":
+        metric_type = faiss.METRIC_L2
+        flat_class = faiss.IndexFlatL2
+    else:
+        raise ValueError(f"Unknown metric: {metric}")
+
+    if index_type == "flat":
+        return flat_class(dimension)
+    if index_type == "hnsw":
+        return faiss.IndexHNSWFlat(dimension, hnsw_m, metric_type)
+    if index_type == "ivf_flat":
+        return faiss.IndexIVFFlat(flat_class(dimension), dimension, nlist, metric_type)
+    if index_type == "ivf_pq":
+        return faiss.IndexIVFPQ(
+            flat_class(dimension), dimension, nlist, pq_m, PQ_BITS, metric_type
+        )
+    raise ValueError(f"Unknown index type: {index_type}")
+
+
+def detect_index_type(faiss_index):
+    """
+    Returns the INDEX_TYPES name of a FAISS index, or None if it is not supported.
+    """
+    faiss_index = faiss.downcast_index(faiss_index)
+    if isinstance(faiss_index, faiss.IndexHNSWFlat):
+        return "hnsw"
+    if isinstance(faiss_index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(faiss_index, faiss.IndexIVFFlat):
+        return "ivf_flat"
+    if isinstance(faiss_index, faiss.IndexFlat):
+        return "flat"
+    return None
+
+
+def year_key(value):
+    """
+    Normalizes a year given as an int or a numeric string; other values give None.
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class FilterIndex:
+    """
+    Posting lists from artist, song title, album and year to song ids.
+
+    Used to resolve metadata filters into the set of matching songs without
+    touching the database. Years are also kept sorted to answer range filters.
+    """
+
+    def __init__(self):
+        self.postings = {field: {} for field in FILTER_FIELDS}
+        self.values = {}
+        self.years = []
+
+    def add(self, faiss_id, song_data):
+        """
+        Indexes the filterable metadata of one song.
+
+        Args:
+            faiss_id (int): The song id, see song_id.
+            song_data (dict): Song metadata.
+        """
+        self.remove(faiss_id)
+        values = (
+            song_data.get("artist") or "",
+            song_data.get("song") or "",
+            song_data.get("album") or "",
+            year_key(song_data.get("year")),
+        )
+        self.values[faiss_id] = values
+        for field, value in zip(FILTER_FIELDS, values):
+            postings = self.postings[field]
+            if value not in postings:
+                postings[value] = set()
+                if field == "year" and value is not None:
+                    bisect.insort(self.years, value)
+            postings[value].add(faiss_id)
+
+    def remove(self, faiss_id):
+        """
+        Drops a song from the posting lists. Unknown ids are ignored.
+        """
+        values = self.values.pop(faiss_id, None)
+        if values is None:
+            return
+        for field, value in zip(FILTER_FIELDS, values):
+            postings = self.postings[field]
+            postings[value].discard(faiss_id)
+            if not postings[value]:
+                del postings[value]
+                if field == "year" and value is not None:
+                    self.years.remove(value)
+
+    def match(
+        self,
+        artist=None,
+        song=None,
+        album=None,
+        year=None,
+        year_from=None,
+        year_to=None,
+    ):
+        """
+        Returns the ids of the songs matching every given filter.
+
+        Empty filters are ignored. artist, song, album and year must match
+        exactly; year_from and year_to bound the year inclusively.
+
+        Returns:
+            set: Matching ids, or None when no filter was given.
+        """
+        candidates = []
+        for field, value in (("artist", artist), ("song", song), ("album", album)):
+            if value:
+                candidates.append(self.postings[field].get(value, set()))
+        if year is not None:
+            candidates.append(self.postings["year"].get(year_key(year), set()))
+        if year_from is not None or year_to is not None:
+            start = (
+                bisect.bisect_left(self.years, year_from)
+                if year_from is not None
+                else 0
+            )
+            end = (
+                bisect.bisect_right(self.years, year_to)
+                if year_to is not None
+                else len(self.years)
+            )
+            in_range = set()
+            for value in self.years[start:end]:
+                in_range |= self.postings["year"][value]
+            candidates.append(in_range)
+
+        if not candidates:
+            return None
+        candidates.sort(key=len)
+        return set(candidates[0]).intersection(*candidates[1:])
+
+
+class SongIndex:
+    """
+    Long-lived FAISS index over song embeddings, keyed by song hash.
+
+    The index is built once at startup and then updated in place when songs are
+    added or deleted, so a search only has to run the query against it. Searches
+    may run concurrently; updates take the index exclusively.
+
+    Besides exact search ("flat") the index can use the approximate HNSW,
+    IVF-Flat and IVF-PQ backends. HNSW graphs cannot drop vectors, so deleted
+    songs are kept as tombstones and filtered out of search results.
+
+    Metadata filters are resolved through in-memory posting lists, so a filtered
+    search only looks at the matching songs.
+
+    Vectors are L2-normalized on the way in and similarities are reported as
+    cosine similarity.
+
+    An index loaded with mmap=True reads its vectors from the page cache, so
+    processes mapping the same file share one copy. Such an index is read-only:
+    deleted songs become tombstones and new songs are left for the next saved
+    generation of the index.
+    """
+
+    def __init__(
+        self,
+        dimension=EMBEDDING_DIMENSION,
+        index_type="flat",
+        metric="cosine",
+        **options,
+    ):
+        """
+        Args:
+            dimension (int): Embedding dimension.
+            index_type (str): One of INDEX_TYPES.
+            metric (str): One of METRICS.
+            **options: nlist, hnsw_m and pq_m, see create_faiss_index.
+        """
+        self.dimension = dimension
+        self.index_type = index_type
+        self.metric = metric
+        self.options = options
+        self.index = self._wrap(
+            create_faiss_index(index_type, dimension, metric, **options)
+        )
+        self.hashes = {}
+        self.tombstones = set()
+        self.read_only = False
+        # Objects with songs_added(song_hashes, embeddings) and
+        # songs_removed(song_hashes) methods, called after each change
+        self.listeners = []
+        self.filters = FilterIndex()
+        self.lock = ReadWriteLock()
+
+    def __len__(self):
+        return len(self.hashes)
+
+    @property
+    def is_ivf(self):
+        return self.index_type in ("ivf_flat", "ivf_pq")
+
+    def _wrap(self, faiss_index):
+        # IVF indexes store our ids themselves and, with a hash table direct
+        # map, can look vectors up by id and still remove them. Flat and HNSW
+        # indexes need an ID map on top.
+        if self.is_ivf:
+            faiss_index.set_direct_map_type(faiss.DirectMap.Hashtable)
+            return faiss_index
+        return faiss.IndexIDMap2(faiss_index)
+
+    def _stored_ids(self):
+        # Every id with a vector in the FAISS index, including tombstones
+        if not self.is_ivf:
+            return set(faiss.vector_to_array(self.index.id_map).tolist())
+        invlists = self.index.invlists
+        ids = set()
+        for list_no in range(self.index.nlist):
+            size = invlists.list_size(list_no)
+            if size:
+                ids.update(faiss.rev_swig_ptr(invlists.get_ids(list_no), size))
+        return ids
+
+    def __contains__(self, song_hash):
+        return song_id(song_hash) in self.hashes
+
+    @property
+    def is_trained(self):
+        return self.index.is_trained
+
+    def train(self, embeddings):
+        """
+        Trains the IVF quantizers on a sample of embeddings. No-op for flat and HNSW.
+
+        Args:
+            embeddings (np.ndarray): Training vectors.
+        """
+        matrix = normalize_vectors(embeddings, self.dimension)
+        with self.lock.write():
+            self.index.train(matrix)
+
+    def add(self, song_hashes, embeddings, songs=None):
+        """
+        Adds song embeddings to the index, skipping songs that are already indexed.
+
+        A read-only index only takes back songs whose vectors it still holds.
+
+        Args:
+            song_hashes (list): Song hashes, one per embedding.
+            embeddings (list or np.ndarray): Embedding vectors matching song_hashes.
+            songs (list, optional): Song metadata matching song_hashes, indexed
+                for filtered searches.
+
+        Returns:
+            list: Hashes of the songs that were added.
+
+        Raises:
+            ValueError: If the index still needs training.
+        """
+        if not self.is_trained:
+            raise ValueError(f"The {self.index_type} index must be trained first")
+
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dimension)
+        with self.lock.write():
+            ids = []
+            rows = []
+            added_rows = []
+            for row, song_hash in enumerate(song_hashes):
+                faiss_id = song_id(song_hash)
+                if faiss_id in self.hashes:
+                    continue
+                if self.read_only and faiss_id not in self.tombstones:
+                    continue
+                self.hashes[faiss_id] = song_hash
+                added_rows.append(row)
+                if songs is not None:
+                    self.filters.add(faiss_id, songs[row])
+                if faiss_id in self.tombstones:
+                    # The vector is still in the graph, same hash means same song
+                    self.tombstones.discard(faiss_id)
+                    continue
+                ids.append(faiss_id)
+                rows.append(row)
+
+            if ids:
+                self.index.add_with_ids(
+                    normalize_vectors(matrix[rows], self.dimension),
+                    np.array(ids, dtype=np.int64),
+                )
+
+        added_hashes = [song_hashes[row] for row in added_rows]
+        if added_rows and self.listeners:
+            for listener in self.listeners:
+                listener.songs_added(added_hashes, matrix[added_rows])
+        return added_hashes
+
+    def remove(self, song_hashes):
+        """
+        Removes songs from the index. Unknown hashes are ignored.
+
+        Args:
+            song_hashes (list): Hashes of the songs to remove.
+
+        Returns:
+            list: Hashes of the songs that were removed.
+        """
+        removed = []
+        with self.lock.write():
+            for song_hash in song_hashes:
+                if self.hashes.pop(song_id(song_hash), None):
+                    removed.append(song_hash)
+            self._remove_ids([song_id(song_hash) for song_hash in removed])
+
+        if removed:
+            for listener in self.listeners:
+                listener.songs_removed(removed)
+        return removed
+
+    def _remove_ids(self, ids):
+        if not ids:
+            return
+        for faiss_id in ids:
+            self.filters.remove(faiss_id)
+        ids = np.array(list(ids), dtype=np.int64)
+        if self.index_type == "hnsw" or self.read_only:
+            self.tombstones.update(ids.tolist())
+        elif self.is_ivf:
+            self.index.remove_ids(faiss.IDSelectorArray(ids))
+        else:
+            self.index.remove_ids(faiss.IDSelectorBatch(ids))
+
+    def restore(self, song_hashes, songs=None):
+        """
+        Rebuilds the hash map of an index loaded from disk against the database.
+
+        Vectors whose song is no longer in the database are removed.
+
+        Args:
+            song_hashes (list): Hashes of every song in the database.
+            songs (list, optional): Song metadata matching song_hashes.
+
+        Returns:
+            list: Hashes of songs that are missing from the index.
+        """
+        with self.lock.write():
+            stored = self._stored_ids()
+            missing = []
+            for row, song_hash in enumerate(song_hashes):
+                faiss_id = song_id(song_hash)
+                if faiss_id in stored:
+                    self.hashes[faiss_id] = song_hash
+                    if songs is not None:
+                        self.filters.add(faiss_id, songs[row])
+                else:
+                    missing.append(song_hash)
+            self._remove_ids(stored - set(self.hashes))
+        return missing
+
+    def rebuild(self, song_hashes, embeddings, songs=None):
+        """
+        Replaces the contents with a freshly built index of the same type.
+
+        Rebuilding retrains IVF quantizers on the current songs and drops the
+        tombstones of HNSW and read-only indexes. Searches keep using the old
+        contents until the new index is swapped in.
+
+        Args:
+            song_hashes (list): Song hashes, one per embedding.
+            embeddings (np.ndarray): Embedding matrix matching song_hashes.
+            songs (list, optional): Song metadata matching song_hashes.
+
+        Returns:
+            tuple: Hashes of the songs added and removed by the rebuild.
+        """
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dimension)
+        fresh = build_index(
+            song_hashes,
+            matrix,
+            self.index_type,
+            songs,
+            metric=self.metric,
+            **self.options,
+        )
+        with self.lock.write():
+            previous = self.hashes
+            self.index_type = fresh.index_type
+            self.index = fresh.index
+            self.hashes = fresh.hashes
+            self.tombstones = fresh.tombstones
+            self.filters = fresh.filters
+            self.read_only = False
+
+        added_rows = [
+            row
+            for row, song_hash in enumerate(song_hashes)
+            if song_id(song_hash) not in previous
+        ]
+        added = [song_hashes[row] for row in added_rows]
+        removed = [
+            song_hash
+            for faiss_id, song_hash in previous.items()
+            if faiss_id not in self.hashes
+        ]
+        for listener in self.listeners:
+            if removed:
+                listener.songs_removed(removed)
+            if added:
+                listener.songs_added(added, matrix[added_rows])
+        return added, removed
+
+    def save(self, path):
+        """
+        Writes the FAISS index to disk, replacing any previous file atomically.
+
+        Args:
+            path (str): Destination file.
+        """
+        tmp_path = f"{path}.tmp"
+        with self.lock.read():
+            faiss.write_index(self.index, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, mmap=False):
+        """
+        Reads an index written by save. Call restore before using it.
+
+        Args:
+            path (str): File written by save.
+            mmap (bool): Map the stored vectors of flat and HNSW indexes from
+                the file instead of reading them; the index is read-only.
+
+        Returns:
+            SongIndex: The loaded index with an empty hash map.
+
+        Raises:
+            ValueError: If the file does not hold a supported index.
+        """
+        flags = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY if mmap else 0
+        faiss_index = faiss.read_index(path, flags)
+        if isinstance(faiss_index, faiss.IndexIDMap2):
+            index_type = detect_index_type(faiss_index.index)
+            if index_type not in ("flat", "hnsw"):
+                index_type = None
+        else:
+            index_type = detect_index_type(faiss_index)
+            if index_type not in ("ivf_flat", "ivf_pq"):
+                index_type = None
+        if index_type is None:
+            raise ValueError(f"{path} does not contain a supported song index")
+
+        metric = (
+            "cosine" if faiss_index.metric_type == faiss.METRIC_INNER_PRODUCT else "l2"
+        )
+        song_index = cls(faiss_index.d, index_type, metric)
+        song_index.index = (
+            song_index._wrap(faiss_index) if song_index.is_ivf else faiss_index
+        )
+        song_index.read_only = mmap
+        return song_index
+
+    def vectors(self, song_hashes):
+        """
+        Returns the stored (normalized) vectors of indexed songs.
+
+        Args:
+            song_hashes (list): Hashes of indexed songs.
+
+        Returns:
+            np.ndarray: One row per song.
+        """
+        ids = np.array(
+            [song_id(song_hash) for song_hash in song_hashes], dtype=np.int64
+        )
+        with self.lock.read():
+            return self.index.reconstruct_batch(ids)
+
+    def search(
+        self,
+        query_embedding,
+        top_k,
+        song_hashes=None,
+        filters=None,
+        nprobe=None,
+        ef_search=None,
+        min_score=None,
+    ):
+        """
+        Searches the index for the songs nearest to the query embedding.
+
+        Args:
+            query_embedding (list): The query vector.
+            top_k (int): Maximum number of results to return.
+            song_hashes (list, optional): Restricts the search to these songs.
+            filters (dict, optional): Metadata filters, see FilterIndex.match.
+            nprobe (int, optional): IVF lists to visit; higher is slower but more accurate.
+            ef_search (int, optional): HNSW search depth; higher is slower but more accurate.
+            min_score (float, optional): Drops results with a lower cosine similarity.
+
+        Returns:
+            list: (song_hash, similarity) tuples, most similar first.
+        """
+        query_vector = normalize_vectors(query_embedding, self.dimension)
+        with self.lock.read():
+            candidates = self._candidates(song_hashes, filters)
+            if candidates is not None and len(candidates) <= EXACT_FILTER_LIMIT:
+                results = self._search_subset(query_vector, top_k, candidates)
+            else:
+                results = self._search(
+                    query_vector, top_k, candidates, nprobe, ef_search
+                )[0]
+        return drop_below(results, min_score)
+
+    def search_batch(
+        self,
+        query_embeddings,
+        top_ks,
+        filters=None,
+        nprobe=None,
+        ef_search=None,
+        min_scores=None,
+    ):
+        """
+        Searches the index for many queries at once.
+
+        Unfiltered queries share a single multi-vector FAISS search; filtered
+        ones are answered from their posting lists as in search.
+
+        Args:
+            query_embeddings (list or np.ndarray): One query vector per row.
+            top_ks (list): Maximum number of results for each query.
+            filters (list, optional): Metadata filters for each query, or None.
+            nprobe (int, optional): IVF lists to visit for every query.
+            ef_search (int, optional): HNSW search depth for every query.
+            min_scores (list, optional): Similarity threshold for each query, or None.
+
+        Returns:
+            list: One list of (song_hash, similarity) tuples per query, in order.
+        """
+        query_vectors = normalize_vectors(query_embeddings, self.dimension)
+        count = len(query_vectors)
+        filters = filters or [None] * count
+        min_scores = min_scores or [None] * count
+
+        results = [None] * count
+        with self.lock.read():
+            unrestricted = []
+            for row in range(count):
+                candidates = self._candidates(None, filters[row])
+                query_vector = query_vectors[row : row + 1]
+                if candidates is None:
+                    unrestricted.append(row)
+                elif len(candidates) <= EXACT_FILTER_LIMIT:
+                    results[row] = self._search_subset(
+                        query_vector, top_ks[row], candidates
+                    )
+                else:
+                    results[row] = self._search(
+                        query_vector, top_ks[row], candidates, nprobe, ef_search
+                    )[0]
+
+            if unrestricted:
+                # Search deep enough for the largest top_k and cut the others
+                top_k = max(top_ks[row] for row in unrestricted)
+                batch_results = self._search(
+                    query_vectors[unrestricted], top_k, None, nprobe, ef_search
+                )
+                for row, row_results in zip(unrestricted, batch_results):
+                    results[row] = row_results[: max(top_ks[row], 0)]
+
+        return [
+            drop_below(row_results, min_score)
+            for row_results, min_score in zip(results, min_scores)
+        ]
+
+    def _candidates(self, song_hashes, filters):
+        # Ids allowed by the hash list and metadata filters, None if unrestricted
+        candidates = self.filters.match(**filters) if filters else None
+        if song_hashes is not None:
+            ids = {song_id(song_hash) for song_hash in song_hashes}
+            ids = {faiss_id for faiss_id in ids if faiss_id in self.hashes}
+            candidates = ids if candidates is None else candidates & ids
+        return candidates
+
+    def _search_subset(self, query_vector, top_k, candidates):
+        # Score only the candidate songs, so the cost follows the match count
+        if not candidates or top_k <= 0:
+            return []
+        ids = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        vectors = self.index.reconstruct_batch(ids)
+        similarities = vectors @ query_vector[0]
+
+        top_k = min(top_k, len(ids))
+        order = np.argpartition(-similarities, top_k - 1)[:top_k]
+        order = order[np.argsort(-similarities[order])]
+        return [(self.hashes[int(ids[row])], float(similarities[row])) for row in order]
+
+    def _similarity(self, score):
+        # Inner products of unit vectors are cosines; FAISS L2 scores are
+        # squared distances, and |a - b|^2 = 2 - 2cos for unit vectors
+        if self.metric == "cosine":
+            return float(score)
+        return 1 - float(score) / 2
+
+    def _search(self, query_vectors, top_k, candidates, nprobe, ef_search):
+        # One result list per row of query_vectors
+        selector = None
+        if candidates is not None:
+            ids = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            selector = faiss.IDSelectorBatch(ids)
+            top_k = min(top_k, len(ids))
+        elif self.tombstones:
+            deleted = faiss.IDSelectorBatch(
+                np.array(list(self.tombstones), dtype=np.int64)
+            )
+            selector = faiss.IDSelectorNot(deleted)
+
+        top_k = min(top_k, len(self.hashes))
+        if top_k <= 0:
+            return [[] for _ in range(len(query_vectors))]
+
+        params = self._search_parameters(selector, nprobe, ef_search)
+        scores, indices = self.index.search(query_vectors, top_k, params=params)
+
+        results = []
+        for row_ids, row_scores in zip(indices, scores):
+            results.append(
+                [
+                    (self.hashes[int(faiss_id)], self._similarity(score))
+                    for faiss_id, score in zip(row_ids, row_scores)
+                    if faiss_id != -1
+                ]
+            )
+        return results
+
+    def _search_parameters(self, selector, nprobe, ef_search):
+        # Searches that give no depth use the configured one
+        if self.index_type == "hnsw":
+            params = faiss.SearchParametersHNSW()
+            ef_search = ef_search or INDEX_EF_SEARCH
+            if ef_search:
+                params.efSearch = int(ef_search)
+        elif self.index_type in ("ivf_flat", "ivf_pq"):
+            params = faiss.SearchParametersIVF()
+            nprobe = nprobe or INDEX_NPROBE
+            if nprobe:
+                params.nprobe = int(nprobe)
+        elif selector is not None:
+            params = faiss.SearchParameters()
+        else:
+            return None
+        if selector is not None:
+            params.sel = selector
+        return params
+
+
+def drop_below(results, min_score):
+    """
+    Drops search results whose similarity is below min_score.
+
+    Args:
+        results (list): (song_hash, similarity) tuples, most similar first.
+        min_score (float, optional): The threshold; None keeps every result.
+
+    Returns:
+        list: The leading results that meet the threshold.
+    """
+    if min_score is None:
+        return results
+    # Results are sorted, so stop at the first one below the threshold
+    for position, (_, similarity) in enumerate(results):
+        if similarity < min_score:
+            return results[:position]
+    return results
+
+
+def build_index(song_hashes, embeddings, index_type="flat", songs=None, **options):
+    """
+    Builds and fills a SongIndex, training it on the embeddings if needed.
+
+    IVF types fall back to exact search when there are too few vectors to train
+    them; rebuild the index once the catalog has grown.
+
+    Args:
+        song_hashes (list): Song hashes, one per embedding.
+        embeddings (np.ndarray): Embedding matrix matching song_hashes.
+        index_type (str): One of INDEX_TYPES.
+        songs (list, optional): Song metadata matching song_hashes.
+        **options: metric, nlist, hnsw_m and pq_m, see create_faiss_index.
+
+    Returns:
+        SongIndex: The populated index.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {index_type}")
+
+    embeddings = np.asarray(embeddings, dtype=np.float32).reshape(
+        -1, EMBEDDING_DIMENSION
+    )
+    options = {key: value for key, value in options.items() if value}
+    nlist = options.setdefault("nlist", default_nlist(len(embeddings)))
+    if len(embeddings) < min_training_points(index_type, nlist):
+        logger.warning(
+            "Only %d songs, too few to train a %s index; using exact search",
+            len(embeddings),
+            index_type,
+        )
+        index_type = "flat"
+
+    index = SongIndex(EMBEDDING_DIMENSION, index_type, **options)
+    if not index.is_trained:
+        index.train(embeddings)
+    if len(song_hashes):
+        index.add(song_hashes, embeddings, songs)
+    return index
+
+
+def measure_recall(index, song_hashes, embeddings, queries, top_k=10, **search_params):
+    """
+    Measures how many of the exact top-k neighbours an index returns.
+
+    Args:
+        index (SongIndex): The index to evaluate.
+        song_hashes (list): Hashes of the indexed songs.
+        embeddings (np.ndarray): Embeddings matching song_hashes.
+        queries (np.ndarray): Query vectors.
+        top_k (int): Number of neighbours to compare.
+        **search_params: nprobe or ef_search passed to index.search.
+
+    Returns:
+        float: Recall@top_k between 0 and 1.
+    """
+    exact = SongIndex(index.dimension, metric=index.metric)
+    exact.add(song_hashes, embeddings)
+
+    found = 0
+    expected = 0
+    for query in queries:
+        truth = {song_hash for song_hash, _ in exact.search(query, top_k)}
+        approx = {
+            song_hash for song_hash, _ in index.search(query, top_k, **search_params)
+        }
+        found += len(truth & approx)
+        expected += len(truth)
+    return found / expected if expected else 1.0
@@ -0,0 +1,250 @@
+import bisect
+import threading
+import time
+
+# Histogram bucket upper bounds, in seconds
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# Metrics rendered by GET /metrics, in registration order
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else repr(value)
+    return str(value)
+
+
+class Metric:
+    """
+    A metric family with fixed label names, rendered in the Prometheus text
+    exposition format.
+
+    Label values are passed positionally, in labelnames order. Updates take
+    a per-metric lock and allocate only on the first use of a label set.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name, description, labelnames=(), registry=REGISTRY):
+        """
+        Args:
+            name (str): Metric name.
+            description (str): HELP text.
+            labelnames (tuple): Label names.
+            registry (list, optional): Registry to add the metric to, or None.
+        """
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.append(self)
+
+    def render(self):
+        """
+        Returns the metric's exposition lines.
+        """
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labelvalues, value in values:
+            lines.extend(self._render_sample(labelvalues, value))
+        return lines
+
+    def _render_sample(self, labelvalues, value):
+        labels = _format_labels(self.labelnames, labelvalues)
+        return [f"{self.name}{labels} {_format_value(value)}"]
+
+
+class Counter(Metric):
+    """
+    A value that only goes up, such as a number of requests.
+    """
+
+    kind = "counter"
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues):
+        return self._values.get(labelvalues, 0)
+
+
+class Gauge(Counter):
+    """
+    A value that goes up and down, such as the number of requests in flight.
+    """
+
+    kind = "gauge"
+
+    def dec(self, *labelvalues, amount=1):
+        self.inc(*labelvalues, amount=-amount)
+
+    def set(self, value, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = value
+
+
+class _Timer:
+    __slots__ = ("histogram", "labelvalues", "started")
+
+    def __init__(self, histogram, labelvalues):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labelvalues)
+
+
+class Histogram(Metric):
+    """
+    Counts observations, such as latencies, in cumulative buckets.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self, name, description, labelnames=(), buckets=DEFAULT_BUCKETS, **kwargs
+    ):
+        """
+        Args:
+            buckets (tuple): Ascending bucket upper bounds; +Inf is implied.
+        """
+        super().__init__(name, description, labelnames, **kwargs)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labelvalues):
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labelvalues)
+            if entry is None:
+                entry = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][position] += 1
+            entry[1] += value
+
+    def time(self, *labelvalues):
+        """
+        Returns a context manager observing the seconds its block takes.
+        """
+        return _Timer(self, labelvalues)
+
+    def count(self, *labelvalues):
+        entry = self._values.get(labelvalues)
+        return sum(entry[0]) if entry else 0
+
+    def _render_sample(self, labelvalues, value):
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            labels = _format_labels(
+                self.labelnames, labelvalues, [("le", _format_value(float(bound)))]
+            )
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, labelvalues)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def metric_family(kind, name, description, samples, labelnames=()):
+    """
+    Renders a metric computed at scrape time, e.g. from a cache's stats().
+
+    Args:
+        kind (str): "counter" or "gauge".
+        name (str): Metric name.
+        description (str): HELP text.
+        samples (list): (labelvalues tuple, value) pairs.
+        labelnames (tuple): Label names.
+
+    Returns:
+        list: The exposition lines.
+    """
+    metric = Metric(name, description, labelnames, registry=None)
+    metric.kind = kind
+    metric._values = {tuple(labelvalues): value for labelvalues, value in samples}
+    return metric.render()
+
+
+def render(extra_lines=()):
+    """
+    Returns the registered metrics and extra lines in the text exposition format.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(extra_lines)
+    return "\n".join(lines) + "\n"
+
+
+def stage(name):
+    """
+    Returns a context manager recording the time its block takes as a stage.
+
+    Args:
+        name (str): Stage name, e.g. "encode" or "index_search".
+    """
+    return stage_seconds.time(name)
+
+
+requests_total = Counter(
+    "songdb_requests_total",
+    "HTTP requests handled, by method, endpoint and status.",
+    ("method", "endpoint", "status"),
+)
+request_seconds = Histogram(
+    "songdb_request_seconds",
+    "Time to handle an HTTP request, by endpoint.",
+    ("endpoint",),
+)
+requests_in_flight = Gauge("songdb_requests_in_flight", "HTTP requests being handled.")
+stage_seconds = Histogram(
+    "songdb_stage_seconds",
+    "Time spent in each stage of request handling.",
+    ("stage",),
+)
+slow_requests_total = Counter(
+    "songdb_slow_requests_total",
+    "Requests slower than the profiling threshold, by endpoint.",
+    ("endpoint",),
+)
@@ -0,0 +1,115 @@
+import threading
+import numpy as np
+from app.cache import LRUCache
+from app.index import normalize_vectors
+
+
+class NeighbourTable:
+    """
+    Nearest neighbours of recently requested songs, for "more like this" lookups.
+
+    The first request for a song searches the index with the song's stored
+    vector and keeps its `neighbours` nearest songs, so later requests with
+    top_k up to that depth are answered from the table. The table follows its
+    SongIndex: new songs are merged into the entries they rank in, and entries
+    that list a deleted song are dropped and recomputed on their next request.
+    """
+
+    def __init__(self, index, maxsize=1024, neighbours=50):
+        """
+        Args:
+            index (SongIndex): The index to search and follow.
+            maxsize (int): Maximum number of songs kept; 0 disables the table.
+            neighbours (int): Number of neighbours kept per song.
+        """
+        self.index = index
+        self.neighbours = neighbours
+        self.entries = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._generation = 0
+        index.listeners.append(self)
+
+    def similar(self, song_hash, top_k, load_vector):
+        """
+        Returns the songs most similar to a stored song, excluding the song itself.
+
+        Args:
+            song_hash (str): Hash of the song.
+            top_k (int): Maximum number of results to return.
+            load_vector (callable): Takes the song hash and returns its stored
+                embedding, or None if the song does not exist.
+
+        Returns:
+            list: (song_hash, similarity) tuples, most similar first, or None if
+            the song does not exist.
+        """
+        if top_k <= self.neighbours:
+            entry = self.entries.get(song_hash)
+            if entry is not None:
+                return entry[1][:top_k]
+
+        vector = load_vector(song_hash)
+        if vector is None:
+            return None
+        vector = normalize_vectors(vector, self.index.dimension)[0]
+
+        generation = self._generation
+        depth = max(top_k, self.neighbours)
+        results = [
+            result
+            for result in self.index.search(vector, depth + 1)
+            if result[0] != song_hash
+        ][:depth]
+
+        with self._lock:
+            # Skip caching if the index changed during the search, the entry
+            # could miss the change
+            if generation == self._generation and song_hash in self.index:
+                self.entries.put(song_hash, (vector, results[: self.neighbours]))
+        return results[:top_k]
+
+    def songs_added(self, song_hashes, embeddings):
+        """
+        Merges new songs into the entries whose neighbours they outrank.
+        """
+        with self._lock:
+            self._generation += 1
+            entries = self.entries.items()
+            if not entries:
+                return
+            vectors = normalize_vectors(embeddings, self.index.dimension)
+            scores = np.stack([vector for _, (vector, _) in entries]) @ vectors.T
+            for (key, (_, neighbours)), row_scores in zip(entries, scores):
+                threshold = (
+                    neighbours[-1][1] if len(neighbours) >= self.neighbours else -2.0
+                )
+                listed = {song_hash for song_hash, _ in neighbours}
+                candidates = [
+                    (song_hash, float(score))
+                    for song_hash, score in zip(song_hashes, row_scores)
+                    if score > threshold
+                    and song_hash != key
+                    and song_hash not in listed
+                ]
+                if candidates:
+                    merged = sorted(neighbours + candidates, key=lambda r: -r[1])
+                    neighbours[:] = merged[: self.neighbours]
+
+    def songs_removed(self, song_hashes):
+        """
+        Drops the entries of deleted songs and the entries that list them.
+        """
+        removed = set(song_hashes)
+        with self._lock:
+            self._generation += 1
+            for key, (_, neighbours) in self.entries.items():
+                if key in removed or any(
+                    song_hash in removed for song_hash, _ in neighbours
+                ):
+                    self.entries.pop(key)
+
+    def stats(self):
+        """
+        Returns the table size and lookup counters, see LRUCache.stats.
+        """
+        return self.entries.stats()
@@ -0,0 +1,301 @@
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from app.db import get_connection, load_mapped_index, sync_index
+
+logger = logging.getLogger(__name__)
+
+
+def generation_path(index_path, generation):
+    """
+    Returns the file a generation of the index is saved to.
+    """
+    return f"{index_path}.{generation}"
+
+
+def _pointer_path(index_path):
+    return f"{index_path}.current"
+
+
+def current_generation(index_path):
+    """
+    Returns the number of the last published generation, or None if there is none.
+    """
+    try:
+        with open(_pointer_path(index_path)) as pointer:
+            return int(pointer.read())
+    except (OSError, ValueError):
+        return None
+
+
+def publish_generation(index, index_path, generation, keep=2):
+    """
+    Saves an index as a new generation and points the workers at it.
+
+    Generations older than the last `keep` are deleted. Workers that still map
+    a deleted file keep reading it until they switch to a newer generation.
+
+    Args:
+        index (SongIndex): The index to publish.
+        index_path (str): Base path of the generation files.
+        generation (int): Number of the new generation.
+        keep (int): Number of generations kept on disk.
+    """
+    index.save(generation_path(index_path, generation))
+    pointer = _pointer_path(index_path)
+    with open(pointer + ".tmp", "w") as file:
+        file.write(str(generation))
+    os.replace(pointer + ".tmp", pointer)
+
+    directory, name = os.path.split(os.path.abspath(index_path))
+    for entry in os.listdir(directory):
+        suffix = entry[len(name) + 1 :] if entry.startswith(name + ".") else ""
+        if suffix.isdigit() and int(suffix) <= generation - keep:
+            try:
+                os.remove(os.path.join(directory, entry))
+            except OSError:
+                pass
+
+
+def swap_index(server, index):
+    """
+    Replaces a server's index with a newer generation.
+
+    The listeners of the old index move to the new one and are told about the
+    songs that differ between the two.
+
+    Args:
+        server (HTTPServer): Server with song_index and neighbours attributes.
+        index (SongIndex): The new index.
+    """
+    old = server.song_index
+    index.listeners = old.listeners
+    server.neighbours.index = index
+    server.song_index = index
+
+    removed = [song_hash for song_hash in old.hashes.values() if song_hash not in index]
+    added = [song_hash for song_hash in index.hashes.values() if song_hash not in old]
+    for listener in index.listeners:
+        if removed:
+            listener.songs_removed(removed)
+        if added:
+            listener.songs_added(added, index.vectors(added))
+
+
+class GenerationWatcher:
+    """
+    Switches a worker process to each index generation the supervisor publishes.
+    """
+
+    def __init__(self, server, db_name, index_path, generation, interval=1.0):
+        """
+        Args:
+            server (HTTPServer): The worker's server, see swap_index.
+            db_name (str): Path of the SQLite database.
+            index_path (str): Base path of the generation files.
+            generation (int): Generation the server currently uses.
+            interval (float): Seconds between checks for a new generation.
+        """
+        self.server = server
+        self.db_name = db_name
+        self.index_path = index_path
+        self.generation = generation
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="songdb-generation-watcher", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def check(self):
+        """
+        Loads and swaps in the current generation if it is newer than the
+        server's. Returns True if the index was swapped.
+        """
+        generation = current_generation(self.index_path)
+        if generation is None or generation == self.generation:
+            return False
+        try:
+            index = load_mapped_index(
+                self.db_name, generation_path(self.index_path, generation)
+            )
+        except (OSError, RuntimeError, ValueError) as e:
+            # The supervisor may have published and pruned it meanwhile
+            logger.warning("Could not load index generation %d: %s", generation, e)
+            return False
+        swap_index(self.server, index)
+        self.generation = generation
+        return True
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.check()
+
+
+def wait_for_generation(index_path, interval=0.1):
+    """
+    Blocks until a generation is published and returns its number.
+    """
+    while True:
+        generation = current_generation(index_path)
+        if generation is not None:
+            return generation
+        time.sleep(interval)
+
+
+def _exit_worker(signum, frame):
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    raise SystemExit(0)
+
+
+class PreforkSupervisor:
+    """
+    Runs the server in worker processes sharing one port and one index file.
+
+    Each worker binds the port with SO_REUSEPORT and maps the published index
+    generation read-only, so the vectors sit once in the page cache however
+    many workers there are. The supervisor keeps the writable index: it
+    watches the database for commits made by the workers, applies them to its
+    index and publishes a new generation, which the workers' GenerationWatcher
+    picks up. Workers that die are replaced.
+    """
+
+    def __init__(self, serve_worker, processes, db_name, index_path, interval=1.0):
+        """
+        Args:
+            serve_worker (callable): Run in each worker process; serves until
+                SIGTERM, which it receives as SystemExit.
+            processes (int): Number of worker processes.
+            db_name (str): Path of the SQLite database.
+            index_path (str): Base path of the generation files.
+            interval (float): Seconds between checks for database changes.
+        """
+        self.serve_worker = serve_worker
+        self.processes = processes
+        self.db_name = db_name
+        self.index_path = index_path
+        self.interval = interval
+        self.index = None
+        self.generation = current_generation(index_path) or 0
+        self.workers = set()
+        self._stopping = False
+
+    def run(self, load_index):
+        """
+        Starts the workers, then loads the index and publishes it, and keeps
+        it up to date until SIGTERM or SIGINT.
+
+        The workers are forked before the index is loaded, so none of them
+        inherits state from FAISS's thread pools; they wait for the first
+        generation before serving.
+
+        Args:
+            load_index (callable): Returns the writable SongIndex.
+
+        Returns:
+            SongIndex: The supervisor's index, for saving.
+        """
+        try:
+            os.remove(_pointer_path(self.index_path))
+        except FileNotFoundError:
+            pass
+        handlers = {
+            signum: signal.signal(signum, self._stop)
+            for signum in (signal.SIGTERM, signal.SIGINT)
+        }
+        conn = None
+        try:
+            for _ in range(self.processes):
+                self._spawn()
+            # Commits from here on show up as a new data_version
+            conn = get_connection(self.db_name)
+            cursor = conn.cursor()
+            version = cursor.execute("PRAGMA data_version").fetchone()[0]
+            self.index = load_index()
+            self._publish()
+
+            while not self._stopping:
+                time.sleep(self.interval)
+                self._reap()
+                latest = cursor.execute("PRAGMA data_version").fetchone()[0]
+                if latest != version:
+                    version = latest
+                    added, removed = sync_index(self.index, cursor)
+                    if added or removed:
+                        self._publish()
+        finally:
+            self._stop_workers()
+            if conn is not None:
+                conn.close()
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+        return self.index
+
+    def _stop(self, signum, frame):
+        self._stopping = True
+
+    def _publish(self):
+        self.generation += 1
+        publish_generation(self.index, self.index_path, self.generation)
+        logger.info(
+            "Published index generation %d (%d songs)",
+            self.generation,
+            len(self.index),
+        )
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid:
+            self.workers.add(pid)
+            return
+        code = 0
+        try:
+            signal.signal(signal.SIGTERM, _exit_worker)
+            signal.signal(signal.SIGINT, _exit_worker)
+            self.serve_worker()
+        except SystemExit:
+            pass
+        except BaseException:
+            logger.exception("Worker %d failed", os.getpid())
+            code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+    def _reap(self):
+        while self.workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if not pid:
+                return
+            self.workers.discard(pid)
+            if not self._stopping:
+                logger.warning(
+                    "Worker %d exited with status %d, starting a new one",
+                    pid,
+                    os.waitstatus_to_exitcode(status),
+                )
+                self._spawn()
+
+    def _stop_workers(self):
+        for pid in self.workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in self.workers:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self.workers.clear()
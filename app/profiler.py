@@ -0,0 +1,116 @@
+import logging
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+logger = logging.getLogger(__name__)
+
+# Deepest stack recorded per sample, in frames
+MAX_STACK_DEPTH = 64
+
+# Stacks included in a slow request's report
+TOP_STACKS = 20
+
+
+def collapse_stack(frame):
+    """
+    Formats a stack as "file:function:line" entries, outermost first, joined
+    by ";" (the collapsed format flame graph tools read).
+    """
+    entries = []
+    while frame is not None and len(entries) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        entries.append(f"{code.co_filename}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(entries))
+
+
+def log_profile(profile):
+    """
+    Logs a slow request's profile, the default hook.
+    """
+    logger.warning(
+        "Slow request %s took %.3fs (%d samples); top stacks:\n%s",
+        profile["request"],
+        profile["seconds"],
+        profile["samples"],
+        "\n".join(f"{count} {stack}" for stack, count in profile["stacks"]),
+    )
+
+
+class SlowRequestProfiler:
+    """
+    Statistical profiler for requests slower than a threshold.
+
+    A daemon thread wakes every interval and records the current stack of
+    every thread that is handling a request. When a request finishes after
+    threshold seconds or more, its samples are aggregated into collapsed
+    stacks and passed to each hook; the last few profiles are kept in recent.
+    Faster requests drop their samples, so the cost is one stack walk per
+    in-flight request per interval.
+    """
+
+    def __init__(self, threshold, interval=0.005, keep=20):
+        """
+        Args:
+            threshold (float): Seconds from which a request is reported.
+            interval (float): Seconds between samples.
+            keep (int): Number of recent profiles kept.
+        """
+        self.threshold = threshold
+        self.interval = interval
+        self.hooks = [log_profile]
+        self.recent = deque(maxlen=keep)
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start_request(self):
+        """
+        Starts sampling the calling thread.
+        """
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="songdb-profiler", daemon=True
+                )
+                self._thread.start()
+
+    def end_request(self, request, seconds):
+        """
+        Stops sampling the calling thread and reports the request if slow.
+
+        Args:
+            request (str): Description of the request, e.g. "POST /search".
+            seconds (float): Time the request took.
+
+        Returns:
+            dict: The profile (request, seconds, samples and the most frequent
+            (stack, count) pairs), or None for a fast request.
+        """
+        with self._lock:
+            samples = self._active.pop(threading.get_ident(), None)
+        if samples is None or seconds < self.threshold:
+            return None
+        profile = {
+            "request": request,
+            "seconds": seconds,
+            "samples": sum(samples.values()),
+            "stacks": samples.most_common(TOP_STACKS),
+        }
+        self.recent.append(profile)
+        for hook in self.hooks:
+            hook(profile)
+        return profile
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, samples in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        samples[collapse_stack(frame)] += 1
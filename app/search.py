@@ -0,0 +1,362 @@
+import base64
+import hashlib
+import json
+from collections import namedtuple
+from app.batching import MicroBatcher
+from app.cache import LRUCache
+from app.config import (
+    HYBRID_ALPHA,
+    HYBRID_CANDIDATES,
+    RESULT_CACHE_SIZE,
+    RESULT_CACHE_TTL,
+    SEARCH_MAX_TOP_K,
+    SEARCH_BATCH_SIZE,
+    SEARCH_BATCH_WAIT_MS,
+)
+from app.db import lexical_search
+from app.embeddings import get_query_embedding, get_query_embeddings, normalize_query
+from app.index import year_key
+from app.metrics import stage
+
+# One search: query text, result count, metadata filters (a dict for
+# FilterIndex.match or None), approximate search knobs, similarity threshold,
+# ranking mode and, for hybrid searches, the weight of the vector score
+SearchRequest = namedtuple(
+    "SearchRequest",
+    [
+        "query",
+        "top_k",
+        "filters",
+        "nprobe",
+        "ef_search",
+        "min_score",
+        "mode",
+        "alpha",
+    ],
+    defaults=[5, None, None, None, None, "vector", None],
+)
+
+# "vector" ranks by embedding similarity alone, "hybrid" fuses it with BM25
+SEARCH_MODES = ("vector", "hybrid")
+
+# One page of a paginated search: the result set key, the position of the
+# first result, the number of results per page and the SearchRequest, which
+# re-runs the search when its result set is not cached
+Page = namedtuple("Page", ["key", "offset", "limit", "request"])
+
+# Ranked result sets of paginated searches, so every page of a search comes
+# from the same ranking
+result_sets = LRUCache(maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+
+
+# Request fields that restrict a search through the metadata posting lists
+FILTER_FIELDS = ("artist", "song", "album", "year", "year_from", "year_to")
+
+
+def parse_search_request(search_data):
+    """
+    Builds a SearchRequest from a parsed /search JSON body.
+
+    Args:
+        search_data (dict): The request body.
+
+    Returns:
+        SearchRequest: The validated request.
+
+    Raises:
+        ValueError: With a message for the client if a field is invalid.
+    """
+    if not isinstance(search_data, dict):
+        raise ValueError("Search request must be a JSON object")
+
+    query = search_data.get("query", "")
+    top_k = search_data.get("top_k", 5)
+    filters = {field: search_data.get(field) for field in FILTER_FIELDS}
+    nprobe = search_data.get("nprobe")
+    ef_search = search_data.get("ef_search")
+    min_score = search_data.get("min_score")
+    mode = search_data.get("mode", "vector")
+    alpha = search_data.get("alpha")
+
+    # Validate query parameter
+    if not query or not isinstance(query, str):
+        raise ValueError("Missing search query")
+
+    # Validate the result count
+    if isinstance(top_k, bool) or not isinstance(top_k, int) or top_k < 0:
+        raise ValueError("top_k must be a non-negative integer")
+    if top_k > SEARCH_MAX_TOP_K:
+        raise ValueError(f"top_k must be at most {SEARCH_MAX_TOP_K}")
+
+    # Validate the metadata filters; a year may also be a numeric string
+    for field in ("artist", "song", "album"):
+        if filters[field] is not None and not isinstance(filters[field], str):
+            raise ValueError(f"{field} must be a string")
+    year = filters["year"]
+    if year is not None:
+        if (
+            isinstance(year, bool)
+            or not isinstance(year, (int, str))
+            or year_key(year) is None
+        ):
+            raise ValueError("year must be an integer")
+        filters["year"] = year_key(year)
+
+    # Validate year range bounds
+    for bound in (filters["year_from"], filters["year_to"]):
+        if bound is not None and (
+            isinstance(bound, bool) or not isinstance(bound, int)
+        ):
+            raise ValueError("year_from and year_to must be integers")
+
+    # Validate approximate search knobs
+    for knob in (nprobe, ef_search):
+        if knob is not None and (not isinstance(knob, int) or knob < 1):
+            raise ValueError("nprobe and ef_search must be positive integers")
+
+    # Validate the cosine similarity threshold
+    if min_score is not None and (
+        isinstance(min_score, bool) or not isinstance(min_score, (int, float))
+    ):
+        raise ValueError("min_score must be a number")
+
+    # Validate the ranking mode and hybrid score weight
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"mode must be one of {', '.join(SEARCH_MODES)}")
+    if alpha is not None and (
+        isinstance(alpha, bool)
+        or not isinstance(alpha, (int, float))
+        or not 0 <= alpha <= 1
+    ):
+        raise ValueError("alpha must be a number between 0 and 1")
+
+    return SearchRequest(
+        query, top_k, filters, nprobe, ef_search, min_score, mode, alpha
+    )
+
+
+def run_searches(index, requests):
+    """
+    Answers many search requests with batched work: the queries are encoded
+    together, and requests sharing search knobs run as one multi-vector search.
+
+    Args:
+        index (SongIndex): The index to search.
+        requests (list): SearchRequest tuples.
+
+    Returns:
+        list: One list of (song_hash, similarity) tuples per request, in order.
+    """
+    with stage("encode"):
+        embeddings = get_query_embeddings([request.query for request in requests])
+
+    groups = {}
+    for row, request in enumerate(requests):
+        groups.setdefault((request.nprobe, request.ef_search), []).append(row)
+
+    results = [None] * len(requests)
+    for (nprobe, ef_search), rows in groups.items():
+        with stage("index_search"):
+            group_results = index.search_batch(
+                [embeddings[row] for row in rows],
+                [requests[row].top_k for row in rows],
+                filters=[requests[row].filters for row in rows],
+                nprobe=nprobe,
+                ef_search=ef_search,
+                min_scores=[requests[row].min_score for row in rows],
+            )
+        for row, row_results in zip(rows, group_results):
+            results[row] = row_results
+    return results
+
+
+def run_hybrid_search(index, cursor, request, candidate_limit=HYBRID_CANDIDATES):
+    """
+    Answers a search by fusing BM25 full-text relevance with vector similarity.
+
+    The full-text index picks up to candidate_limit songs matching words of the
+    query, and only those are scored against the query embedding. When fewer
+    than top_k songs match, a plain vector search fills the remaining places.
+    The fused score is alpha * similarity + (1 - alpha) * BM25, with BM25
+    scaled so the best lexical match scores 1.
+
+    Args:
+        index (SongIndex): The index to search.
+        cursor (sqlite3.Cursor): Cursor of an open connection.
+        request (SearchRequest): The search to run.
+        candidate_limit (int): Maximum number of full-text matches re-ranked.
+
+    Returns:
+        list: (song_hash, similarity, score) tuples, best fused score first.
+    """
+    alpha = HYBRID_ALPHA if request.alpha is None else request.alpha
+    with stage("lexical"):
+        lexical = dict(lexical_search(cursor, request.query, candidate_limit))
+    with stage("encode"):
+        embedding = get_query_embedding(request.query)
+    knobs = {"nprobe": request.nprobe, "ef_search": request.ef_search}
+
+    results = []
+    with stage("index_search"):
+        if lexical:
+            results = index.search(
+                embedding,
+                len(lexical),
+                song_hashes=list(lexical),
+                filters=request.filters,
+                **knobs,
+            )
+        if len(results) < request.top_k:
+            matched = {song_hash for song_hash, _ in results}
+            results += [
+                result
+                for result in index.search(
+                    embedding, request.top_k, filters=request.filters, **knobs
+                )
+                if result[0] not in matched
+            ]
+
+    best = max(lexical.values(), default=0.0)
+    fused = []
+    for song_hash, similarity in results:
+        if request.min_score is not None and similarity < request.min_score:
+            continue
+        relevance = lexical.get(song_hash, 0.0) / best if best > 0 else 0.0
+        score = alpha * similarity + (1 - alpha) * relevance
+        fused.append((song_hash, similarity, score))
+    fused.sort(key=lambda result: -result[2])
+    return fused[: request.top_k]
+
+
+def _run_batch(items):
+    # Items are (index, request) pairs; a server normally has a single index
+    results = [None] * len(items)
+    by_index = {}
+    for position, (index, _) in enumerate(items):
+        by_index.setdefault(id(index), []).append(position)
+    for positions in by_index.values():
+        index = items[positions[0]][0]
+        requests = [items[position][1] for position in positions]
+        for position, row_results in zip(positions, run_searches(index, requests)):
+            results[position] = row_results
+    return results
+
+
+# Coalesces concurrent /search requests into batched encodes and searches
+search_batcher = MicroBatcher(
+    _run_batch,
+    max_batch=SEARCH_BATCH_SIZE,
+    max_wait=SEARCH_BATCH_WAIT_MS / 1000,
+    name="songdb-search-batcher",
+)
+
+
+def search(index, request):
+    """
+    Answers one search request, batched with concurrent ones when enabled.
+
+    Args:
+        index (SongIndex): The index to search.
+        request (SearchRequest): The search to run.
+
+    Returns:
+        list: (song_hash, similarity) tuples, most similar first.
+    """
+    if SEARCH_BATCH_SIZE > 1:
+        return search_batcher.submit((index, request))
+    return run_searches(index, [request])[0]
+
+
+def result_set_key(request):
+    """
+    Returns the key a search's result set is cached under.
+
+    Requests that differ only in query spelling that normalize_query ignores
+    share a key.
+
+    Args:
+        request (SearchRequest): The search.
+
+    Returns:
+        str: A short hex digest of the normalized request.
+    """
+    normalized = request._replace(query=normalize_query(request.query))
+    digest = hashlib.sha256(json.dumps(list(normalized), sort_keys=True).encode())
+    return digest.hexdigest()[:32]
+
+
+def encode_cursor(page):
+    """
+    Serializes a Page into the opaque cursor handed to clients.
+
+    The cursor holds the whole search request rather than only the result set
+    key, so any server process can continue the search: result sets are
+    cached per process, and a process that does not have it runs the search
+    again.
+    """
+    request = page.request._asdict()
+    request.update(request.pop("filters") or {})
+    data = json.dumps(
+        [page.offset, page.limit, request], separators=(",", ":"), ensure_ascii=False
+    ).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """
+    Parses a cursor made by encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        offset, limit, search_data = json.loads(
+            base64.urlsafe_b64decode(cursor.encode())
+        )
+        request = parse_search_request(search_data)
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+    if not all(
+        isinstance(value, int) and not isinstance(value, bool) and value >= 0
+        for value in (offset, limit)
+    ):
+        raise ValueError("Invalid cursor")
+    return Page(result_set_key(request), offset, limit, request)
+
+
+def parse_page(search_data, request):
+    """
+    Reads the pagination fields of a /search body.
+
+    A page is given either by a cursor from a previous page, or by offset and
+    limit; offset defaults to 0 and limit to the rest of the results.
+
+    Args:
+        search_data (dict): The request body.
+        request (SearchRequest): The parsed search, None when the body only
+            holds a cursor.
+
+    Returns:
+        Page: The requested page, or None if the search is not paginated.
+
+    Raises:
+        ValueError: With a message for the client if a field is invalid.
+    """
+    cursor = search_data.get("cursor")
+    if cursor is not None:
+        if not isinstance(cursor, str):
+            raise ValueError("Invalid cursor")
+        return decode_cursor(cursor)
+
+    offset = search_data.get("offset")
+    limit = search_data.get("limit")
+    if offset is None and limit is None:
+        return None
+    for value, minimum in ((offset, 0), (limit, 1)):
+        if value is not None and (
+            isinstance(value, bool) or not isinstance(value, int) or value < minimum
+        ):
+            raise ValueError(
+                "offset must be a non-negative integer and limit a positive one"
+            )
+    return Page(result_set_key(request), offset or 0, limit or request.top_k, request)
@@ -0,0 +1,519 @@
+import heapq
+import json
+import multiprocessing
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import numpy as np
+from app.index import EMBEDDING_DIMENSION, SongIndex, song_id
+
+# How songs are assigned to shards: by ranges of the song hash, or by artist
+# so that an artist's songs stay together
+PARTITIONS = ("hash", "artist")
+
+
+def shard_for(song_hash, song, shards, partition="hash"):
+    """
+    Returns the position of the shard a song belongs to.
+
+    Args:
+        song_hash (str): Hex hash of the song.
+        song (dict): Song metadata; "artist" partitioning reads its artist.
+        shards (int): Number of shards.
+        partition (str): One of PARTITIONS.
+
+    Returns:
+        int: The shard position, from 0 to shards - 1.
+
+    Raises:
+        ValueError: If the partition is unknown, or is "artist" and song is None.
+    """
+    if partition == "hash":
+        # Hashes are uniform, so equal ranges of their first 32 bits balance
+        return int(song_hash[:8], 16) * shards >> 32
+    if partition == "artist":
+        if song is None:
+            raise ValueError("Partitioning by artist needs the song metadata")
+        artist = (song.get("artist") or "").strip().lower()
+        return zlib.crc32(artist.encode("utf-8")) % shards
+    raise ValueError(f"Unknown partition: {partition}")
+
+
+def shard_path(path, position):
+    """
+    Returns the file a shard of an index saved to path is written to.
+    """
+    return f"{path}.shard{position}"
+
+
+def merge_results(result_lists, top_k):
+    """
+    Merges per-shard search results into one ranking.
+
+    Args:
+        result_lists (list): Lists of (song_hash, similarity) tuples, each
+            most similar first.
+        top_k (int): Maximum number of results to return.
+
+    Returns:
+        list: The top_k most similar results across the lists.
+    """
+    merged = heapq.merge(*result_lists, key=lambda result: -result[1])
+    return list(islice(merged, max(top_k, 0)))
+
+
+def _serve_shard(conn, dimension, index_type, metric, options):
+    # Runs in the shard process: applies SongIndex calls sent by ShardProcess
+    index = SongIndex(dimension, index_type, metric, **options)
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        method, args, kwargs = message
+        try:
+            if method == "load":
+                index = SongIndex.load(*args, **kwargs)
+                result = None
+            elif method == "describe":
+                result = (index.index_type, index.metric)
+            else:
+                result = getattr(index, method)(*args, **kwargs)
+        except Exception as e:
+            conn.send((False, e))
+        else:
+            conn.send((True, result))
+    conn.close()
+
+
+class ShardProcess:
+    """
+    A SongIndex living in a separate local process.
+
+    Offers the SongIndex methods a ShardedIndex uses, sending each call over a
+    pipe. Calls to one shard run one at a time; a ShardedIndex still searches
+    its shard processes in parallel. The process is started with "spawn", so
+    it does not inherit the server's threads or FAISS state.
+    """
+
+    def __init__(
+        self,
+        dimension=EMBEDDING_DIMENSION,
+        index_type="flat",
+        metric="cosine",
+        **options,
+    ):
+        """
+        Args:
+            dimension (int): Embedding dimension.
+            index_type (str): One of INDEX_TYPES.
+            metric (str): One of METRICS.
+            **options: nlist, hnsw_m and pq_m, see create_faiss_index.
+        """
+        self.dimension = dimension
+        self.index_type = index_type
+        self.metric = metric
+        context = multiprocessing.get_context("spawn")
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(
+            target=_serve_shard,
+            args=(child_conn, dimension, index_type, metric, options),
+            name="songdb-shard",
+            daemon=True,
+        )
+        self._process.start()
+        child_conn.close()
+        self._lock = threading.Lock()
+
+    def _call(self, method, *args, **kwargs):
+        with self._lock:
+            self._conn.send((method, args, kwargs))
+            ok, result = self._conn.recv()
+        if not ok:
+            raise result
+        return result
+
+    def add(self, song_hashes, embeddings, songs=None):
+        return self._call("add", song_hashes, np.asarray(embeddings), songs)
+
+    def remove(self, song_hashes):
+        return self._call("remove", song_hashes)
+
+    def restore(self, song_hashes, songs=None):
+        return self._call("restore", song_hashes, songs)
+
+    def rebuild(self, song_hashes, embeddings, songs=None):
+        added, removed = self._call(
+            "rebuild", song_hashes, np.asarray(embeddings), songs
+        )
+        self.index_type, _ = self._call("describe")
+        return added, removed
+
+    def search(self, query_embedding, top_k, **kwargs):
+        return self._call("search", np.asarray(query_embedding), top_k, **kwargs)
+
+    def search_batch(self, query_embeddings, top_ks, **kwargs):
+        return self._call(
+            "search_batch", np.asarray(query_embeddings), top_ks, **kwargs
+        )
+
+    def save(self, path):
+        self._call("save", path)
+
+    def load(self, path):
+        """
+        Replaces the process's index with one written by save.
+        """
+        self._call("load", path)
+        self.index_type, self.metric = self._call("describe")
+
+    def close(self):
+        """
+        Stops the shard process.
+        """
+        with self._lock:
+            try:
+                self._conn.send(None)
+            except OSError:
+                pass
+            self._conn.close()
+        self._process.join()
+
+
+class ShardedIndex:
+    """
+    Songs partitioned across several SongIndex shards, searched as one index.
+
+    Searches are sent to every shard in parallel on a thread pool (FAISS
+    releases the GIL while it searches) and the per-shard top-k lists are
+    merged into the global ranking. Adds and removes go to the shard a song
+    belongs to, and each shard can be rebuilt on its own with rebuild_shard.
+    Shards are SongIndex objects or ShardProcess proxies.
+
+    The index keeps its own map of indexed songs, so lookups and counts do not
+    reach the shards, and notifies its own listeners like a SongIndex.
+    """
+
+    def __init__(self, shards, partition="hash"):
+        """
+        Args:
+            shards (list): SongIndex or ShardProcess objects.
+            partition (str): One of PARTITIONS, how songs were assigned to shards.
+
+        Raises:
+            ValueError: If the partition is unknown.
+        """
+        if partition not in PARTITIONS:
+            raise ValueError(f"Unknown partition: {partition}")
+        self.shards = list(shards)
+        self.partition = partition
+        self.dimension = self.shards[0].dimension
+        self.metric = self.shards[0].metric
+        self.hashes = {}
+        self.listeners = []
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(self.shards), thread_name_prefix="songdb-shard"
+        )
+
+    @property
+    def index_type(self):
+        return self.shards[0].index_type
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def __contains__(self, song_hash):
+        return song_id(song_hash) in self.hashes
+
+    def _route(self, song_hashes, songs):
+        # Rows of song_hashes per shard position
+        positions = {}
+        for row, song_hash in enumerate(song_hashes):
+            song = songs[row] if songs is not None else None
+            position = shard_for(song_hash, song, len(self.shards), self.partition)
+            positions.setdefault(position, []).append(row)
+        return positions
+
+    def _scatter(self, calls):
+        # Runs (shard, method, args, kwargs) calls in parallel, results in order
+        futures = [
+            self._executor.submit(getattr(shard, method), *args, **kwargs)
+            for shard, method, args, kwargs in calls
+        ]
+        return [future.result() for future in futures]
+
+    def add(self, song_hashes, embeddings, songs=None):
+        """
+        Adds songs to their shards, skipping songs that are already indexed.
+
+        See SongIndex.add; "artist" partitioning needs songs.
+        """
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dimension)
+        rows = [
+            row
+            for row, song_hash in enumerate(song_hashes)
+            if song_id(song_hash) not in self.hashes
+        ]
+        song_hashes = [song_hashes[row] for row in rows]
+        songs = [songs[row] for row in rows] if songs is not None else None
+        matrix = matrix[rows]
+
+        calls = []
+        for position, shard_rows in self._route(song_hashes, songs).items():
+            calls.append(
+                (
+                    self.shards[position],
+                    "add",
+                    (
+                        [song_hashes[row] for row in shard_rows],
+                        matrix[shard_rows],
+                        [songs[row] for row in shard_rows] if songs else None,
+                    ),
+                    {},
+                )
+            )
+        added = set()
+        for shard_added in self._scatter(calls):
+            added.update(shard_added)
+        added_rows = [
+            row for row, song_hash in enumerate(song_hashes) if song_hash in added
+        ]
+        added_hashes = [song_hashes[row] for row in added_rows]
+        self._songs_added(added_hashes, matrix[added_rows])
+        return added_hashes
+
+    def remove(self, song_hashes):
+        """
+        Removes songs from their shards. Unknown hashes are ignored.
+
+        Returns:
+            list: Hashes of the songs that were removed.
+        """
+        song_hashes = [h for h in song_hashes if song_id(h) in self.hashes]
+        if self.partition == "hash":
+            routed = self._route(song_hashes, None).items()
+            calls = [
+                (
+                    self.shards[position],
+                    "remove",
+                    ([song_hashes[row] for row in rows],),
+                    {},
+                )
+                for position, rows in routed
+            ]
+        else:
+            # The shard of a song is only known from its metadata, so ask all
+            calls = [(shard, "remove", (song_hashes,), {}) for shard in self.shards]
+        removed = []
+        for shard_removed in self._scatter(calls):
+            removed += shard_removed
+        self._songs_removed(removed)
+        return removed
+
+    def restore(self, song_hashes, songs=None):
+        """
+        Rebuilds the shards' hash maps after loading, see SongIndex.restore.
+
+        Returns:
+            list: Hashes of songs that are missing from their shards.
+        """
+        routed = self._route(song_hashes, songs)
+        calls = [
+            (
+                self.shards[position],
+                "restore",
+                (
+                    [song_hashes[row] for row in rows],
+                    [songs[row] for row in rows] if songs is not None else None,
+                ),
+                {},
+            )
+            for position, rows in routed.items()
+        ]
+        missing = []
+        for (position, rows), shard_missing in zip(
+            routed.items(), self._scatter(calls)
+        ):
+            absent = set(shard_missing)
+            for row in rows:
+                if song_hashes[row] in absent:
+                    missing.append(song_hashes[row])
+                else:
+                    self.hashes[song_id(song_hashes[row])] = song_hashes[row]
+        return missing
+
+    def rebuild_shard(self, position, song_hashes, embeddings, songs=None):
+        """
+        Rebuilds one shard from the songs that belong to it, leaving the other
+        shards untouched, see SongIndex.rebuild.
+
+        Args:
+            position (int): The shard to rebuild.
+            song_hashes (list): Song hashes; songs of other shards are ignored,
+                so the whole catalog may be passed.
+            embeddings (np.ndarray): Embedding matrix matching song_hashes.
+            songs (list, optional): Song metadata matching song_hashes.
+
+        Returns:
+            tuple: Hashes of the songs added and removed by the rebuild.
+        """
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dimension)
+        rows = self._route(song_hashes, songs).get(position, [])
+        added, removed = self.shards[position].rebuild(
+            [song_hashes[row] for row in rows],
+            matrix[rows],
+            [songs[row] for row in rows] if songs is not None else None,
+        )
+        self._songs_removed(removed)
+        added_set = set(added)
+        added_rows = [row for row in rows if song_hashes[row] in added_set]
+        self._songs_added([song_hashes[row] for row in added_rows], matrix[added_rows])
+        return added, removed
+
+    def _songs_added(self, song_hashes, embeddings):
+        if not song_hashes:
+            return
+        for song_hash in song_hashes:
+            self.hashes[song_id(song_hash)] = song_hash
+        for listener in self.listeners:
+            listener.songs_added(song_hashes, embeddings)
+
+    def _songs_removed(self, song_hashes):
+        if not song_hashes:
+            return
+        for song_hash in song_hashes:
+            self.hashes.pop(song_id(song_hash), None)
+        for listener in self.listeners:
+            listener.songs_removed(song_hashes)
+
+    def search(self, query_embedding, top_k, **kwargs):
+        """
+        Searches every shard and merges their results, see SongIndex.search.
+        """
+        calls = [
+            (shard, "search", (query_embedding, top_k), kwargs) for shard in self.shards
+        ]
+        return merge_results(self._scatter(calls), top_k)
+
+    def search_batch(self, query_embeddings, top_ks, **kwargs):
+        """
+        Searches every shard for many queries and merges the results per query,
+        see SongIndex.search_batch.
+        """
+        calls = [
+            (shard, "search_batch", (query_embeddings, top_ks), kwargs)
+            for shard in self.shards
+        ]
+        shard_results = self._scatter(calls)
+        return [
+            merge_results([results[row] for results in shard_results], top_k)
+            for row, top_k in enumerate(top_ks)
+        ]
+
+    def save(self, path):
+        """
+        Writes every shard next to path and a manifest describing them to path.
+        """
+        for position, shard in enumerate(self.shards):
+            shard.save(shard_path(path, position))
+        manifest = {
+            "shards": len(self.shards),
+            "partition": self.partition,
+            "index_type": self.index_type,
+            "metric": self.metric,
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(manifest, file)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, processes=False):
+        """
+        Reads an index written by save. Call restore before using it.
+
+        Args:
+            path (str): Manifest file written by save.
+            processes (bool): Run each shard in a ShardProcess.
+
+        Returns:
+            ShardedIndex: The loaded index with an empty hash map.
+
+        Raises:
+            ValueError: If path does not hold a shard manifest.
+        """
+        try:
+            with open(path) as file:
+                manifest = json.load(file)
+            count = manifest["shards"]
+            partition = manifest["partition"]
+        except (UnicodeDecodeError, ValueError, KeyError, TypeError) as e:
+            raise ValueError(f"Not a sharded index: {path}") from e
+        shards = []
+        try:
+            for position in range(count):
+                if processes:
+                    shards.append(ShardProcess())
+                    shards[-1].load(shard_path(path, position))
+                else:
+                    shards.append(SongIndex.load(shard_path(path, position)))
+        except Exception:
+            for shard in shards:
+                if isinstance(shard, ShardProcess):
+                    shard.close()
+            raise
+        return cls(shards, partition)
+
+    def close(self):
+        """
+        Stops the search threads and any shard processes.
+        """
+        self._executor.shutdown(wait=True)
+        for shard in self.shards:
+            if isinstance(shard, ShardProcess):
+                shard.close()
+
+
+def build_sharded_index(
+    song_hashes,
+    embeddings,
+    shards,
+    partition="hash",
+    index_type="flat",
+    songs=None,
+    processes=False,
+    **options,
+):
+    """
+    Builds a ShardedIndex, each shard built and trained on its own songs.
+
+    Args:
+        song_hashes (list): Song hashes, one per embedding.
+        embeddings (np.ndarray): Embedding matrix matching song_hashes.
+        shards (int): Number of shards.
+        partition (str): One of PARTITIONS.
+        index_type (str): One of INDEX_TYPES, for every shard.
+        songs (list, optional): Song metadata matching song_hashes; needed for
+            "artist" partitioning.
+        processes (bool): Run each shard in a ShardProcess.
+        **options: metric, nlist, hnsw_m and pq_m, see create_faiss_index.
+
+    Returns:
+        ShardedIndex: The populated index.
+    """
+    shard_class = ShardProcess if processes else SongIndex
+    options = {key: value for key, value in options.items() if value}
+    index = ShardedIndex(
+        [
+            shard_class(EMBEDDING_DIMENSION, index_type, **options)
+            for _ in range(shards)
+        ],
+        partition,
+    )
+    for position in range(shards):
+        index.rebuild_shard(position, song_hashes, embeddings, songs)
+    return index
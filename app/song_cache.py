@@ -0,0 +1,78 @@
+import json
+import threading
+from app.cache import LRUCache
+
+
+class SongCache:
+    """
+    Serialized GET /song responses of recently requested songs.
+
+    Entries hold the JSON body bytes, so hits skip both SQLite and json.dumps.
+    The cache follows its SongIndex: songs added or removed through the index
+    are dropped from it.
+    """
+
+    def __init__(self, index, maxsize=4096):
+        """
+        Args:
+            index (SongIndex): The index whose updates invalidate entries.
+            maxsize (int): Maximum number of songs kept; 0 disables the cache.
+        """
+        self.entries = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._generation = 0
+        index.listeners.append(self)
+
+    def get(self, song_hash, load_song):
+        """
+        Returns the JSON body for a song, loading and caching it on a miss.
+
+        Args:
+            song_hash (str): Hash of the song.
+            load_song (callable): Takes the song hash and returns the song
+                dictionary, or None if the song does not exist.
+
+        Returns:
+            bytes: The UTF-8 JSON body, or None if the song does not exist.
+        """
+        body = self.entries.get(song_hash)
+        if body is not None:
+            return body
+
+        generation = self._generation
+        song = load_song(song_hash)
+        if song is None:
+            return None
+        body = json.dumps(song, ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            # Skip caching if songs changed during the load, it could be stale
+            if generation == self._generation:
+                self.entries.put(song_hash, body)
+        return body
+
+    def songs_added(self, song_hashes, embeddings):
+        """
+        Drops any entries of the added songs.
+        """
+        self.invalidate(song_hashes)
+
+    def songs_removed(self, song_hashes):
+        """
+        Drops the entries of deleted songs.
+        """
+        self.invalidate(song_hashes)
+
+    def invalidate(self, song_hashes):
+        """
+        Drops the entries of songs changed in the database.
+        """
+        with self._lock:
+            self._generation += 1
+            for song_hash in song_hashes:
+                self.entries.pop(song_hash)
+
+    def stats(self):
+        """
+        Returns the cache size and lookup counters, see LRUCache.stats.
+        """
+        return self.entries.stats()
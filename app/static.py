@@ -0,0 +1,188 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import stat
+import threading
+from collections import namedtuple
+from email.utils import formatdate, parsedate_to_datetime
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only gzip variants are made
+    brotli = None
+
+# Smallest file worth compressing, in bytes
+MIN_COMPRESS_SIZE = 256
+
+# Content types served compressed when the client accepts it
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/javascript",
+    "application/json",
+    "application/xml",
+    "image/svg+xml",
+)
+
+# A cached static file: its bytes and validators, and compressed variants keyed
+# by content coding ("br", "gzip"), each with its own strong ETag
+StaticFile = namedtuple(
+    "StaticFile",
+    ["path", "body", "content_type", "etag", "last_modified", "mtime_ns", "variants"],
+)
+
+
+def compress_variants(body, content_type):
+    """
+    Returns the compressed variants worth serving for a file.
+
+    Args:
+        body (bytes): The file contents.
+        content_type (str): The file's MIME type.
+
+    Returns:
+        dict: Compressed bytes keyed by content coding, only for codings that
+        make the file smaller.
+    """
+    if len(body) < MIN_COMPRESS_SIZE or not content_type.startswith(COMPRESSIBLE_TYPES):
+        return {}
+    variants = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(body, quality=11)
+    return {coding: data for coding, data in variants.items() if len(data) < len(body)}
+
+
+def choose_encoding(accept_encoding, available):
+    """
+    Picks the content coding to send from an Accept-Encoding header.
+
+    Brotli is preferred over gzip when the client accepts both.
+
+    Args:
+        accept_encoding (str): The header value, or None.
+        available (iterable): Codings the file has variants for.
+
+    Returns:
+        str: The chosen coding, or None for the uncompressed file.
+    """
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    for coding in ("br", "gzip"):
+        if coding in available and accepted.get(coding, accepted.get("*", 0)) > 0:
+            return coding
+    return None
+
+
+def is_not_modified(if_none_match, if_modified_since, etag, mtime):
+    """
+    Evaluates conditional request headers against a representation.
+
+    If-None-Match takes precedence; If-Modified-Since is only used without it.
+
+    Args:
+        if_none_match (str): The If-None-Match header, or None.
+        if_modified_since (str): The If-Modified-Since header, or None.
+        etag (str): The representation's ETag.
+        mtime (float): The file's modification time, in seconds.
+
+    Returns:
+        bool: True if a 304 Not Modified response should be sent.
+    """
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        # Weak comparison, as RFC 9110 specifies for If-None-Match
+        return "*" in tags or etag in [tag.removeprefix("W/") for tag in tags]
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return int(mtime) <= since.timestamp()
+    return False
+
+
+class StaticFiles:
+    """
+    In-memory cache of the files under a static directory.
+
+    Files are read and compressed once and served from memory until their
+    modification time or size changes. Paths that resolve outside the
+    directory are never served.
+    """
+
+    def __init__(self, root):
+        """
+        Args:
+            root (str): The static directory.
+        """
+        self.root = os.path.realpath(root)
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def get(self, url_path):
+        """
+        Returns the cached file for a URL path, loading it if needed.
+
+        Args:
+            url_path (str): Decoded URL path relative to the static directory.
+
+        Returns:
+            StaticFile: The file, or None if it does not exist or lies outside
+            the static directory.
+        """
+        path = os.path.realpath(os.path.join(self.root, url_path.lstrip("/")))
+        if os.path.commonpath([self.root, path]) != self.root:
+            return None
+        try:
+            file_stat = os.stat(path)
+        except (OSError, ValueError):
+            return None
+        if not stat.S_ISREG(file_stat.st_mode):
+            return None
+
+        cached = self._files.get(path)
+        if (
+            cached is not None
+            and cached.mtime_ns == file_stat.st_mtime_ns
+            and len(cached.body) == file_stat.st_size
+        ):
+            return cached
+        return self._load(path)
+
+    def _load(self, path):
+        try:
+            with open(path, "rb") as file:
+                body = file.read()
+                file_stat = os.fstat(file.fileno())
+        except OSError:
+            return None
+
+        content_type, _ = mimetypes.guess_type(path)
+        if not content_type:
+            content_type = "text/html"
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        variants = {
+            coding: (data, f'"{digest}-{coding}"')
+            for coding, data in compress_variants(body, content_type).items()
+        }
+        static_file = StaticFile(
+            path,
+            body,
+            content_type,
+            f'"{digest}"',
+            formatdate(file_stat.st_mtime, usegmt=True),
+            file_stat.st_mtime_ns,
+            variants,
+        )
+        with self._lock:
+            self._files[path] = static_file
+        return static_file
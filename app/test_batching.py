@@ -0,0 +1,71 @@
+import threading
+import unittest
+from app.batching import MicroBatcher
+
+
+class TestMicroBatcher(unittest.TestCase):
+    def test_coalesces_concurrent_items(self):
+        # Items submitted together should be processed in shared batches
+        batch_sizes = []
+
+        def process(items):
+            batch_sizes.append(len(items))
+            return [item * 2 for item in items]
+
+        batcher = MicroBatcher(process, max_batch=8, max_wait=0.2)
+        results = {}
+        threads = [
+            threading.Thread(
+                target=lambda i=i: results.__setitem__(i, batcher.submit(i))
+            )
+            for i in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        batcher.close()
+
+        self.assertEqual(results, {i: i * 2 for i in range(8)})
+        self.assertLess(len(batch_sizes), 8)
+        self.assertEqual(batcher.stats()["items"], 8)
+
+    def test_propagates_errors(self):
+        # A failing batch should raise in every waiting caller
+        def process(items):
+            raise RuntimeError("boom")
+
+        batcher = MicroBatcher(process, max_wait=0)
+        with self.assertRaises(RuntimeError):
+            batcher.submit(1)
+        batcher.close()
+
+    def test_isolates_failing_items(self):
+        # One bad item should not fail the other items of its batch
+        def process(items):
+            if any(item < 0 for item in items):
+                raise ValueError("negative")
+            return [item * 2 for item in items]
+
+        batcher = MicroBatcher(process, max_batch=8, max_wait=0.2)
+        results = {}
+
+        def submit(i):
+            try:
+                results[i] = batcher.submit(i)
+            except ValueError as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=submit, args=(i,)) for i in (1, 2, -1, 3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        batcher.close()
+
+        self.assertEqual({i: results[i] for i in (1, 2, 3)}, {1: 2, 2: 4, 3: 6})
+        self.assertIsInstance(results[-1], ValueError)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import time
+import unittest
+from app.cache import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_get_and_put(self):
+        # Stored values should be returned and counted as hits
+        cache = LRUCache(maxsize=2)
+        cache.put("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_evicts_least_recently_used(self):
+        # The least recently used entry should be evicted when the cache is full
+        cache = LRUCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertEqual(len(cache), 2)
+
+    def test_ttl_expiry(self):
+        # Expired entries should be treated as misses
+        cache = LRUCache(maxsize=2, ttl=0.01)
+        cache.put("a", 1)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+    def test_pop_and_disabled_cache(self):
+        # Popped keys should disappear and a zero-size cache should store nothing
+        cache = LRUCache(maxsize=2)
+        cache.put("a", 1)
+        cache.pop("a")
+        self.assertIsNone(cache.get("a"))
+
+        disabled = LRUCache(maxsize=0)
+        disabled.put("a", 1)
+        self.assertIsNone(disabled.get("a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,11 +1,29 @@
+import json
+import threading
 import unittest
 import os
+from unittest import mock
+import numpy as np
+from app.embeddings import generate_embeddings
 from app.db import (
+    ConnectionPool,
     get_connection,
     create_tables,
     generate_song_hash,
     insert_songs,
+    load_index,
+    load_mapped_index,
+    load_sharded_index,
+    sync_index,
+    blobs_to_matrix,
+    embedding_cache_key,
+    encode_texts,
+    song_full_text,
+    store_songs,
+    validate_song,
     generate_embedding,
+    fts_query,
+    lexical_search,
 )
 
 
@@ -18,9 +36,10 @@ class TestDatabaseFunctions(unittest.TestCase):
         create_tables(self.db_name)
 
     def tearDown(self):
-        # Remove the test database after each test
-        if os.path.exists(self.db_name):
-            os.remove(self.db_name)
+        # Remove the test database and its WAL files after each test
+        for path in (self.db_name, self.db_name + "-wal", self.db_name + "-shm"):
+            if os.path.exists(path):
+                os.remove(path)
 
     def test_create_tables(self):
         # Test if the table was created successfully
@@ -33,6 +52,22 @@ class TestDatabaseFunctions(unittest.TestCase):
         conn.close()
         self.assertIsNotNone(table_exists, "Table 'songs' should exist after creation.")
 
+    def test_connection_pool(self):
+        # Test that each thread gets its own WAL-mode connection from the pool
+        pool = ConnectionPool(self.db_name)
+        main_conn = pool.get()
+        self.assertIs(pool.get(), main_conn)
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(pool.get()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], main_conn)
+
+        journal_mode = main_conn.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(journal_mode, "wal")
+        pool.close_all()
+
     def test_generate_song_hash(self):
         # Test generating a unique hash for a song
         song_data = {
@@ -104,6 +139,304 @@ class TestDatabaseFunctions(unittest.TestCase):
             "There should be only one instance of the duplicate song in the database.",
         )
 
+    def test_reseeding_skips_encoding(self):
+        # Re-inserting stored songs should not need the embedding model
+        song = {"artist": "Seed Artist", "song": "Seed Song", "year": 2020}
+        insert_songs([song], self.db_name)
+        with mock.patch("app.db.generate_embeddings") as encode:
+            insert_songs([song], self.db_name)
+        encode.assert_not_called()
+
+    def test_validate_song(self):
+        # Test that badly typed fields are rejected before anything is stored
+        validate_song({"artist": "A", "song": "S", "year": 2001})
+        validate_song({"artist": "A", "year": None})
+        for song in (
+            ["not", "a", "song"],
+            {"artist": ["A"]},
+            {"description": 3},
+            {"year": {"x": 1}},
+            {"year": "2001"},
+            {"year": True},
+        ):
+            with self.subTest(song=song), self.assertRaises(ValueError):
+                validate_song(song)
+
+    def test_embedding_cache(self):
+        # Texts should be encoded once, even after their song is deleted
+        song = {"artist": "Cache Artist", "song": "Cache Song", "year": 2020}
+        insert_songs([song], self.db_name)
+        conn = get_connection(self.db_name)
+        conn.execute("DELETE FROM songs")
+        conn.commit()
+        with mock.patch("app.db.generate_embeddings") as encode:
+            insert_songs([song], self.db_name)
+        encode.assert_not_called()
+
+        texts = ["first text", "second text", "first text"]
+        embeddings = encode_texts(conn.cursor(), texts)
+        conn.commit()
+        self.assertEqual(embeddings.shape, (3, 384))
+        np.testing.assert_array_equal(embeddings[0], embeddings[2])
+        with mock.patch("app.db.generate_embeddings") as encode:
+            cached = encode_texts(conn.cursor(), texts[:2])
+        encode.assert_not_called()
+        np.testing.assert_array_equal(cached, embeddings[:2])
+        self.assertNotEqual(embedding_cache_key("a"), embedding_cache_key("a "))
+        conn.close()
+
+    def test_store_songs_encodes_before_writing(self):
+        # The model must not run inside the write transaction of the batch
+        conn = get_connection(self.db_name)
+        in_transaction = []
+
+        def encode(texts, batch_size):
+            in_transaction.append(conn.in_transaction)
+            return generate_embeddings(texts, batch_size)
+
+        songs = [{"artist": "Lock", "song": f"Song {i}"} for i in range(5)]
+        with mock.patch("app.db.generate_embeddings", side_effect=encode):
+            results, song_hashes, embeddings, _ = store_songs(
+                conn.cursor(), songs, batch_size=2
+            )
+        self.assertEqual(in_transaction, [False])
+        self.assertTrue(conn.in_transaction)
+        conn.commit()
+        self.assertEqual(embeddings.shape, (5, 384))
+        self.assertEqual([status for _, status in results], ["created"] * 5)
+        conn.close()
+
+    def test_embedding_cache_filled_from_songs(self):
+        # A new cache table should start with the stored songs' embeddings
+        song = {"artist": "Backfill Artist", "song": "Backfill Song", "year": 2020}
+        insert_songs([song], self.db_name)
+        conn = get_connection(self.db_name)
+        conn.execute("DROP TABLE embedding_cache")
+        conn.commit()
+        create_tables(self.db_name)
+        with mock.patch("app.db.generate_embeddings") as encode:
+            encode_texts(conn.cursor(), [song_full_text(song)])
+        encode.assert_not_called()
+        conn.close()
+
+    def test_insert_songs_updates_index(self):
+        # Test that inserted songs are added to a live index and reloaded from the DB
+        song = {
+            "artist": "Index Artist",
+            "song": "Index Song",
+            "album": "Index Album",
+            "year": 2020,
+            "description": "A song that should be indexed.",
+        }
+        index = load_index(self.db_name)
+        self.assertEqual(len(index), 0)
+
+        insert_songs([song], self.db_name, index=index)
+        insert_songs([song], self.db_name, index=index)
+        self.assertEqual(len(index), 1)
+        self.assertIn(generate_song_hash(song), index)
+        self.assertEqual(len(load_index(self.db_name)), 1)
+
+    def test_load_index_from_file(self):
+        # Test that a saved index is reloaded and caught up with the database
+        index_path = self.db_name + ".index"
+        first = {"artist": "Saved Artist", "song": "First", "year": 2001}
+        second = {"artist": "Saved Artist", "song": "Second", "year": 2002}
+        insert_songs([first], self.db_name)
+        load_index(self.db_name, index_path=index_path)
+        self.assertTrue(os.path.exists(index_path))
+
+        insert_songs([second], self.db_name)
+        try:
+            index = load_index(self.db_name, index_path=index_path)
+        finally:
+            os.remove(index_path)
+
+        self.assertEqual(len(index), 2)
+        query = [0.0] * 384
+        results = index.search(query, 5, filters={"artist": "Saved Artist"})
+        self.assertEqual(len(results), 2)
+        results = index.search(query, 5, filters={"year_from": 2002})
+        self.assertEqual([h for h, _ in results], [generate_song_hash(second)])
+
+    def test_sync_index_and_mapped_index(self):
+        # Test that an index follows songs written by another connection, and
+        # that a mapped copy of it drops songs deleted after it was saved
+        index_path = self.db_name + ".index"
+        first = {"artist": "Sync Artist", "song": "First", "year": 2001}
+        second = {"artist": "Sync Artist", "song": "Second", "year": 2002}
+        insert_songs([first], self.db_name)
+        index = load_index(self.db_name)
+        insert_songs([second], self.db_name)
+
+        conn = get_connection(self.db_name)
+        self.assertEqual(sync_index(index, conn.cursor()), (1, 0))
+        self.assertEqual(sync_index(index, conn.cursor()), (0, 0))
+        index.save(index_path)
+        try:
+            conn.execute(
+                "DELETE FROM songs WHERE hash = ?", (generate_song_hash(first),)
+            )
+            conn.commit()
+            mapped = load_mapped_index(self.db_name, index_path)
+            self.assertEqual(sync_index(index, conn.cursor()), (0, 1))
+        finally:
+            conn.close()
+            os.remove(index_path)
+
+        self.assertEqual(len(index), 1)
+        self.assertTrue(mapped.read_only)
+        self.assertEqual(len(mapped), 1)
+        self.assertIn(generate_song_hash(second), mapped)
+
+    def test_load_sharded_index_from_file(self):
+        # Test that a saved sharded index is reloaded and caught up with the database
+        index_path = self.db_name + ".index"
+        songs = [
+            {"artist": f"Shard Artist {i}", "song": "Song", "year": i} for i in range(6)
+        ]
+        insert_songs(songs[:4], self.db_name)
+        first = load_sharded_index(self.db_name, index_path=index_path, shards=2)
+        first.close()
+
+        insert_songs(songs[4:], self.db_name)
+        try:
+            index = load_sharded_index(
+                self.db_name, index_path=index_path, shards=2, partition="hash"
+            )
+        finally:
+            for path in (index_path, index_path + ".shard0", index_path + ".shard1"):
+                os.remove(path)
+
+        self.assertEqual(len(index), 6)
+        results = index.search([0.0] * 384, 5, filters={"year_from": 4})
+        self.assertEqual(len(results), 2)
+        index.close()
+
+    def test_insert_songs_in_batches(self):
+        # Test that batched inserts store every song once, whatever the batch size
+        songs = [
+            {
+                "artist": f"Batch Artist {i}",
+                "song": f"Batch Song {i}",
+                "album": "Batch Album",
+                "year": 2000 + i,
+                "description": "A batched test song.",
+            }
+            for i in range(5)
+        ]
+        index = load_index(self.db_name)
+        insert_songs(songs[:2], self.db_name, index=index, batch_size=2)
+        insert_songs(songs + songs[:1], self.db_name, index=index, batch_size=2)
+
+        conn = get_connection(self.db_name)
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM songs")
+        count = cursor.fetchone()[0]
+        conn.close()
+
+        self.assertEqual(count, 5, "Each song should be stored exactly once.")
+        self.assertEqual(len(index), 5)
+
+    def test_store_songs_statuses(self):
+        # Test that store_songs reports created and duplicate songs per input row
+        song = {"artist": "Status Artist", "song": "Status Song", "year": 2018}
+        other = {"artist": "Status Artist", "song": "Other Song", "year": 2018}
+
+        conn = get_connection(self.db_name)
+        cursor = conn.cursor()
+        store_songs(cursor, [song])
+        results, song_hashes, embeddings, new_songs = store_songs(
+            cursor, [song, other, other]
+        )
+        conn.commit()
+        conn.close()
+
+        self.assertEqual(
+            [status for _, status in results], ["duplicate", "created", "duplicate"]
+        )
+        self.assertEqual(song_hashes, [generate_song_hash(other)])
+        self.assertEqual(embeddings.shape, (1, 384))
+        self.assertEqual(new_songs, [other])
+
+    def test_embeddings_stored_as_blobs(self):
+        # Test that embeddings are stored as float32 BLOBs and load into one matrix
+        song = {
+            "artist": "Blob Artist",
+            "song": "Blob Song",
+            "album": "Blob Album",
+            "year": 2019,
+            "description": "A song stored as a BLOB.",
+        }
+        insert_songs([song], self.db_name)
+
+        conn = get_connection(self.db_name)
+        cursor = conn.cursor()
+        cursor.execute("SELECT typeof(embedding), embedding FROM songs")
+        column_type, blob = cursor.fetchone()
+        conn.close()
+
+        self.assertEqual(column_type, "blob")
+        matrix = blobs_to_matrix([blob])
+        self.assertEqual(matrix.shape, (1, 384))
+        self.assertEqual(matrix.dtype.itemsize, 4)
+
+    def test_migrate_json_embeddings(self):
+        # Test that create_tables converts embeddings stored as JSON text
+        embedding = [0.5] * 384
+        conn = get_connection(self.db_name)
+        conn.execute(
+            "INSERT INTO songs (hash, embedding) VALUES (?, ?)",
+            ("legacy", json.dumps(embedding)),
+        )
+        conn.commit()
+        conn.close()
+
+        create_tables(self.db_name)
+
+        conn = get_connection(self.db_name)
+        cursor = conn.cursor()
+        cursor.execute("SELECT typeof(embedding), embedding FROM songs")
+        column_type, blob = cursor.fetchone()
+        conn.close()
+
+        self.assertEqual(column_type, "blob")
+        self.assertEqual(blobs_to_matrix([blob]).tolist(), [embedding])
+
+    def test_full_text_index_follows_songs(self):
+        # Triggers should keep the trigram index in step with inserts and deletes
+        songs = [
+            {"artist": "שלום חנוך", "song": "מחכים למשיח", "description": "מחאה"},
+            {"artist": "Arik Einstein", "song": "Ahava", "description": "love"},
+        ]
+        insert_songs(songs, self.db_name)
+        conn = get_connection(self.db_name)
+        cursor = conn.cursor()
+
+        # Partial words match through their trigrams, short words are dropped
+        matches = lexical_search(cursor, "חנו ab", 10)
+        self.assertEqual([h for h, _ in matches], [generate_song_hash(songs[0])])
+        self.assertGreater(matches[0][1], 0)
+        self.assertEqual(fts_query('ab "Einst'), '"""Einst"')
+
+        cursor.execute("DELETE FROM songs WHERE artist = ?", ("שלום חנוך",))
+        conn.commit()
+        self.assertEqual(lexical_search(cursor, "חנוך", 10), [])
+        self.assertEqual(len(lexical_search(cursor, "einstein", 10)), 1)
+        conn.close()
+
+    def test_full_text_index_built_for_existing_songs(self):
+        # A database created before the full-text index should be backfilled
+        insert_songs([{"artist": "Existing Artist", "song": "Old"}], self.db_name)
+        conn = get_connection(self.db_name)
+        conn.executescript("DROP TABLE songs_fts; DROP TRIGGER songs_fts_insert;")
+        conn.close()
+
+        create_tables(self.db_name)
+        conn = get_connection(self.db_name)
+        self.assertEqual(len(lexical_search(conn.cursor(), "existing", 10)), 1)
+        conn.close()
+
     def test_generate_embedding(self):
         # Test if generate_embedding returns a list
         text = "Test song, Artist, Album, 2023, Description."
@@ -1,5 +1,16 @@
 import unittest
-from app.embeddings import generate_embedding
+from app.embeddings import (
+    check_encoder_parity,
+    generate_embedding,
+    generate_embeddings,
+    get_model,
+    get_query_embedding,
+    get_query_embeddings,
+    load_encoder,
+    model_ready,
+    query_cache,
+    warm_up_model,
+)
 
 
 class TestGenerateEmbedding(unittest.TestCase):
@@ -28,6 +39,63 @@ class TestGenerateEmbedding(unittest.TestCase):
             f"Embedding length should be {expected_length}.",
         )
 
+    def test_model_loaded_once(self):
+        # Warm-up and direct use should share one lazily loaded model
+        warm_up_model().join()
+        self.assertTrue(model_ready.is_set())
+        self.assertIs(get_model(), get_model())
+
+    def test_encoder_parity(self):
+        # The loaded model should match a freshly loaded reference encoder
+        min_cosine = check_encoder_parity(get_model(), load_encoder("torch"))
+        self.assertGreater(min_cosine, 0.99)
+
+    def test_unknown_encoder_backend(self):
+        with self.assertRaises(ValueError):
+            load_encoder("tpu")
+
+    def test_embeddings_are_normalized(self):
+        # Embeddings should have unit length so inner products are cosines
+        embedding = generate_embedding(self.sample_text)
+        self.assertAlmostEqual(sum(x * x for x in embedding), 1.0, places=4)
+        for row in generate_embeddings([self.sample_text, "Another one."]):
+            self.assertAlmostEqual(float((row * row).sum()), 1.0, places=4)
+
+    def test_generate_embeddings_batch(self):
+        # Batched encoding should return one row per text matching single encoding
+        texts = [self.sample_text, "Another test sentence.", "A third one."]
+        embeddings = generate_embeddings(texts, batch_size=2)
+
+        self.assertEqual(embeddings.shape, (3, 384))
+        self.assertEqual(str(embeddings.dtype), "float32")
+        for text, row in zip(texts, embeddings):
+            self.assertTrue(
+                all(
+                    abs(a - b) < 1e-4
+                    for a, b in zip(generate_embedding(text), row.tolist())
+                ),
+                "Batched and single embeddings should match.",
+            )
+
+    def test_get_query_embedding_cached(self):
+        # Repeated queries differing only in case or spacing should hit the cache
+        query_cache.clear()
+        hits = query_cache.hits
+        first = get_query_embedding("  Love   Song ")
+        second = get_query_embedding("love song")
+
+        self.assertEqual(first, second)
+        self.assertEqual(query_cache.hits, hits + 1)
+
+    def test_get_query_embeddings_batch(self):
+        # Batched lookups should match single ones and fill the cache
+        query_cache.clear()
+        embeddings = get_query_embeddings(["rock", "Jazz", "rock "])
+        self.assertEqual(embeddings[0], embeddings[2])
+        self.assertEqual(len(query_cache), 2)
+        for query, embedding in zip(["rock", "jazz"], embeddings):
+            self.assertEqual(get_query_embedding(query), embedding)
+
 
 if __name__ == "__main__":
     unittest.main()
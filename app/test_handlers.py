@@ -0,0 +1,281 @@
+import gzip
+import http.client
+import json
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from app.db import create_tables, generate_song_hash, insert_songs, load_index
+from app.handlers import SongRequestHandler, db_pool
+from app.http_server import make_server
+from app.neighbours import NeighbourTable
+from app.search import result_sets
+from app.song_cache import SongCache
+
+
+class QuietSongRequestHandler(SongRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class HandlerTestCase(unittest.TestCase):
+    """
+    Serves SongRequestHandler over plain HTTP from a temporary database.
+    """
+
+    songs = [
+        {"artist": f"Artist {i % 3}", "song": f"Song {i}", "year": 2000 + i}
+        for i in range(12)
+    ]
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_name = os.path.join(self.tmp_dir.name, "songs.db")
+        create_tables(self.db_name)
+        insert_songs(self.songs, self.db_name)
+        patcher = mock.patch.object(db_pool, "db_name", self.db_name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.httpd = make_server(("127.0.0.1", 0), QuietSongRequestHandler, workers=2)
+        index = load_index(self.db_name)
+        self.httpd.song_index = index
+        self.httpd.neighbours = NeighbourTable(index, 16, 10)
+        self.httpd.song_cache = SongCache(index, 16)
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.start()
+        self.conn = http.client.HTTPConnection(
+            "127.0.0.1", self.httpd.server_address[1]
+        )
+
+    def tearDown(self):
+        self.conn.close()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+        db_pool.close_all()
+        self.tmp_dir.cleanup()
+
+    def request(self, method, path, body=None, headers=None, **kwargs):
+        self.conn.request(method, path, body=body, headers=headers or {}, **kwargs)
+        response = self.conn.getresponse()
+        return response, response.read()
+
+    def post_json(self, path, data, headers=None):
+        response, body = self.request("POST", path, json.dumps(data), headers)
+        return response, json.loads(body) if body else None
+
+
+class TestBulkAddSongs(HandlerTestCase):
+    def post_bulk(self, body, **kwargs):
+        response, data = self.request("POST", "/songs/bulk", body, **kwargs)
+        self.assertEqual(response.status, 200)
+        return [json.loads(line) for line in data.decode("utf-8").splitlines()]
+
+    def test_statuses_per_line(self):
+        # Every non-blank row gets a status; bad rows do not fail the others
+        new_song = {"artist": "Bulk", "song": "New"}
+        lines = [
+            json.dumps(new_song),
+            "{not json",
+            "",
+            json.dumps({"artist": "Bulk", "song": "Typed", "year": {"x": 1}}),
+            "[1, 2]",
+            json.dumps(self.songs[0]),
+            json.dumps(new_song),
+        ]
+        statuses = self.post_bulk("\n".join(lines).encode("utf-8"))
+
+        self.assertEqual([status["line"] for status in statuses], [1, 2, 4, 5, 6, 7])
+        self.assertEqual(
+            [status["status"] for status in statuses],
+            ["created", "error", "error", "error", "duplicate", "duplicate"],
+        )
+        self.assertEqual(statuses[0]["hash"], generate_song_hash(new_song))
+        self.assertEqual(statuses[1]["error"], "Invalid JSON")
+        self.assertEqual(statuses[2]["error"], "year must be an integer")
+        self.assertIn(generate_song_hash(new_song), self.httpd.song_index)
+
+    def test_chunked_body(self):
+        # Rows split across transfer chunks are put back together
+        body = "".join(
+            json.dumps({"artist": "Chunked", "song": f"Song {i}"}) + "\n"
+            for i in range(5)
+        ).encode("utf-8")
+        pieces = [body[start : start + 7] for start in range(0, len(body), 7)]
+        statuses = self.post_bulk(
+            iter(pieces),
+            headers={"Transfer-Encoding": "chunked"},
+            encode_chunked=True,
+        )
+        self.assertEqual([status["line"] for status in statuses], [1, 2, 3, 4, 5])
+        self.assertTrue(all(status["status"] == "created" for status in statuses))
+
+    def test_oversized_line_is_one_row(self):
+        # A line over the limit is one error row and later lines keep their numbers
+        lines = [
+            json.dumps({"artist": "Long", "song": "x" * 200}),
+            json.dumps({"artist": "Short", "song": "After"}),
+        ]
+        body = "\n".join(lines).encode("utf-8")
+        for chunked in (False, True):
+            with self.subTest(chunked=chunked), mock.patch(
+                "app.handlers.BULK_MAX_LINE", 64
+            ):
+                if chunked:
+                    statuses = self.post_bulk(
+                        iter([body[:50], body[50:120], body[120:]]),
+                        headers={"Transfer-Encoding": "chunked"},
+                        encode_chunked=True,
+                    )
+                else:
+                    statuses = self.post_bulk(body)
+                self.assertEqual([status["line"] for status in statuses], [1, 2])
+                self.assertEqual(
+                    statuses[0],
+                    {
+                        "line": 1,
+                        "status": "error",
+                        "error": "Line longer than 64 bytes",
+                    },
+                )
+                self.assertIn(statuses[1]["status"], ("created", "duplicate"))
+
+
+class TestAddSong(HandlerTestCase):
+    def test_add_and_duplicate(self):
+        song = {"artist": "New Artist", "song": "New Song", "year": 2024}
+        response, data = self.post_json("/song", song)
+        self.assertEqual(response.status, 201)
+        self.assertEqual(data["hash"], generate_song_hash(song))
+        self.assertIn(data["hash"], self.httpd.song_index)
+
+        response, _ = self.request("POST", "/song", json.dumps(song))
+        self.assertEqual(response.status, 409)
+
+    def test_invalid_bodies(self):
+        # Unreadable or malformed bodies get 400 instead of a dropped connection
+        for body in (b"\xff\xfe", b"{not json", b'{"artist": ["A"]}'):
+            with self.subTest(body=body):
+                response, _ = self.request("POST", "/song", body)
+                self.assertEqual(response.status, 400)
+
+    def test_chunked_body_rejected(self):
+        # The server answers before reading the body, so the whole request is
+        # sent at once rather than through http.client, which would still be
+        # writing chunks when the connection closes
+        with socket.create_connection(self.httpd.server_address) as sock:
+            sock.sendall(
+                b"POST /song HTTP/1.1\r\nHost: localhost\r\n"
+                b"Transfer-Encoding: chunked\r\n\r\n"
+                b'f\r\n{"artist": "A"}\r\n0\r\n\r\n'
+            )
+            response = http.client.HTTPResponse(sock)
+            response.begin()
+        self.assertEqual(response.status, 400)
+
+
+class TestSimilarSongs(HandlerTestCase):
+    def test_top_k(self):
+        # Similar songs exclude the song itself; top_k is bounded like /search
+        song_hash = generate_song_hash(self.songs[0])
+        response, body = self.request("GET", f"/song/similar?hash={song_hash}&top_k=3")
+        self.assertEqual(response.status, 200)
+        results = json.loads(body)
+        self.assertEqual(len(results), 3)
+        self.assertNotIn(song_hash, [result["hash"] for result in results])
+
+        for top_k in ("-1", "many", "999999999"):
+            with self.subTest(top_k=top_k):
+                response, _ = self.request(
+                    "GET", f"/song/similar?hash={song_hash}&top_k={top_k}"
+                )
+                self.assertEqual(response.status, 400)
+
+
+class TestMetrics(HandlerTestCase):
+    def test_unknown_methods_share_a_label(self):
+        # Client-chosen methods must not create new time series
+        for method in ("FOO1", "FOO2", "FOO3"):
+            self.request(method, "/song")
+        _, body = self.request("GET", "/metrics")
+        metrics = body.decode("utf-8")
+        self.assertIn('method="other"', metrics)
+        self.assertNotIn("FOO", metrics)
+
+
+class TestSearchResponses(HandlerTestCase):
+    def setUp(self):
+        super().setUp()
+        result_sets.clear()
+        self.search = {"query": "Song", "top_k": 10}
+        response, results = self.post_json("/search", self.search)
+        self.assertEqual(response.status, 200)
+        self.ranked = [result["hash"] for result in results]
+        self.assertEqual(len(self.ranked), 10)
+
+    def test_pages_follow_cursors(self):
+        # Following next_cursor walks the same ranking a page at a time
+        response, page = self.post_json("/search", {**self.search, "limit": 4})
+        pages = [page]
+        while page["next_cursor"] is not None:
+            response, page = self.post_json("/search", {"cursor": page["next_cursor"]})
+            self.assertEqual(response.status, 200)
+            pages.append(page)
+
+        self.assertEqual([page["offset"] for page in pages], [0, 4, 8])
+        self.assertTrue(all(page["total"] == 10 for page in pages))
+        hashes = [result["hash"] for page in pages for result in page["results"]]
+        self.assertEqual(hashes, self.ranked)
+
+    def test_cursor_without_cached_result_set(self):
+        # A process that never saw the first page reruns the search
+        _, page = self.post_json("/search", {**self.search, "limit": 4})
+        result_sets.clear()
+        response, page = self.post_json("/search", {"cursor": page["next_cursor"]})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(
+            [result["hash"] for result in page["results"]], self.ranked[4:8]
+        )
+
+        response, _ = self.request("POST", "/search", '{"cursor": "bogus"}')
+        self.assertEqual(response.status, 400)
+
+    def test_streamed_results(self):
+        # Streamed bodies are chunked, optionally gzip-compressed, and hold the
+        # same results as buffered ones
+        for accept_encoding in ("identity", "gzip"):
+            with self.subTest(accept_encoding=accept_encoding):
+                response, body = self.request(
+                    "POST",
+                    "/search",
+                    json.dumps({**self.search, "stream": True}),
+                    {"Accept-Encoding": accept_encoding},
+                )
+                self.assertEqual(response.status, 200)
+                self.assertEqual(response.getheader("Transfer-Encoding"), "chunked")
+                if accept_encoding == "gzip":
+                    self.assertEqual(response.getheader("Content-Encoding"), "gzip")
+                    body = gzip.decompress(body)
+                else:
+                    self.assertIsNone(response.getheader("Content-Encoding"))
+                results = json.loads(body)
+                self.assertEqual([result["hash"] for result in results], self.ranked)
+
+    def test_streamed_page(self):
+        # A streamed page is an object with the pagination fields
+        response, page = self.post_json(
+            "/search", {**self.search, "limit": 4, "offset": 8, "stream": True}
+        )
+        self.assertEqual(response.getheader("Transfer-Encoding"), "chunked")
+        self.assertEqual(
+            [result["hash"] for result in page["results"]], self.ranked[8:]
+        )
+        self.assertEqual((page["offset"], page["total"]), (8, 10))
+        self.assertIsNone(page["next_cursor"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import http.client
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler
+from app.http_server import KeepAliveRequestHandler, PooledHTTPServer, make_server
+
+
+class EchoThreadHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = threading.current_thread().name.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestMakeServer(unittest.TestCase):
+    def test_unknown_mode(self):
+        # Unknown serving modes should be rejected
+        with self.assertRaises(ValueError):
+            make_server(("127.0.0.1", 0), EchoThreadHandler, mode="bogus")
+
+    def test_threaded_mode_uses_worker_pool(self):
+        # Requests in threaded mode should be handled by pool worker threads
+        httpd = make_server(("127.0.0.1", 0), EchoThreadHandler, workers=2)
+        self.assertIsInstance(httpd, PooledHTTPServer)
+        thread = threading.Thread(target=httpd.serve_forever)
+        thread.start()
+        try:
+            names = []
+            for _ in range(3):
+                conn = http.client.HTTPConnection("127.0.0.1", httpd.server_address[1])
+                conn.request("GET", "/")
+                names.append(conn.getresponse().read().decode("utf-8"))
+                conn.close()
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+            thread.join()
+
+        self.assertTrue(all(name.startswith("songdb-worker") for name in names))
+
+
+class EchoKeepAliveHandler(KeepAliveRequestHandler):
+    max_requests = 3
+
+    def do_GET(self):
+        body = str(self.requests_handled).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        # Only reads the body when asked to
+        if self.path == "/read":
+            self.read_body()
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestKeepAlive(unittest.TestCase):
+    def setUp(self):
+        self.httpd = make_server(("127.0.0.1", 0), EchoKeepAliveHandler, workers=2)
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.start()
+        self.conn = http.client.HTTPConnection(
+            "127.0.0.1", self.httpd.server_address[1]
+        )
+
+    def tearDown(self):
+        self.conn.close()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+
+    def request(self, method="GET", path="/", body=None):
+        self.conn.request(method, path, body=body)
+        response = self.conn.getresponse()
+        response.read()
+        return response
+
+    def test_requests_share_a_connection_up_to_the_cap(self):
+        # The first requests reuse one connection; the last one allowed closes it
+        responses = [self.request() for _ in range(3)]
+        self.assertEqual(
+            [response.will_close for response in responses], [False] * 2 + [True]
+        )
+        self.assertEqual(responses[2].getheader("Connection"), "close")
+
+    def test_read_body_keeps_connection(self):
+        # A request whose body was read leaves the connection open
+        self.request("POST", "/read", body=b"payload")
+        self.assertIsNotNone(self.conn.sock)
+        self.assertEqual(self.request().status, 200)
+
+    def test_unread_body_closes_connection(self):
+        # Unread body bytes must not be parsed as the next request
+        self.request("POST", "/skip", body=b"GET / HTTP/1.1\r\n\r\n")
+        with self.assertRaises(http.client.RemoteDisconnected):
+            self.request()
+
+    def test_single_mode_closes_connections(self):
+        # Without a worker pool an open connection would block other clients
+        httpd = make_server(("127.0.0.1", 0), EchoKeepAliveHandler, mode="single")
+        thread = threading.Thread(target=httpd.serve_forever)
+        thread.start()
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", httpd.server_address[1])
+            conn.request("GET", "/")
+            response = conn.getresponse()
+            response.read()
+            conn.close()
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+            thread.join()
+
+        self.assertTrue(response.will_close)
+
+
+if __name__ == "__main__":
+    unittest.main()
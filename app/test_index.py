@@ -0,0 +1,281 @@
+import hashlib
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from app.index import (
+    EMBEDDING_DIMENSION,
+    FilterIndex,
+    SongIndex,
+    build_index,
+    measure_recall,
+    song_id,
+)
+
+
+class TestSongIndex(unittest.TestCase):
+    def setUp(self):
+        # Build a small index with one-hot style vectors
+        self.index = SongIndex()
+        self.hashes = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(5)]
+        self.embeddings = np.zeros((5, EMBEDDING_DIMENSION), dtype=np.float32)
+        for i in range(5):
+            self.embeddings[i, i] = 1.0
+        self.index.add(self.hashes, self.embeddings)
+
+    def test_song_id(self):
+        # Ids should be positive integers that fit in an int64
+        faiss_id = song_id("f" * 64)
+        self.assertGreater(faiss_id, 0)
+        self.assertLess(faiss_id, 2**63)
+
+    def test_add_skips_existing(self):
+        # Adding an indexed song again should not duplicate it
+        self.index.add(self.hashes[:1], self.embeddings[:1])
+        self.assertEqual(len(self.index), 5)
+        self.assertEqual(self.index.index.ntotal, 5)
+
+    def test_search(self):
+        # The nearest song to a stored vector is the song itself
+        results = self.index.search(self.embeddings[2], 3)
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0][0], self.hashes[2])
+        self.assertAlmostEqual(results[0][1], 1.0)
+
+    def test_search_restricted(self):
+        # Restricting the search should only return the candidate songs
+        candidates = [self.hashes[0], self.hashes[4]]
+        results = self.index.search(self.embeddings[2], 5, candidates)
+        self.assertEqual(sorted(h for h, _ in results), sorted(candidates))
+
+    def test_min_score(self):
+        # Results below the similarity threshold should be dropped
+        results = self.index.search(self.embeddings[2] + self.embeddings[3], 5)
+        self.assertAlmostEqual(results[0][1], 2**-0.5, places=5)
+        self.assertAlmostEqual(results[2][1], 0.0, places=5)
+        thresholded = self.index.search(
+            self.embeddings[2] + self.embeddings[3], 5, min_score=0.5
+        )
+        self.assertEqual(len(thresholded), 2)
+
+    def test_metrics_report_cosine(self):
+        # The L2 and inner-product kernels should rank and score alike
+        query = np.arange(EMBEDDING_DIMENSION, dtype=np.float32)
+        l2_index = SongIndex(metric="l2")
+        l2_index.add(self.hashes, self.embeddings * 3)
+        cosine = self.index.search(query, 5)
+        l2 = l2_index.search(query, 5)
+        self.assertEqual([h for h, _ in cosine], [h for h, _ in l2])
+        for (_, a), (_, b) in zip(cosine, l2):
+            self.assertAlmostEqual(a, b, places=5)
+
+    def test_remove(self):
+        # Removed songs should no longer be returned
+        self.index.remove([self.hashes[2], "0" * 64])
+        self.assertNotIn(self.hashes[2], self.index)
+        results = self.index.search(self.embeddings[2], 5)
+        self.assertEqual(len(results), 4)
+        self.assertNotIn(self.hashes[2], [h for h, _ in results])
+
+
+class TestFilteredSearch(unittest.TestCase):
+    def setUp(self):
+        # Ten songs by two artists spread over the years 2000-2009
+        rng = np.random.default_rng(1)
+        self.embeddings = rng.standard_normal((10, EMBEDDING_DIMENSION))
+        self.hashes = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(10)]
+        self.songs = [
+            {
+                "artist": "Even" if i % 2 == 0 else "Odd",
+                "song": f"Song {i}",
+                "album": "Album",
+                "year": 2000 + i,
+            }
+            for i in range(10)
+        ]
+        self.index = SongIndex()
+        self.index.add(self.hashes, self.embeddings, self.songs)
+
+    def test_filter_index_match(self):
+        # Posting lists should answer equality and year range filters
+        filters = FilterIndex()
+        for i, song in enumerate(self.songs):
+            filters.add(i, song)
+        self.assertIsNone(filters.match())
+        self.assertEqual(filters.match(artist="Even", album="Album"), {0, 2, 4, 6, 8})
+        self.assertEqual(filters.match(year="2003"), {3})
+        self.assertEqual(filters.match(year_from=2004, year_to=2006), {4, 5, 6})
+        self.assertEqual(filters.match(artist="Odd", year_to=2003), {1, 3})
+        self.assertEqual(filters.match(artist="Nobody"), set())
+        self.assertEqual(filters.match(year=0), set())
+        self.assertEqual(filters.match(year_to=0), set())
+
+        filters.remove(3)
+        self.assertEqual(filters.match(year_from=2002, year_to=2004), {2, 4})
+        self.assertNotIn(2003, filters.years)
+
+    def test_filtered_search(self):
+        # Only songs matching the filters should be returned, best match first
+        filters = {"artist": "Odd", "year_from": 2002}
+        expected = {self.hashes[i] for i in (3, 5, 7, 9)}
+        for limit in (4096, 0):
+            with self.subTest(exact_filter_limit=limit):
+                with mock.patch("app.index.EXACT_FILTER_LIMIT", limit):
+                    results = self.index.search(self.embeddings[5], 10, filters=filters)
+                self.assertEqual({h for h, _ in results}, expected)
+                self.assertEqual(results[0][0], self.hashes[5])
+
+    def test_search_batch_matches_search(self):
+        # A batch should answer each query as a separate search would
+        top_ks = [3, 10, 2]
+        filters = [None, {"artist": "Even"}, None]
+        batch = self.index.search_batch(
+            self.embeddings[:3], top_ks, filters, min_scores=[None, None, 0.99]
+        )
+        for row in range(3):
+            expected = self.index.search(
+                self.embeddings[row],
+                top_ks[row],
+                filters=filters[row],
+                min_score=0.99 if row == 2 else None,
+            )
+            self.assertEqual([h for h, _ in batch[row]], [h for h, _ in expected])
+        self.assertEqual(len(batch[0]), 3)
+        self.assertEqual([h for h, _ in batch[2]], [self.hashes[2]])
+
+    def test_filters_follow_removal(self):
+        # Removed songs should disappear from filtered results
+        self.index.remove([self.hashes[4]])
+        results = self.index.search(self.embeddings[4], 10, filters={"year": 2004})
+        self.assertEqual(results, [])
+
+
+class TestApproximateIndexes(unittest.TestCase):
+    def setUp(self):
+        # Random catalog large enough to train the IVF backends
+        rng = np.random.default_rng(0)
+        self.embeddings = rng.standard_normal((1200, EMBEDDING_DIMENSION))
+        self.embeddings = self.embeddings.astype(np.float32)
+        self.hashes = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(1200)]
+        self.queries = self.embeddings[:20] + 0.01
+
+    def test_index_types(self):
+        # Each backend should be built as requested and find the true neighbours
+        for index_type, params, min_recall in (
+            ("hnsw", {"ef_search": 256}, 0.9),
+            ("ivf_flat", {"nprobe": 8}, 0.99),
+            ("ivf_pq", {"nprobe": 8}, 0.3),
+        ):
+            with self.subTest(index_type=index_type):
+                index = build_index(self.hashes, self.embeddings, index_type, nlist=8)
+                self.assertEqual(index.index_type, index_type)
+                self.assertEqual(len(index), 1200)
+                recall = measure_recall(
+                    index, self.hashes, self.embeddings, self.queries, 5, **params
+                )
+                self.assertGreaterEqual(recall, min_recall)
+
+    def test_default_search_depth(self):
+        # Searches without nprobe / ef_search use the configured depth, which
+        # a request can still override
+        for index_type, default, attribute in (
+            ("hnsw", "INDEX_EF_SEARCH", "efSearch"),
+            ("ivf_flat", "INDEX_NPROBE", "nprobe"),
+        ):
+            with self.subTest(index_type=index_type):
+                index = build_index(self.hashes, self.embeddings, index_type, nlist=8)
+                searched = []
+                search = index.index.search
+
+                def record(queries, k, params=None):
+                    searched.append(getattr(params, attribute))
+                    return search(queries, k, params=params)
+
+                with mock.patch(f"app.index.{default}", 48), mock.patch.object(
+                    index.index, "search", side_effect=record
+                ):
+                    index.search(self.queries[0], 5)
+                    index.search(self.queries[0], 5, nprobe=3, ef_search=3)
+                self.assertEqual(searched, [48, 3])
+
+    def test_falls_back_to_flat_when_too_small(self):
+        # Too few vectors to train IVF should give an exact index
+        index = build_index(self.hashes[:10], self.embeddings[:10], "ivf_flat")
+        self.assertEqual(index.index_type, "flat")
+        self.assertEqual(len(index), 10)
+
+    def test_hnsw_remove_and_readd(self):
+        # HNSW deletions are tombstoned and re-adding the song restores it
+        index = build_index(self.hashes[:50], self.embeddings[:50], "hnsw")
+        index.remove([self.hashes[3]])
+        results = index.search(self.embeddings[3], 50)
+        self.assertNotIn(self.hashes[3], [h for h, _ in results])
+        self.assertEqual(len(results), 49)
+
+        index.add([self.hashes[3]], self.embeddings[3:4])
+        self.assertEqual(index.search(self.embeddings[3], 1)[0][0], self.hashes[3])
+
+    def test_rebuild(self):
+        # A rebuild should swap in the new songs, drop tombstones and report
+        # the difference
+        index = build_index(self.hashes[:50], self.embeddings[:50], "hnsw")
+        index.remove([self.hashes[3]])
+        added, removed = index.rebuild(self.hashes[10:60], self.embeddings[10:60])
+        self.assertEqual(added, self.hashes[50:60])
+        self.assertEqual(sorted(removed), sorted(self.hashes[:3] + self.hashes[4:10]))
+        self.assertEqual(index.tombstones, set())
+        self.assertEqual(index.index.ntotal, 50)
+        self.assertEqual(index.search(self.embeddings[55], 1)[0][0], self.hashes[55])
+
+    def test_save_load_restore(self):
+        # A saved index should reload and reconcile with the current song list
+        index = build_index(self.hashes, self.embeddings, "ivf_flat", nlist=8)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "songs.index")
+            index.save(path)
+            loaded = SongIndex.load(path)
+
+        self.assertEqual(loaded.index_type, "ivf_flat")
+        missing = loaded.restore(self.hashes[1:] + ["f" * 64])
+        self.assertEqual(missing, ["f" * 64])
+        self.assertEqual(len(loaded), 1199)
+        self.assertEqual(loaded.index.ntotal, 1199)
+
+    def test_mmap_load_is_read_only(self):
+        # A mapped index searches as usual, tombstones deletions, takes back
+        # songs it still holds and leaves new songs for the next file
+        for index_type in ("flat", "hnsw"):
+            with self.subTest(index_type=index_type):
+                index = build_index(self.hashes[:50], self.embeddings[:50], index_type)
+                with tempfile.TemporaryDirectory() as tmp_dir:
+                    path = os.path.join(tmp_dir, "songs.index")
+                    index.save(path)
+                    loaded = SongIndex.load(path, mmap=True)
+                    loaded.restore(self.hashes[:50])
+                    self.assertTrue(loaded.read_only)
+                    self.assertEqual(
+                        loaded.search(self.embeddings[3], 1)[0][0], self.hashes[3]
+                    )
+
+                    loaded.remove([self.hashes[3]])
+                    results = loaded.search(self.embeddings[3], 50)
+                    self.assertEqual(len(results), 49)
+                    self.assertEqual(loaded.index.ntotal, 50)
+
+                    loaded.add(
+                        self.hashes[3:4] + self.hashes[60:61], self.embeddings[[3, 60]]
+                    )
+                    self.assertIn(self.hashes[3], loaded)
+                    self.assertNotIn(self.hashes[60], loaded)
+                    self.assertEqual(loaded.index.ntotal, 50)
+                    np.testing.assert_allclose(
+                        loaded.vectors(self.hashes[3:4])[0],
+                        self.embeddings[3] / np.linalg.norm(self.embeddings[3]),
+                        rtol=1e-5,
+                    )
+                    del loaded
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+from app.metrics import Counter, Gauge, Histogram, metric_family, render
+
+
+class TestMetrics(unittest.TestCase):
+    def test_counter_and_gauge(self):
+        # Samples are rendered per label set with HELP and TYPE lines
+        counter = Counter("test_total", "Test counter.", ("endpoint",), registry=None)
+        counter.inc("/song")
+        counter.inc("/song", amount=2)
+        gauge = Gauge("test_in_flight", "Test gauge.", registry=None)
+        gauge.inc()
+        gauge.dec()
+        self.assertEqual(
+            counter.render(),
+            [
+                "# HELP test_total Test counter.",
+                "# TYPE test_total counter",
+                'test_total{endpoint="/song"} 3',
+            ],
+        )
+        self.assertEqual(gauge.render()[-1], "test_in_flight 0")
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram(
+            "test_seconds", "Test.", ("stage",), buckets=(0.1, 1.0), registry=None
+        )
+        for value in (0.05, 0.5, 0.5, 2.0):
+            histogram.observe(value, "encode")
+        with histogram.time("encode"):
+            pass
+
+        lines = histogram.render()
+        self.assertIn('test_seconds_bucket{stage="encode",le="0.1"} 2', lines)
+        self.assertIn('test_seconds_bucket{stage="encode",le="1"} 4', lines)
+        self.assertIn('test_seconds_bucket{stage="encode",le="+Inf"} 5', lines)
+        self.assertIn('test_seconds_count{stage="encode"} 5', lines)
+        self.assertEqual(histogram.count("encode"), 5)
+
+    def test_label_values_are_escaped(self):
+        lines = metric_family(
+            "gauge", "test_info", "Test.", [(('a "b"\\',), 1)], ("name",)
+        )
+        self.assertEqual(lines[-1], 'test_info{name="a \\"b\\"\\\\"} 1')
+
+    def test_render_includes_request_metrics(self):
+        text = render(["extra 1"])
+        self.assertIn("# TYPE songdb_stage_seconds histogram", text)
+        self.assertIn("# TYPE songdb_requests_total counter", text)
+        self.assertTrue(text.endswith("extra 1\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()
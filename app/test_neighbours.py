@@ -0,0 +1,62 @@
+import hashlib
+import unittest
+import numpy as np
+from app.index import EMBEDDING_DIMENSION, SongIndex
+from app.neighbours import NeighbourTable
+
+
+class TestNeighbourTable(unittest.TestCase):
+    def setUp(self):
+        # Random catalog of 30 songs with a table keeping 5 neighbours each
+        rng = np.random.default_rng(2)
+        self.embeddings = rng.standard_normal((30, EMBEDDING_DIMENSION))
+        self.embeddings = self.embeddings.astype(np.float32)
+        self.hashes = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(30)]
+        self.vectors = dict(zip(self.hashes, self.embeddings))
+        self.index = SongIndex()
+        self.index.add(self.hashes[:20], self.embeddings[:20])
+        self.table = NeighbourTable(self.index, maxsize=16, neighbours=5)
+        self.loads = []
+
+    def load_vector(self, song_hash):
+        self.loads.append(song_hash)
+        return self.vectors.get(song_hash) if song_hash in self.index else None
+
+    def expected(self, song_hash, top_k):
+        results = self.index.search(self.vectors[song_hash], top_k + 1)
+        return [h for h, _ in results if h != song_hash][:top_k]
+
+    def test_similar_excludes_song_and_caches(self):
+        # The song itself is never returned and repeat lookups skip the vector
+        song_hash = self.hashes[0]
+        first = self.table.similar(song_hash, 3, self.load_vector)
+        second = self.table.similar(song_hash, 5, self.load_vector)
+        self.assertEqual([h for h, _ in first], self.expected(song_hash, 3))
+        self.assertEqual([h for h, _ in second], self.expected(song_hash, 5))
+        self.assertEqual(self.loads, [song_hash])
+        self.assertEqual(self.table.stats()["hits"], 1)
+
+    def test_unknown_song(self):
+        self.assertIsNone(self.table.similar("f" * 64, 3, self.load_vector))
+
+    def test_follows_inserts_and_deletes(self):
+        # Cached entries should match a fresh search after index changes
+        for song_hash in self.hashes[:10]:
+            self.table.similar(song_hash, 5, self.load_vector)
+
+        # Near-copies of cached songs must enter their neighbour lists
+        copies = self.embeddings[:10] + 0.01
+        self.vectors.update(zip(self.hashes[20:], copies))
+        self.index.add(self.hashes[20:], copies)
+        self.index.remove([self.hashes[3]])
+
+        for song_hash in self.hashes[:10]:
+            results = self.table.similar(song_hash, 5, self.load_vector)
+            if song_hash == self.hashes[3]:
+                self.assertIsNone(results)
+                continue
+            self.assertEqual([h for h, _ in results], self.expected(song_hash, 5))
+
+
+if __name__ == "__main__":
+    unittest.main()
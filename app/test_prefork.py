@@ -0,0 +1,72 @@
+import hashlib
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+import numpy as np
+from app.index import EMBEDDING_DIMENSION, SongIndex
+from app.neighbours import NeighbourTable
+from app.prefork import (
+    current_generation,
+    generation_path,
+    publish_generation,
+    swap_index,
+)
+
+
+class RecordingListener:
+    def __init__(self, index):
+        self.added = []
+        self.removed = []
+        index.listeners.append(self)
+
+    def songs_added(self, song_hashes, embeddings):
+        self.added += song_hashes
+
+    def songs_removed(self, song_hashes):
+        self.removed += song_hashes
+
+
+class TestGenerations(unittest.TestCase):
+    def setUp(self):
+        self.hashes = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(4)]
+        self.embeddings = np.eye(4, EMBEDDING_DIMENSION, dtype=np.float32)
+        self.index = SongIndex()
+        self.index.add(self.hashes[:3], self.embeddings[:3])
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.index_path = os.path.join(self.tmp_dir.name, "songs.index")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_publish_generation(self):
+        # The pointer should follow the latest generation, and old files go
+        self.assertIsNone(current_generation(self.index_path))
+        for generation in (1, 2, 3):
+            publish_generation(self.index, self.index_path, generation)
+        self.assertEqual(current_generation(self.index_path), 3)
+        self.assertFalse(os.path.exists(generation_path(self.index_path, 1)))
+        self.assertTrue(os.path.exists(generation_path(self.index_path, 2)))
+
+        loaded = SongIndex.load(generation_path(self.index_path, 3), mmap=True)
+        self.assertEqual(loaded.index.ntotal, 3)
+
+    def test_swap_index(self):
+        # Listeners should move to the new index and hear about the differences
+        server = SimpleNamespace(song_index=self.index)
+        server.neighbours = NeighbourTable(self.index)
+        listener = RecordingListener(self.index)
+
+        newer = SongIndex()
+        newer.add(self.hashes[1:], self.embeddings[1:])
+        swap_index(server, newer)
+
+        self.assertIs(server.song_index, newer)
+        self.assertIs(server.neighbours.index, newer)
+        self.assertIn(listener, newer.listeners)
+        self.assertEqual(listener.removed, self.hashes[:1])
+        self.assertEqual(listener.added, self.hashes[3:])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import time
+import unittest
+from app.profiler import SlowRequestProfiler
+
+
+def busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class TestSlowRequestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.profiler = SlowRequestProfiler(threshold=0.05, interval=0.001)
+        self.reports = []
+        self.profiler.hooks = [self.reports.append]
+
+    def test_slow_request_is_reported_with_stacks(self):
+        # Samples of a slow request point at the code it was running
+        self.profiler.start_request()
+        busy(0.1)
+        profile = self.profiler.end_request("POST /search", 0.1)
+
+        self.assertEqual(self.reports, [profile])
+        self.assertEqual(list(self.profiler.recent), [profile])
+        self.assertGreater(profile["samples"], 0)
+        self.assertTrue(any("busy" in stack for stack, _ in profile["stacks"]))
+
+    def test_fast_request_is_dropped(self):
+        self.profiler.start_request()
+        self.assertIsNone(self.profiler.end_request("GET /song", 0.001))
+        self.assertEqual(self.reports, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+import base64
+import hashlib
+import os
+import tempfile
+import unittest
+import numpy as np
+from app.db import create_tables, get_connection, insert_songs, load_index
+from app.embeddings import generate_embeddings
+from app.index import SongIndex
+from app.search import (
+    Page,
+    SearchRequest,
+    decode_cursor,
+    encode_cursor,
+    parse_page,
+    parse_search_request,
+    result_set_key,
+    run_hybrid_search,
+    run_searches,
+)
+
+
+class TestSearch(unittest.TestCase):
+    def setUp(self):
+        # Index a few songs embedded from their titles
+        self.titles = ["sea love song", "desert road", "winter rain", "city lights"]
+        self.hashes = [hashlib.sha256(t.encode()).hexdigest() for t in self.titles]
+        self.index = SongIndex()
+        self.index.add(
+            self.hashes,
+            generate_embeddings(self.titles),
+            [{"artist": f"Artist {i % 2}", "year": 2000 + i} for i in range(4)],
+        )
+
+    def test_parse_search_request(self):
+        # Valid bodies become requests, invalid fields raise ValueError
+        request = parse_search_request({"query": "rain", "top_k": 2, "year": 2001})
+        self.assertEqual(request.query, "rain")
+        self.assertEqual(request.top_k, 2)
+        self.assertEqual(request.filters["year"], 2001)
+        self.assertEqual(
+            parse_search_request({"query": "rain", "year": " 2001"}).filters["year"],
+            2001,
+        )
+        self.assertEqual(
+            parse_search_request({"query": "rain", "year": 0}).filters["year"], 0
+        )
+        for body in (
+            {},
+            {"query": "rain", "top_k": "2"},
+            {"query": "rain", "top_k": 10**6},
+            {"query": "rain", "year_from": "2000"},
+            {"query": "rain", "artist": ["Adele"]},
+            {"query": "rain", "album": {"title": "25"}},
+            {"query": "rain", "year": [2001]},
+            {"query": "rain", "year": True},
+            {"query": "rain", "year": "abc"},
+            {"query": "rain", "year": " "},
+            {"query": "rain", "nprobe": 0},
+            {"query": "rain", "min_score": "high"},
+            {"query": "rain", "mode": "fuzzy"},
+            {"query": "rain", "mode": "hybrid", "alpha": 2},
+            ["rain"],
+        ):
+            with self.subTest(body=body):
+                with self.assertRaises(ValueError):
+                    parse_search_request(body)
+
+    def test_run_searches_in_order(self):
+        # Each request should get its own top_k and filters, in request order
+        requests = [
+            SearchRequest("winter rain", 1),
+            SearchRequest("sea love song", 4, {"artist": "Artist 1"}),
+            SearchRequest("city lights", 2, None, None, None, 0.99),
+        ]
+        results = run_searches(self.index, requests)
+        self.assertEqual([h for h, _ in results[0]], [self.hashes[2]])
+        self.assertEqual(
+            sorted(h for h, _ in results[1]), sorted([self.hashes[1], self.hashes[3]])
+        )
+        self.assertEqual([h for h, _ in results[2]], [self.hashes[3]])
+        self.assertTrue(np.isclose(results[2][0][1], 1.0, atol=1e-5))
+
+
+class TestPagination(unittest.TestCase):
+    def test_result_set_key(self):
+        # Spelling variants share a result set, other parameters do not
+        request = parse_search_request({"query": "Love  Song", "top_k": 20})
+        same = parse_search_request({"query": "love song", "top_k": 20})
+        other = parse_search_request({"query": "love song", "top_k": 21})
+        self.assertEqual(result_set_key(request), result_set_key(same))
+        self.assertNotEqual(result_set_key(request), result_set_key(other))
+
+    def test_parse_page(self):
+        # Offset/limit pages default sensibly and cursors round-trip
+        request = parse_search_request({"query": "rain", "top_k": 20})
+        self.assertIsNone(parse_page({}, request))
+        page = parse_page({"limit": 5}, request)
+        self.assertEqual(page, Page(result_set_key(request), 0, 5, request))
+        self.assertEqual(parse_page({"offset": 5}, request).limit, 20)
+
+        cursor = encode_cursor(page._replace(offset=5))
+        self.assertEqual(
+            parse_page({"cursor": cursor}, None), (page.key, 5, 5, request)
+        )
+        for body in ({"limit": 0}, {"offset": -1}, {"cursor": 3}):
+            with self.subTest(body=body):
+                with self.assertRaises(ValueError):
+                    parse_page(body, request)
+        with self.assertRaises(ValueError):
+            decode_cursor("not a cursor")
+
+    def test_cursor_holds_request(self):
+        # Another process can rerun the search from the cursor alone
+        request = parse_search_request(
+            {"query": "rain", "top_k": 20, "artist": "Adele", "year_from": 1990}
+        )
+        page = decode_cursor(encode_cursor(parse_page({"limit": 5}, request)))
+        self.assertEqual(page.request, request)
+        self.assertEqual(page.key, result_set_key(request))
+
+        bad = base64.urlsafe_b64encode(b'[5, 5, {"query": ""}]').decode()
+        with self.assertRaises(ValueError):
+            decode_cursor(bad)
+
+
+class TestHybridSearch(unittest.TestCase):
+    def setUp(self):
+        # A database of songs whose text the query matches to different degrees
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_name = os.path.join(self.tmp_dir.name, "songs.db")
+        create_tables(self.db_name)
+        self.songs = [
+            {"artist": "Ocean Band", "song": "Ocean Ocean", "year": 2001},
+            {"artist": "Ocean Band", "song": "Desert", "year": 2002},
+            {"artist": "Other", "song": "Mountain", "year": 2003},
+        ]
+        insert_songs(self.songs, self.db_name)
+        self.index = load_index(self.db_name)
+        self.conn = get_connection(self.db_name)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp_dir.cleanup()
+
+    def test_lexical_matches_rank_first(self):
+        # With all weight on BM25 the best text match wins, and a plain vector
+        # search fills the places left by too few text matches
+        request = SearchRequest("ocean", 3, mode="hybrid", alpha=0.0)
+        results = run_hybrid_search(self.index, self.conn.cursor(), request)
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0][2], 1.0)
+        self.assertEqual(results[-1][2], 0.0)
+        self.assertGreater(results[0][2], results[1][2])
+
+    def test_filters_apply_to_candidates(self):
+        request = SearchRequest("ocean", 3, {"year": 2002}, mode="hybrid")
+        results = run_hybrid_search(self.index, self.conn.cursor(), request)
+        self.assertEqual(len(results), 1)
+
+    def test_alpha_one_ranks_by_similarity(self):
+        request = SearchRequest("ocean", 2, mode="hybrid", alpha=1.0)
+        results = run_hybrid_search(self.index, self.conn.cursor(), request)
+        for _, similarity, score in results:
+            self.assertAlmostEqual(similarity, score)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+import hashlib
+import os
+import tempfile
+import unittest
+import numpy as np
+from app.index import EMBEDDING_DIMENSION, SongIndex
+from app.shards import (
+    ShardedIndex,
+    ShardProcess,
+    build_sharded_index,
+    merge_results,
+    shard_for,
+)
+
+
+class RecordingListener:
+    def __init__(self):
+        self.added = []
+        self.removed = []
+
+    def songs_added(self, song_hashes, embeddings):
+        self.added += song_hashes
+
+    def songs_removed(self, song_hashes):
+        self.removed += song_hashes
+
+
+class TestShardedIndex(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.embeddings = rng.standard_normal((200, EMBEDDING_DIMENSION))
+        self.embeddings = self.embeddings.astype(np.float32)
+        self.hashes = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(200)]
+        self.songs = [{"artist": f"Artist {i % 7}", "year": 2000} for i in range(200)]
+        self.exact = SongIndex()
+        self.exact.add(self.hashes, self.embeddings)
+
+    def test_shard_for(self):
+        # Hash ranges should cover every shard; artists should stay together
+        positions = {shard_for(h, None, 4) for h in self.hashes}
+        self.assertEqual(positions, {0, 1, 2, 3})
+        self.assertEqual(shard_for("0" * 64, None, 4), 0)
+        self.assertEqual(shard_for("f" * 64, None, 4), 3)
+        self.assertEqual(
+            shard_for(self.hashes[0], {"artist": "Same"}, 4, "artist"),
+            shard_for(self.hashes[1], {"artist": " same "}, 4, "artist"),
+        )
+        with self.assertRaises(ValueError):
+            shard_for(self.hashes[0], None, 4, "artist")
+
+    def test_merge_results(self):
+        # Per-shard rankings should merge into one, cut at top_k
+        merged = merge_results([[("a", 0.9), ("c", 0.2)], [("b", 0.5)], []], 2)
+        self.assertEqual(merged, [("a", 0.9), ("b", 0.5)])
+
+    def test_search_matches_single_index(self):
+        # Scatter-gather over shards should rank like one exact index
+        queries = self.embeddings[:5] + 0.1
+        for partition in ("hash", "artist"):
+            with self.subTest(partition=partition):
+                index = build_sharded_index(
+                    self.hashes, self.embeddings, 3, partition, songs=self.songs
+                )
+                self.assertEqual(len(index), 200)
+                self.assertEqual(sum(len(shard) for shard in index.shards), 200)
+                for query in queries:
+                    self.assertEqual(
+                        [h for h, _ in index.search(query, 10)],
+                        [h for h, _ in self.exact.search(query, 10)],
+                    )
+                batch = index.search_batch(queries, [3, 10, 0, 5, 1])
+                self.assertEqual([len(results) for results in batch], [3, 10, 0, 5, 1])
+                self.assertEqual(batch[1], index.search(queries[1], 10))
+                filtered = index.search(queries[0], 50, filters={"artist": "Artist 3"})
+                self.assertEqual(len(filtered), len(self.hashes[3::7]))
+                index.close()
+
+    def test_add_remove_and_rebuild(self):
+        # Changes should reach the right shard and the index's listeners
+        index = build_sharded_index(
+            self.hashes[:150], self.embeddings[:150], 4, "artist", songs=self.songs
+        )
+        listener = RecordingListener()
+        index.listeners.append(listener)
+
+        added = index.add(
+            self.hashes[140:160], self.embeddings[140:160], self.songs[140:160]
+        )
+        self.assertEqual(added, self.hashes[150:160])
+        self.assertEqual(listener.added, self.hashes[150:160])
+        self.assertEqual(len(index), 160)
+
+        self.assertEqual(index.remove([self.hashes[0], "f" * 64]), [self.hashes[0]])
+        self.assertNotIn(self.hashes[0], index)
+        self.assertNotEqual(index.search(self.embeddings[0], 1)[0][0], self.hashes[0])
+
+        # Rebuilding one shard from the full catalog only touches that shard
+        position = shard_for(self.hashes[0], self.songs[0], 4, "artist")
+        others = [len(shard) for p, shard in enumerate(index.shards) if p != position]
+        added, removed = index.rebuild_shard(
+            position, self.hashes, self.embeddings, self.songs
+        )
+        self.assertIn(self.hashes[0], added)
+        self.assertEqual(removed, [])
+        self.assertIn(self.hashes[0], index)
+        self.assertEqual(
+            others,
+            [len(shard) for p, shard in enumerate(index.shards) if p != position],
+        )
+        index.close()
+
+    def test_save_load_restore(self):
+        # A saved sharded index should reload and reconcile with the song list
+        index = build_sharded_index(self.hashes, self.embeddings, 3)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "songs.index")
+            index.save(path)
+            loaded = ShardedIndex.load(path)
+        missing = loaded.restore(self.hashes[1:] + ["f" * 64])
+        self.assertEqual(missing, ["f" * 64])
+        self.assertEqual(len(loaded), 199)
+        self.assertEqual(sum(len(shard) for shard in loaded.shards), 199)
+        index.close()
+        loaded.close()
+
+    def test_shard_processes(self):
+        # Shards in their own processes should answer like local ones
+        index = build_sharded_index(
+            self.hashes, self.embeddings, 2, songs=self.songs, processes=True
+        )
+        try:
+            self.assertTrue(all(isinstance(s, ShardProcess) for s in index.shards))
+            query = self.embeddings[7] + 0.1
+            self.assertEqual(
+                [h for h, _ in index.search(query, 10)],
+                [h for h, _ in self.exact.search(query, 10)],
+            )
+            self.assertEqual(index.remove([self.hashes[7]]), [self.hashes[7]])
+            self.assertNotEqual(index.search(query, 1)[0][0], self.hashes[7])
+        finally:
+            index.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
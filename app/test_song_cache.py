@@ -0,0 +1,66 @@
+import json
+import unittest
+import numpy as np
+from app.index import EMBEDDING_DIMENSION, SongIndex
+from app.song_cache import SongCache
+
+
+class TestSongCache(unittest.TestCase):
+    def setUp(self):
+        self.index = SongIndex()
+        self.cache = SongCache(self.index, maxsize=4)
+        self.songs = {"a" * 64: {"hash": "a" * 64, "song": "Shir", "year": 1990}}
+        self.loads = []
+
+    def load_song(self, song_hash):
+        self.loads.append(song_hash)
+        return self.songs.get(song_hash)
+
+    def test_hit_returns_encoded_body_without_loading(self):
+        # Repeat lookups serve the same bytes and load the song once
+        first = self.cache.get("a" * 64, self.load_song)
+        second = self.cache.get("a" * 64, self.load_song)
+        self.assertEqual(json.loads(first), self.songs["a" * 64])
+        self.assertIs(first, second)
+        self.assertEqual(self.loads, ["a" * 64])
+        self.assertEqual(self.cache.stats()["hit_rate"], 0.5)
+
+    def test_unknown_song_not_cached(self):
+        self.assertIsNone(self.cache.get("b" * 64, self.load_song))
+        self.assertEqual(len(self.cache.entries), 0)
+
+    def test_index_updates_invalidate(self):
+        # Adding or removing a song through the index drops its entry
+        song_hash = "a" * 64
+        embedding = np.ones((1, EMBEDDING_DIMENSION), dtype=np.float32)
+        self.cache.get(song_hash, self.load_song)
+        self.index.add([song_hash], embedding)
+        self.assertEqual(len(self.cache.entries), 0)
+
+        self.cache.get(song_hash, self.load_song)
+        self.index.remove([song_hash])
+        self.assertEqual(len(self.cache.entries), 0)
+
+    def test_invalidate_without_index_change(self):
+        # A song the index does not hold still leaves the cache on delete
+        song_hash = "a" * 64
+        self.cache.get(song_hash, self.load_song)
+        self.assertEqual(self.index.remove([song_hash]), [])
+        self.assertEqual(len(self.cache.entries), 1)
+
+        self.cache.invalidate([song_hash])
+        self.assertEqual(len(self.cache.entries), 0)
+
+    def test_load_racing_invalidation_not_cached(self):
+        # A song deleted while it was being loaded must not be cached
+        def load_and_delete(song_hash):
+            song = self.load_song(song_hash)
+            self.cache.songs_removed([song_hash])
+            return song
+
+        self.assertIsNotNone(self.cache.get("a" * 64, load_and_delete))
+        self.assertEqual(len(self.cache.entries), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
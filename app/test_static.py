@@ -0,0 +1,67 @@
+import gzip
+import os
+import tempfile
+import unittest
+from email.utils import formatdate
+from app.static import StaticFiles, choose_encoding, is_not_modified
+
+
+class TestStaticFiles(unittest.TestCase):
+    def setUp(self):
+        # A static directory with one page and a secret file next to it
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp_dir.name, "static")
+        os.mkdir(self.root)
+        self.page = os.path.join(self.root, "index.html")
+        with open(self.page, "w") as file:
+            file.write("<html>" + "song " * 200 + "</html>")
+        with open(os.path.join(self.tmp_dir.name, "secret.txt"), "w") as file:
+            file.write("secret")
+        self.files = StaticFiles(self.root)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_cached_until_modified(self):
+        # The same entry is served until the file changes on disk
+        first = self.files.get("index.html")
+        self.assertIs(self.files.get("/index.html"), first)
+        self.assertEqual(first.content_type, "text/html")
+        self.assertEqual(gzip.decompress(first.variants["gzip"][0]), first.body)
+
+        with open(self.page, "w") as file:
+            file.write("<html>changed</html>")
+        os.utime(self.page, ns=(first.mtime_ns + 10**9, first.mtime_ns + 10**9))
+        second = self.files.get("index.html")
+        self.assertEqual(second.body, b"<html>changed</html>")
+        self.assertNotEqual(second.etag, first.etag)
+        self.assertEqual(second.variants, {})
+
+    def test_rejects_paths_outside_root(self):
+        for path in ("../secret.txt", "/../secret.txt", "missing.html", ""):
+            with self.subTest(path=path):
+                self.assertIsNone(self.files.get(path))
+
+    def test_choose_encoding(self):
+        available = {"gzip": b"", "br": b""}
+        self.assertEqual(choose_encoding("gzip, deflate, br", available), "br")
+        self.assertEqual(choose_encoding("gzip, br;q=0", available), "gzip")
+        self.assertEqual(choose_encoding("*", {"gzip": b""}), "gzip")
+        self.assertIsNone(choose_encoding("identity", available))
+        self.assertIsNone(choose_encoding(None, available))
+
+    def test_is_not_modified(self):
+        etag = '"abc"'
+        self.assertTrue(is_not_modified('"x", W/"abc"', None, etag, 1000))
+        self.assertFalse(is_not_modified('"x"', None, etag, 1000))
+        self.assertTrue(
+            is_not_modified(None, formatdate(1000, usegmt=True), etag, 1000)
+        )
+        self.assertFalse(
+            is_not_modified(None, formatdate(999, usegmt=True), etag, 1000)
+        )
+        self.assertFalse(is_not_modified(None, "garbage", etag, 1000))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,263 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from app.config import (
+    EMBEDDING_MODEL,
+    ENCODER_BACKEND,
+    INDEX_METRIC,
+    INDEX_TYPE,
+    SEARCH_BATCH_SIZE,
+)
+from app.db import generate_song_hash, song_full_text
+from app.embeddings import get_query_embeddings, set_model
+from app.http_server import SERVER_MODES
+from bench.catalog import StubEncoder, generate_catalog, generate_queries
+from bench.load import DEFAULT_MIX, run_load, start_server, stop_server
+from bench.micro import (
+    bench_encode,
+    bench_index_build,
+    bench_ingest,
+    bench_legacy_search,
+    bench_lexical,
+    bench_search,
+    bench_search_batch,
+    bench_serialize,
+)
+from bench.stats import compare, format_comparison, format_results, rss_mb
+
+# Benchmark stages, in the order they run
+STAGES = (
+    "encode",
+    "ingest",
+    "index",
+    "search",
+    "legacy_search",
+    "lexical",
+    "serialize",
+    "http",
+)
+
+# Stages that need a populated database
+DB_STAGES = ("index", "search", "legacy_search", "lexical", "http")
+
+
+def parse_mix(text):
+    """
+    Parses an endpoint mix such as "get_song=0.5,search=0.5".
+    """
+    mix = {}
+    for part in text.split(","):
+        endpoint, _, weight = part.partition("=")
+        mix[endpoint.strip()] = float(weight or 1)
+    return mix
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    stages = [stage for stage in STAGES if stage in args.stages.split(",")]
+    if args.stub_encoder:
+        set_model(StubEncoder())
+
+    catalog = generate_catalog(args.size, args.seed)
+    queries = generate_queries(args.queries, args.seed)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="songdb-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    db_name = os.path.join(workdir, "songs.db")
+    results = {}
+    meta = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "size": args.size,
+        "queries": args.queries,
+        "seed": args.seed,
+        "stub_encoder": args.stub_encoder,
+        "stages": stages,
+        "config": {
+            "embedding_model": EMBEDDING_MODEL,
+            "encoder_backend": ENCODER_BACKEND,
+            "index_metric": INDEX_METRIC,
+            "search_batch_size": SEARCH_BATCH_SIZE,
+        },
+    }
+
+    try:
+        if "encode" in stages:
+            texts = [song_full_text(song) for song in catalog[: args.encode_sample]]
+            results["encode"] = bench_encode(texts)
+
+        # Ingest always starts from an empty database; other stages reuse the
+        # database of an earlier run in the same work directory
+        if "ingest" in stages or (
+            set(stages) & set(DB_STAGES) and not os.path.exists(db_name)
+        ):
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(db_name + suffix):
+                    os.remove(db_name + suffix)
+            results["ingest"] = bench_ingest(catalog, db_name)
+
+        if set(stages) & {"index", "search"}:
+            query_embeddings = get_query_embeddings(queries)
+            for index_type in args.index_types.split(","):
+                summary, index = bench_index_build(db_name, index_type)
+                results[f"index_build_{index_type}"] = summary
+                if "search" in stages:
+                    results[f"search_{index_type}"] = bench_search(
+                        index, query_embeddings, args.top_k
+                    )
+                    results[f"search_batch_{index_type}"] = bench_search_batch(
+                        index, query_embeddings, args.top_k
+                    )
+                del index
+
+        if "legacy_search" in stages:
+            results["legacy_search"] = bench_legacy_search(
+                db_name,
+                get_query_embeddings(queries[: args.legacy_queries]),
+                args.top_k,
+            )
+
+        if "lexical" in stages:
+            results["lexical"] = bench_lexical(db_name, queries)
+
+        if "serialize" in stages:
+            results["serialize"] = bench_serialize(catalog, args.queries, args.top_k)
+
+        if "http" in stages:
+            process = None
+            base_url = args.url
+            if base_url is None:
+                process, base_url = start_server(
+                    db_name, args.stub_encoder, args.server_mode, args.workers
+                )
+            try:
+                results.update(
+                    run_load(
+                        base_url,
+                        [generate_song_hash(song) for song in catalog],
+                        queries,
+                        mix=parse_mix(args.mix),
+                        concurrency=args.concurrency,
+                        duration=args.duration,
+                        top_k=args.top_k,
+                        seed=args.seed,
+                        server_pid=process.pid if process else None,
+                    )
+                )
+            finally:
+                if process is not None:
+                    stop_server(process)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    meta["peak_rss_mb"] = rss_mb(field="VmHWM")
+    report = {"meta": meta, "results": results}
+    print(format_results(results))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            return _report_comparison(json.load(file), report, args.threshold)
+    return 0
+
+
+def _report_comparison(baseline, current, threshold):
+    rows = compare(baseline, current, threshold)
+    print(format_comparison(rows))
+    regressions = [row for row in rows if row["regression"]]
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {threshold:.0%}")
+        return 1
+    return 0
+
+
+def compare_files(args):
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.current) as file:
+        current = json.load(file)
+    return _report_comparison(baseline, current, args.threshold)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m bench", description="Song database benchmarks"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run benchmarks")
+    run_parser.add_argument("--size", type=int, default=10_000, help="catalog size")
+    run_parser.add_argument("--queries", type=int, default=1000)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--top-k", type=int, default=10)
+    run_parser.add_argument(
+        "--stages", default=",".join(STAGES), help="comma-separated stages"
+    )
+    run_parser.add_argument(
+        "--stub-encoder",
+        action="store_true",
+        help="embed with a deterministic stub instead of the model",
+    )
+    run_parser.add_argument(
+        "--encode-sample", type=int, default=10_000, help="texts encoded by encode"
+    )
+    run_parser.add_argument("--index-types", default=INDEX_TYPE)
+    run_parser.add_argument(
+        "--legacy-queries",
+        type=int,
+        default=20,
+        help="queries sent to perform_faiss_similarity_search",
+    )
+    run_parser.add_argument(
+        "--workdir", help="keep the database here and reuse it between runs"
+    )
+    run_parser.add_argument("--url", help="load an already running server instead")
+    run_parser.add_argument("--server-mode", choices=SERVER_MODES, default="threaded")
+    run_parser.add_argument("--workers", type=int, default=8)
+    run_parser.add_argument("--concurrency", type=int, default=8)
+    run_parser.add_argument("--duration", type=float, default=10.0)
+    run_parser.add_argument(
+        "--mix",
+        default=",".join(f"{name}={weight}" for name, weight in DEFAULT_MIX.items()),
+        help="endpoint weights, e.g. get_song=0.5,search=0.3,similar=0.2",
+    )
+    run_parser.add_argument("--output", help="write JSON results to this file")
+    run_parser.add_argument("--baseline", help="compare with an earlier results file")
+    run_parser.add_argument("--threshold", type=float, default=0.1)
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser("compare", help="compare two results files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+    compare_parser.set_defaults(func=compare_files)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
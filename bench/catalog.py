@@ -0,0 +1,147 @@
+import hashlib
+import random
+import numpy as np
+from app.db import generate_song_hash
+from app.index import EMBEDDING_DIMENSION
+from songs.sample_songs import songs as sample_songs
+
+# Catalog sizes the suite is usually run at
+CATALOG_SIZES = (10_000, 100_000, 1_000_000)
+
+# Average number of songs per artist and per album in generated catalogs
+SONGS_PER_ARTIST = 12
+SONGS_PER_ALBUM = 10
+
+
+def _words(field):
+    return sorted({word for song in sample_songs for word in str(song[field]).split()})
+
+
+def generate_catalog(size, seed=0):
+    """
+    Generates a synthetic catalog shaped like songs/sample_songs.py.
+
+    Artists, titles, albums and descriptions are recombined from the words of
+    the sample songs, so texts look like real entries (Hebrew, same lengths)
+    and words recur across songs like they do in a real catalog. The same
+    size and seed always give the same catalog.
+
+    Args:
+        size (int): Number of songs.
+        seed (int): Random seed.
+
+    Returns:
+        list: Song dictionaries with distinct song hashes.
+    """
+    rng = random.Random(seed)
+    first_names = sorted({song["artist"].split()[0] for song in sample_songs})
+    last_names = sorted({song["artist"].split()[-1] for song in sample_songs})
+    title_words = _words("song") + _words("album")
+    description_words = _words("description")
+    lengths = [len(song["description"].split()) for song in sample_songs]
+
+    artists = sorted({song["artist"] for song in sample_songs})
+    while len(artists) < max(size // SONGS_PER_ARTIST, 1):
+        artists.append(
+            f"{rng.choice(first_names)} {rng.choice(last_names)} {len(artists)}"
+        )
+    albums = {}
+
+    catalog = []
+    seen = set()
+    while len(catalog) < size:
+        artist = rng.choice(artists)
+        artist_albums = albums.setdefault(artist, [])
+        if not artist_albums or rng.random() < 1 / SONGS_PER_ALBUM:
+            artist_albums.append(
+                (
+                    " ".join(rng.choices(title_words, k=rng.randint(1, 3))),
+                    rng.randint(1960, 2024),
+                )
+            )
+        album, year = rng.choice(artist_albums)
+        song = {
+            "artist": artist,
+            "song": " ".join(rng.choices(title_words, k=rng.randint(1, 4))),
+            "album": album,
+            "year": year,
+            "description": " ".join(
+                rng.choices(
+                    description_words, k=rng.randint(min(lengths), max(lengths))
+                )
+            ),
+        }
+        song_hash = generate_song_hash(song)
+        if song_hash not in seen:
+            seen.add(song_hash)
+            catalog.append(song)
+    return catalog
+
+
+def generate_queries(count, seed=0):
+    """
+    Generates search queries of two or three words from the sample songs.
+
+    Args:
+        count (int): Number of queries.
+        seed (int): Random seed.
+
+    Returns:
+        list: Query strings.
+    """
+    rng = random.Random(seed)
+    words = _words("song") + _words("description")
+    return [" ".join(rng.choices(words, k=rng.randint(2, 3))) for _ in range(count)]
+
+
+class StubEncoder:
+    """
+    Deterministic stand-in for the sentence transformer.
+
+    Every word maps to a fixed pseudo-random vector and a text embeds as the
+    sum of its words, so texts sharing words are similar as with the real
+    model, at a small fraction of its cost. Use it to benchmark everything
+    but the model itself without downloading it.
+    """
+
+    def __init__(self, dimension=EMBEDDING_DIMENSION):
+        """
+        Args:
+            dimension (int): Embedding dimension.
+        """
+        self.dimension = dimension
+        self._words = {}
+
+    def _word_vector(self, word):
+        vector = self._words.get(word)
+        if vector is None:
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            rng = np.random.default_rng(int.from_bytes(digest, "little"))
+            vector = rng.standard_normal(self.dimension).astype(np.float32)
+            self._words[word] = vector
+        return vector
+
+    def encode(
+        self,
+        sentences,
+        batch_size=32,
+        convert_to_numpy=True,
+        normalize_embeddings=False,
+        **kwargs,
+    ):
+        """
+        Embeds a text or a list of texts, like SentenceTransformer.encode.
+
+        Returns:
+            np.ndarray: A vector for a single text, otherwise one row per text.
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.casefold().split():
+                embeddings[row] += self._word_vector(word)
+        if normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings /= np.where(norms > 0, norms, 1.0)
+        return embeddings[0] if single else embeddings
@@ -0,0 +1,210 @@
+import http.client
+import json
+import random
+import ssl
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+from bench.stats import rss_mb, summarize
+
+# Share of requests sent to each endpoint by default: mostly small lookups,
+# like the traffic of our clients
+DEFAULT_MIX = {"get_song": 0.5, "search": 0.3, "similar": 0.2}
+
+# Endpoints the load driver can exercise
+ENDPOINTS = ("get_song", "search", "hybrid_search", "similar", "search_batch")
+
+# Queries per /search/batch request
+BATCH_QUERIES = 16
+
+
+def start_server(db_name, stub_encoder=False, mode="threaded", workers=8):
+    """
+    Starts bench.serve on a database in a child process.
+
+    Args:
+        db_name (str): SQLite database to serve.
+        stub_encoder (bool): Embed queries with StubEncoder instead of the model.
+        mode (str): Serving mode, see make_server.
+        workers (int): Worker threads in threaded mode.
+
+    Returns:
+        tuple: The process and the server's base URL.
+
+    Raises:
+        RuntimeError: If the server exits before it listens.
+    """
+    command = [sys.executable, "-m", "bench.serve", "--db", db_name]
+    command += ["--mode", mode, "--workers", str(workers)]
+    if stub_encoder:
+        command.append("--stub-encoder")
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith("port "):
+        process.kill()
+        process.wait()
+        raise RuntimeError("Benchmark server failed to start")
+    return process, f"http://127.0.0.1:{int(line.split()[1])}"
+
+
+def stop_server(process):
+    """
+    Terminates a server started by start_server and waits for it to exit.
+    """
+    process.terminate()
+    process.wait(timeout=60)
+
+
+def _connect(base_url):
+    parts = urlsplit(base_url)
+    if parts.scheme == "https":
+        # Local servers run with self-signed certificates
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        return http.client.HTTPSConnection(
+            parts.hostname, parts.port or 443, context=context
+        )
+    return http.client.HTTPConnection(parts.hostname, parts.port or 80)
+
+
+def build_request(endpoint, rng, song_hashes, queries, top_k=10):
+    """
+    Builds a random request for an endpoint.
+
+    Returns:
+        tuple: The method, path and JSON body (None for GET requests).
+    """
+    if endpoint == "get_song":
+        return "GET", "/song?" + urlencode({"hash": rng.choice(song_hashes)}), None
+    if endpoint == "similar":
+        params = {"hash": rng.choice(song_hashes), "top_k": top_k}
+        return "GET", "/song/similar?" + urlencode(params), None
+    if endpoint in ("search", "hybrid_search"):
+        body = {"query": rng.choice(queries), "top_k": top_k}
+        if endpoint == "hybrid_search":
+            body["mode"] = "hybrid"
+        return "POST", "/search", body
+    if endpoint == "search_batch":
+        body = {
+            "queries": [
+                {"query": query, "top_k": top_k}
+                for query in rng.choices(queries, k=BATCH_QUERIES)
+            ]
+        }
+        return "POST", "/search/batch", body
+    raise ValueError(f"Unknown endpoint: {endpoint}")
+
+
+def _send(conn, method, path, body):
+    headers = {}
+    data = None
+    if body is not None:
+        data = json.dumps(body).encode("utf-8")
+        headers["Content-Type"] = "application/json"
+    conn.request(method, path, body=data, headers=headers)
+    response = conn.getresponse()
+    response.read()
+    return response
+
+
+def run_load(
+    base_url,
+    song_hashes,
+    queries,
+    mix=DEFAULT_MIX,
+    concurrency=8,
+    duration=10.0,
+    top_k=10,
+    seed=0,
+    server_pid=None,
+):
+    """
+    Drives a server with concurrent clients and summarizes the latencies.
+
+    Every client keeps one persistent connection and sends requests back to
+    back, picking endpoints at random in the proportions of mix. One request
+    per endpoint is sent first to warm the server up and is not timed.
+
+    Args:
+        base_url (str): Server URL, e.g. http://127.0.0.1:8000.
+        song_hashes (list): Hashes of stored songs to look up.
+        queries (list): Search queries to send.
+        mix (dict): Relative weight of each endpoint, see ENDPOINTS.
+        concurrency (int): Number of concurrent clients.
+        duration (float): Seconds to run.
+        top_k (int): Results requested by searches.
+        seed (int): Random seed; client i uses seed + i.
+        server_pid (int, optional): Server process whose RSS is reported.
+
+    Returns:
+        dict: Summaries keyed "http_<endpoint>" plus "http_all", which also
+        counts responses by status and connection errors.
+    """
+    endpoints = [endpoint for endpoint in mix if mix[endpoint] > 0]
+    for endpoint in endpoints:
+        if endpoint not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint: {endpoint}")
+
+    conn = _connect(base_url)
+    for endpoint in endpoints:
+        _send(conn, *build_request(endpoint, random.Random(seed), song_hashes, queries))
+    conn.close()
+
+    records = []
+    errors = []
+    deadline = time.monotonic() + duration
+
+    def client(client_seed):
+        rng = random.Random(client_seed)
+        weights = [mix[endpoint] for endpoint in endpoints]
+        timings = []
+        failures = 0
+        conn = _connect(base_url)
+        while time.monotonic() < deadline:
+            endpoint = rng.choices(endpoints, weights)[0]
+            request = build_request(endpoint, rng, song_hashes, queries, top_k)
+            started = time.perf_counter()
+            try:
+                response = _send(conn, *request)
+            except (OSError, http.client.HTTPException):
+                failures += 1
+                conn.close()
+                conn = _connect(base_url)
+                continue
+            timings.append((endpoint, response.status, time.perf_counter() - started))
+            if response.will_close:
+                conn.close()
+                conn = _connect(base_url)
+        conn.close()
+        records.extend(timings)
+        errors.append(failures)
+
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=client, args=(seed + i,)) for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    results = {}
+    for endpoint in endpoints:
+        latencies = [latency for name, _, latency in records if name == endpoint]
+        results[f"http_{endpoint}"] = summarize(latencies, elapsed)
+    total = summarize([latency for _, _, latency in records], elapsed)
+    statuses = {}
+    for _, status, _ in records:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    total["statuses"] = statuses
+    total["errors"] = sum(errors)
+    total["concurrency"] = concurrency
+    if server_pid is not None:
+        total["server_rss_mb"] = rss_mb(server_pid)
+        total["server_peak_rss_mb"] = rss_mb(server_pid, "VmHWM")
+    results["http_all"] = total
+    return results
@@ -0,0 +1,163 @@
+import json
+import time
+from app.config import HYBRID_CANDIDATES, INDEX_METRIC
+from app.db import (
+    blobs_to_matrix,
+    create_tables,
+    get_connection,
+    insert_songs,
+    lexical_search,
+    load_index,
+)
+from app.embeddings import (
+    DEFAULT_BATCH_SIZE,
+    generate_embeddings,
+    perform_faiss_similarity_search,
+)
+from bench.stats import summarize
+
+# Songs inserted per insert_songs call by the ingest benchmark
+INGEST_CHUNK_SIZE = 10_000
+
+
+def time_calls(calls):
+    """
+    Runs zero-argument callables one after the other, timing each.
+
+    Returns:
+        tuple: The list of per-call seconds and the total wall-clock seconds.
+    """
+    latencies = []
+    started = time.perf_counter()
+    for call in calls:
+        call_started = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - call_started)
+    return latencies, time.perf_counter() - started
+
+
+def bench_encode(texts, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Times generate_embeddings one batch of texts at a time.
+    """
+    batches = [
+        texts[start : start + batch_size] for start in range(0, len(texts), batch_size)
+    ]
+    latencies, elapsed = time_calls(
+        lambda batch=batch: generate_embeddings(batch, batch_size) for batch in batches
+    )
+    return summarize(latencies, elapsed, items=len(texts))
+
+
+def bench_ingest(catalog, db_name, chunk_size=INGEST_CHUNK_SIZE):
+    """
+    Times insert_songs (hashing, encoding and writing) into a new database.
+    """
+    create_tables(db_name)
+    chunks = [
+        catalog[start : start + chunk_size]
+        for start in range(0, len(catalog), chunk_size)
+    ]
+    latencies, elapsed = time_calls(
+        lambda chunk=chunk: insert_songs(chunk, db_name=db_name) for chunk in chunks
+    )
+    return summarize(latencies, elapsed, items=len(catalog))
+
+
+def bench_index_build(db_name, index_type):
+    """
+    Times load_index building an index of the given type from the database.
+
+    Returns:
+        tuple: The summary and the built SongIndex.
+    """
+    indexes = []
+    latencies, elapsed = time_calls(
+        [
+            lambda: indexes.append(
+                load_index(db_name=db_name, index_type=index_type, metric=INDEX_METRIC)
+            )
+        ]
+    )
+    return summarize(latencies, elapsed, items=len(indexes[0])), indexes[0]
+
+
+def bench_search(index, query_embeddings, top_k=10):
+    """
+    Times SongIndex.search one query at a time.
+    """
+    latencies, elapsed = time_calls(
+        lambda query=query: index.search(query, top_k) for query in query_embeddings
+    )
+    return summarize(latencies, elapsed)
+
+
+def bench_search_batch(index, query_embeddings, top_k=10, batch_size=32):
+    """
+    Times SongIndex.search_batch with batch_size queries per call.
+    """
+    batches = [
+        query_embeddings[start : start + batch_size]
+        for start in range(0, len(query_embeddings), batch_size)
+    ]
+    latencies, elapsed = time_calls(
+        lambda batch=batch: index.search_batch(batch, [top_k] * len(batch))
+        for batch in batches
+    )
+    return summarize(latencies, elapsed, items=len(query_embeddings))
+
+
+def bench_legacy_search(db_name, query_embeddings, top_k=10):
+    """
+    Times perform_faiss_similarity_search, which builds a flat index over every
+    stored embedding for each query.
+    """
+    conn = get_connection(db_name)
+    rows = conn.execute(
+        "SELECT hash, artist, song, album, year, description, embedding FROM songs"
+    ).fetchall()
+    conn.close()
+    embeddings = list(blobs_to_matrix([row[6] for row in rows]))
+    fields = ("hash", "artist", "song", "album", "year", "description")
+    metadata = [dict(zip(fields, row[:6])) for row in rows]
+
+    latencies, elapsed = time_calls(
+        lambda query=query: perform_faiss_similarity_search(
+            embeddings, metadata, query, top_k
+        )
+        for query in query_embeddings
+    )
+    return summarize(latencies, elapsed)
+
+
+def bench_lexical(db_name, queries, limit=HYBRID_CANDIDATES):
+    """
+    Times lexical_search, the full-text stage of hybrid searches.
+    """
+    conn = get_connection(db_name)
+    cursor = conn.cursor()
+    latencies, elapsed = time_calls(
+        lambda query=query: lexical_search(cursor, query, limit) for query in queries
+    )
+    conn.close()
+    return summarize(latencies, elapsed)
+
+
+def bench_serialize(catalog, iterations, top_k=10):
+    """
+    Times json.dumps of search responses holding top_k songs.
+    """
+    responses = [
+        [
+            {**catalog[(start + row) % len(catalog)], "similarity": 0.5}
+            for row in range(top_k)
+        ]
+        for start in range(0, iterations * top_k, top_k)
+    ]
+    latencies, elapsed = time_calls(
+        lambda response=response: json.dumps(response, ensure_ascii=False).encode(
+            "utf-8"
+        )
+        for response in responses
+    )
+    return summarize(latencies, elapsed)
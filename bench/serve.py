@@ -0,0 +1,68 @@
+import argparse
+import signal
+import sys
+from app import handlers
+from app.config import (
+    INDEX_METRIC,
+    INDEX_TYPE,
+    SIMILAR_CACHE_SIZE,
+    SIMILAR_NEIGHBOURS,
+    SONG_CACHE_SIZE,
+)
+from app.db import load_index
+from app.embeddings import set_model
+from app.http_server import SERVER_MODES, make_server
+from app.neighbours import NeighbourTable
+from app.search import search_batcher
+from app.song_cache import SongCache
+from bench.catalog import StubEncoder
+
+
+def main(argv=None):
+    """
+    Serves a benchmark database over plain HTTP on a free local port.
+
+    Prints "port <number>" once the server accepts connections and serves
+    until it is terminated. The load driver starts it in its own process, so
+    the server and the client do not share a GIL.
+    """
+    parser = argparse.ArgumentParser(prog="python -m bench.serve")
+    parser.add_argument("--db", required=True, help="SQLite database to serve")
+    parser.add_argument("--stub-encoder", action="store_true")
+    parser.add_argument("--mode", choices=SERVER_MODES, default="threaded")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--index-type", default=INDEX_TYPE)
+    args = parser.parse_args(argv)
+
+    if args.stub_encoder:
+        set_model(StubEncoder())
+    handlers.db_pool.db_name = args.db
+
+    httpd = make_server(
+        ("127.0.0.1", 0),
+        handlers.SongRequestHandler,
+        mode=args.mode,
+        workers=args.workers,
+    )
+    httpd.song_index = load_index(
+        db_name=args.db, index_type=args.index_type, metric=INDEX_METRIC
+    )
+    httpd.neighbours = NeighbourTable(
+        httpd.song_index, SIMILAR_CACHE_SIZE, SIMILAR_NEIGHBOURS
+    )
+    httpd.song_cache = SongCache(httpd.song_index, SONG_CACHE_SIZE)
+    # Log lines would skew the timings
+    handlers.SongRequestHandler.log_message = lambda *args: None
+
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    print(f"port {httpd.server_address[1]}", flush=True)
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
+        search_batcher.close()
+        handlers.db_pool.close_all()
+
+
+if __name__ == "__main__":
+    main()
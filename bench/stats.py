@@ -0,0 +1,147 @@
+import math
+import os
+import resource
+import sys
+
+# Summary fields where a larger value is a regression, and where a smaller one is
+LATENCY_FIELDS = ("p50_ms", "p95_ms", "p99_ms")
+THROUGHPUT_FIELDS = ("qps",)
+
+
+def percentile(sorted_values, fraction):
+    """
+    Returns the nearest-rank percentile of an ascending list.
+
+    Args:
+        sorted_values (list): Values in ascending order.
+        fraction (float): Percentile between 0 and 1.
+
+    Returns:
+        float: The percentile, or 0.0 for an empty list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(fraction * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def rss_mb(pid=None, field="VmRSS"):
+    """
+    Returns the resident set size of a process, in MiB.
+
+    Args:
+        pid (int, optional): Process to measure; None measures this process.
+        field (str): "VmRSS" for the current size or "VmHWM" for the peak.
+
+    Returns:
+        float: The size, or None where /proc is unavailable and pid is given.
+    """
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as status:
+            for line in status:
+                if line.startswith(field + ":"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if pid is not None:
+        return None
+    # ru_maxrss is the peak, in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def summarize(latencies, elapsed, items=None):
+    """
+    Summarizes the timings of one benchmark.
+
+    Args:
+        latencies (list): Seconds taken by each operation.
+        elapsed (float): Wall-clock seconds for all operations.
+        items (int, optional): Work items processed, when an operation handles
+            several (songs per batch); defaults to the number of operations.
+
+    Returns:
+        dict: count, items, seconds, qps (items per second), mean, p50, p95,
+        p99 and max latency in milliseconds, and the current RSS in MiB.
+    """
+    values = sorted(latencies)
+    items = len(values) if items is None else items
+    return {
+        "count": len(values),
+        "items": items,
+        "seconds": round(elapsed, 4),
+        "qps": round(items / elapsed, 2) if elapsed > 0 else 0.0,
+        "mean_ms": round(1000 * sum(values) / len(values), 4) if values else 0.0,
+        "p50_ms": round(1000 * percentile(values, 0.50), 4),
+        "p95_ms": round(1000 * percentile(values, 0.95), 4),
+        "p99_ms": round(1000 * percentile(values, 0.99), 4),
+        "max_ms": round(1000 * values[-1], 4) if values else 0.0,
+        "rss_mb": rss_mb(),
+    }
+
+
+def compare(baseline, current, threshold=0.1):
+    """
+    Compares two result files benchmark by benchmark.
+
+    Args:
+        baseline (dict): Results of the reference run, see bench.__main__.
+        current (dict): Results of the run under test.
+        threshold (float): Relative change beyond which a slower latency or a
+            lower throughput counts as a regression.
+
+    Returns:
+        list: One dictionary per benchmark and metric present in both runs,
+        with benchmark, metric, baseline, current, change (relative) and
+        regression fields.
+    """
+    rows = []
+    for name, before in baseline["results"].items():
+        after = current["results"].get(name)
+        if after is None:
+            continue
+        for metric in LATENCY_FIELDS + THROUGHPUT_FIELDS:
+            if not before.get(metric) or metric not in after:
+                continue
+            change = (after[metric] - before[metric]) / before[metric]
+            worse = -change if metric in THROUGHPUT_FIELDS else change
+            rows.append(
+                {
+                    "benchmark": name,
+                    "metric": metric,
+                    "baseline": before[metric],
+                    "current": after[metric],
+                    "change": round(change, 4),
+                    "regression": worse > threshold,
+                }
+            )
+    return rows
+
+
+def format_results(results):
+    """
+    Formats benchmark summaries as a fixed-width text table.
+    """
+    header = f"{'benchmark':<28}{'count':>9}{'qps':>12}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'rss MiB':>10}"
+    lines = [header, "-" * len(header)]
+    for name, summary in results.items():
+        lines.append(
+            f"{name:<28}{summary['count']:>9}{summary['qps']:>12.1f}"
+            f"{summary['p50_ms']:>11.3f}{summary['p95_ms']:>11.3f}"
+            f"{summary['p99_ms']:>11.3f}{summary['rss_mb'] or 0:>10.1f}"
+        )
+    return os.linesep.join(lines)
+
+
+def format_comparison(rows):
+    """
+    Formats the rows of compare() as a text table, marking regressions.
+    """
+    lines = []
+    for row in rows:
+        marker = "  REGRESSION" if row["regression"] else ""
+        lines.append(
+            f"{row['benchmark']:<28}{row['metric']:<8}{row['baseline']:>12.3f}"
+            f"{row['current']:>12.3f}{row['change']:>+9.1%}{marker}"
+        )
+    return os.linesep.join(lines)
@@ -0,0 +1,51 @@
+import unittest
+import numpy as np
+from app.db import generate_song_hash
+from bench.catalog import StubEncoder, generate_catalog, generate_queries
+
+
+class TestCatalog(unittest.TestCase):
+    def test_catalog_is_reproducible_and_distinct(self):
+        # The same seed gives the same catalog, with one hash per song
+        catalog = generate_catalog(500, seed=3)
+        self.assertEqual(catalog, generate_catalog(500, seed=3))
+        self.assertNotEqual(catalog, generate_catalog(500, seed=4))
+        self.assertEqual(len({generate_song_hash(song) for song in catalog}), 500)
+
+    def test_catalog_shape(self):
+        # Songs have the fields of the sample songs, and artists recur
+        catalog = generate_catalog(240)
+        for song in catalog:
+            self.assertEqual(
+                set(song), {"artist", "song", "album", "year", "description"}
+            )
+            self.assertTrue(1960 <= song["year"] <= 2024)
+        self.assertLess(len({song["artist"] for song in catalog}), 240)
+
+    def test_queries(self):
+        queries = generate_queries(50, seed=1)
+        self.assertEqual(queries, generate_queries(50, seed=1))
+        self.assertTrue(all(2 <= len(query.split()) <= 3 for query in queries))
+
+
+class TestStubEncoder(unittest.TestCase):
+    def test_encode_matches_sentence_transformer_interface(self):
+        # A single text gives a vector, a list gives a matrix, both deterministic
+        encoder = StubEncoder()
+        single = encoder.encode("שיר אהבה", normalize_embeddings=True)
+        batch = StubEncoder().encode(["שיר אהבה", "ים"], normalize_embeddings=True)
+        self.assertEqual(single.shape, (encoder.dimension,))
+        self.assertEqual(batch.shape, (2, encoder.dimension))
+        np.testing.assert_allclose(single, batch[0], rtol=1e-6)
+        self.assertAlmostEqual(float(np.linalg.norm(single)), 1.0, places=5)
+
+    def test_shared_words_are_similar(self):
+        # Texts sharing words are closer than unrelated ones
+        vectors = StubEncoder().encode(
+            ["שיר אהבה על הים", "שיר אהבה", "מחאה חברתית"], normalize_embeddings=True
+        )
+        self.assertGreater(vectors[0] @ vectors[1], vectors[0] @ vectors[2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+from bench.stats import compare, percentile, summarize
+
+
+class TestStats(unittest.TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.50), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile(values, 1.0), 100)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+    def test_summarize(self):
+        # Batched operations report items per second as qps
+        summary = summarize([0.001, 0.002, 0.003, 0.004], elapsed=0.01, items=40)
+        self.assertEqual(summary["count"], 4)
+        self.assertEqual(summary["qps"], 4000.0)
+        self.assertEqual(summary["p50_ms"], 2.0)
+        self.assertEqual(summary["max_ms"], 4.0)
+
+    def test_compare_flags_regressions(self):
+        # Slower latencies and lower throughput beyond the threshold regress
+        baseline = {"results": {"search": {"p50_ms": 1.0, "p95_ms": 2.0, "qps": 100}}}
+        current = {"results": {"search": {"p50_ms": 1.05, "p95_ms": 3.0, "qps": 50}}}
+        rows = {row["metric"]: row for row in compare(baseline, current, 0.1)}
+        self.assertFalse(rows["p50_ms"]["regression"])
+        self.assertTrue(rows["p95_ms"]["regression"])
+        self.assertTrue(rows["qps"]["regression"])
+        self.assertEqual(rows["qps"]["change"], -0.5)
+
+    def test_compare_skips_missing_benchmarks(self):
+        baseline = {"results": {"search": {"p50_ms": 1.0}}}
+        self.assertEqual(compare(baseline, {"results": {}}), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -14,10 +14,25 @@ def clean_up():
         print(f"Removing directory {directory}...")
         shutil.rmtree(directory)
 
-    # Remove SQLite databases
-    if os.path.exists("songs.db"):
-        print("Removing songs.db...")
-        os.remove("songs.db")
+    # Remove SQLite databases, including WAL journal files, and the vector index
+    for db_file in ("songs.db", "songs.db-wal", "songs.db-shm", "songs.index"):
+        if os.path.exists(db_file):
+            print(f"Removing {db_file}...")
+            os.remove(db_file)
+
+    # Remove the index generations published in prefork mode and their pointer
+    generation_files = glob.glob("songs.index.[0-9]*") + glob.glob(
+        "songs.index.current*"
+    )
+    for file in generation_files:
+        print(f"Removing {file}...")
+        os.remove(file)
+
+    # Remove the files of a sharded index and an unfinished index or manifest save
+    shard_files = glob.glob("songs.index.shard*") + glob.glob("songs.index.tmp")
+    for file in shard_files:
+        print(f"Removing {file}...")
+        os.remove(file)
 
     # Remove other artifacts (e.g., logs, temporary files, etc.)
     pem_files = glob.glob("**/*.pem", recursive=True)
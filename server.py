@@ -1,33 +1,213 @@
+import logging
+import multiprocessing
 import ssl
-from http.server import HTTPServer
-from app.handlers import SongRequestHandler
-from app.db import create_tables, insert_songs
+import time
+from app.config import (
+    INDEX_HNSW_M,
+    INDEX_PUBLISH_INTERVAL,
+    INDEX_METRIC,
+    INDEX_NLIST,
+    INDEX_PATH,
+    INDEX_PQ_M,
+    INDEX_SHARD_BY,
+    INDEX_SHARD_PROCESSES,
+    INDEX_SHARDS,
+    INDEX_TYPE,
+    MODEL_WARMUP,
+    SERVER_MODE,
+    SERVER_PROCESSES,
+    SERVER_WORKERS,
+    SIMILAR_CACHE_SIZE,
+    SIMILAR_NEIGHBOURS,
+    SONG_CACHE_SIZE,
+)
+from app.handlers import SongRequestHandler, db_pool
+from app.http_server import make_server
+from app.db import (
+    create_tables,
+    insert_songs,
+    load_index,
+    load_mapped_index,
+    load_sharded_index,
+)
+from app.embeddings import warm_up_model
+from app.neighbours import NeighbourTable
+from app.prefork import (
+    GenerationWatcher,
+    PreforkSupervisor,
+    generation_path,
+    wait_for_generation,
+)
+from app.search import search_batcher
+from app.song_cache import SongCache
 from songs.sample_songs import songs
 
+logger = logging.getLogger(__name__)
+
+SERVER_ADDRESS = ("", 8000)
+
+
+def load_song_index():
+    options = {
+        "index_path": INDEX_PATH,
+        "index_type": INDEX_TYPE,
+        "metric": INDEX_METRIC,
+        "nlist": INDEX_NLIST,
+        "hnsw_m": INDEX_HNSW_M,
+        "pq_m": INDEX_PQ_M,
+    }
+    if INDEX_SHARDS > 1:
+        return load_sharded_index(
+            shards=INDEX_SHARDS,
+            partition=INDEX_SHARD_BY,
+            processes=bool(INDEX_SHARD_PROCESSES),
+            **options,
+        )
+    return load_index(**options)
+
+
+def attach_index(httpd, index):
+    httpd.song_index = index
+    httpd.neighbours = NeighbourTable(index, SIMILAR_CACHE_SIZE, SIMILAR_NEIGHBOURS)
+    httpd.song_cache = SongCache(index, SONG_CACHE_SIZE)
+
+
+def create_ssl_context():
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certfile="cert.pem", keyfile="key.pem")
+    return context
+
+
+def serve_worker(context):
+    """
+    Serves requests in a prefork worker process with the published index.
+    """
+    httpd = make_server(
+        SERVER_ADDRESS, SongRequestHandler, mode="prefork", workers=SERVER_WORKERS
+    )
+    httpd.socket = context.wrap_socket(
+        httpd.socket, server_side=True, do_handshake_on_connect=False
+    )
+    generation = wait_for_generation(INDEX_PATH)
+    attach_index(
+        httpd, load_mapped_index("songs.db", generation_path(INDEX_PATH, generation))
+    )
+    watcher = GenerationWatcher(
+        httpd, "songs.db", INDEX_PATH, generation, INDEX_PUBLISH_INTERVAL
+    )
+    watcher.start()
+    if MODEL_WARMUP:
+        warm_up_model()
+    try:
+        httpd.serve_forever()
+    finally:
+        watcher.stop()
+        httpd.server_close()
+        search_batcher.close()
+        db_pool.close_all()
+
+
+def seed_database():
+    """
+    Inserts the demo songs from a short-lived process.
+
+    Encoding them loads the model and its OpenMP thread pool, which must not
+    exist in the prefork supervisor before it forks the workers.
+    """
+    process = multiprocessing.get_context("spawn").Process(
+        target=insert_songs, args=(songs,), name="songdb-seed"
+    )
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f"Seeding the database failed ({process.exitcode})")
+
+
+def run_prefork():
+    if not INDEX_PATH:
+        raise ValueError("Prefork mode needs SONGDB_INDEX_PATH")
+    if INDEX_SHARDS > 1:
+        raise ValueError("Prefork mode does not support a sharded index")
+    create_tables()
+    seed_database()
+    context = create_ssl_context()
+
+    print(
+        f"Starting HTTPS server on port 8000 (prefork mode, "
+        f"{SERVER_PROCESSES} processes)..."
+    )
+    supervisor = PreforkSupervisor(
+        lambda: serve_worker(context),
+        SERVER_PROCESSES,
+        "songs.db",
+        INDEX_PATH,
+        INDEX_PUBLISH_INTERVAL,
+    )
+    index = supervisor.run(load_song_index)
+    if index is not None:
+        index.save(INDEX_PATH)
+    print("Server stopped.")
+
 
 def run_server():
+    logging.basicConfig(level=logging.INFO)
+    if SERVER_MODE == "prefork":
+        return run_prefork()
+    started = time.perf_counter()
+    timings = {}
+
+    def mark(stage, stage_started):
+        timings[stage] = time.perf_counter() - stage_started
+        return time.perf_counter()
+
+    # Load the embedding model in the background; only searches and new songs
+    # need it, so GET /song is served while it loads (see GET /ready)
+    if MODEL_WARMUP:
+        warm_up_model()
+
+    stage_started = time.perf_counter()
     create_tables()
+    stage_started = mark("tables", stage_started)
 
-    # Insert demo songs list
+    # Insert demo songs list; songs already stored are skipped without encoding
     insert_songs(songs)
+    stage_started = mark("seed", stage_started)
 
-    server_address = ("", 8000)
-    httpd = HTTPServer(server_address, SongRequestHandler)
+    httpd = make_server(
+        SERVER_ADDRESS, SongRequestHandler, mode=SERVER_MODE, workers=SERVER_WORKERS
+    )
+
+    # Load the vector index once; handlers update it in place
+    attach_index(httpd, load_song_index())
+    stage_started = mark("index", stage_started)
 
     # Create an SSL context to wrap the socket for HTTPS
-    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
-    context.load_cert_chain(certfile="cert.pem", keyfile="key.pem")
+    context = create_ssl_context()
 
-    # Wrap the server socket with SSL
-    httpd.socket = context.wrap_socket(httpd.socket, server_side=True)
+    # Wrap the server socket with SSL; the handshake runs when the request is handled
+    httpd.socket = context.wrap_socket(
+        httpd.socket, server_side=True, do_handshake_on_connect=False
+    )
+    mark("tls", stage_started)
+    logger.info(
+        "Startup took %.2fs (%s)",
+        time.perf_counter() - started,
+        ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items()),
+    )
 
-    print("Starting HTTPS server on port 8000...")
+    print(f"Starting HTTPS server on port 8000 ({SERVER_MODE} mode)...")
     try:
         httpd.serve_forever()
     except KeyboardInterrupt:
         pass
     finally:
         httpd.server_close()
+        search_batcher.close()
+        db_pool.close_all()
+        if INDEX_PATH:
+            httpd.song_index.save(INDEX_PATH)
+        if INDEX_SHARDS > 1:
+            httpd.song_index.close()
         print("Server stopped.")
 
 